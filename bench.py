@@ -0,0 +1,575 @@
+# -*- coding: utf-8 -*-
+"""
+Мікробенчмарки бота.
+
+Запуск:
+  python bench.py              — усі бенчмарки
+  python bench.py templates    — лише вибрані (templates, documents, pdf, css, wizard, webhook, cleanup, http)
+"""
+
+import asyncio
+import importlib.util
+import io
+import os
+import statistics
+import sys
+import time
+import timeit
+import tracemalloc
+
+os.environ.setdefault("BOT_TOKEN", "bench")
+# Бенчмарки не повинні писати стан бота на диск
+os.environ.setdefault("BOT_PERSISTENCE", "none")
+
+import documents
+import fake_bot_api
+import pdf_utils
+import templates
+import template_engine
+
+
+def _load_bot():
+    """Вантажить bot.py напряму (ім'я 'bot' зайняте пакетом bot/)."""
+    spec = importlib.util.spec_from_file_location("bot_main", os.path.join(os.path.dirname(__file__), "bot.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def _report(title: str, results: dict, number: int) -> None:
+    print(f"\n== {title} ({number} повторів) ==")
+    baseline = None
+    for label, seconds in results.items():
+        per_call = seconds / number * 1e6
+        if baseline is None:
+            baseline = seconds
+            print(f"  {label:<45} {per_call:10.1f} мкс")
+        else:
+            print(f"  {label:<45} {per_call:10.1f} мкс  (x{baseline / seconds:.2f})")
+
+
+# === Шаблони повідомлень ===
+
+class _Context:
+    """Мінімальна заміна ContextTypes.DEFAULT_TYPE для хелперів, що працюють з user_data."""
+
+    def __init__(self):
+        self.user_data = {}
+
+def _checklist_answers(bot) -> list:
+    """Відповіді повного проходу Чек-ліста: (шаблон, що показується, ключ, значення)."""
+    steps = []
+    for item in bot.CHECKLIST_ITEMS:
+        name = item.upper()
+        steps.append((f"CHECKLIST_{name}_STATUS", f"{item}_status", "yes"))
+        steps.append((f"CHECKLIST_{name}_NOTE", f"{item}_note", "Нотатка з <символами> & \"лапками\""))
+    return steps
+
+def _checklist_sections(categories: int, per_category: int) -> tuple:
+    """Синтетична таблиця Чек-ліста (як templates.CHECKLIST_PDF_SECTIONS) довільного розміру."""
+    return tuple(
+        (f"Категорія {c}: Назва категорії", tuple((f"{c}.{i}. Назва пункту", f"c{c}_s{i}") for i in range(1, per_category + 1)))
+        for c in range(1, categories + 1)
+    )
+
+def _checklist_pass(bot, sections: tuple, incremental: bool) -> int:
+    """Один прохід Чек-ліста по таблиці sections; повертає, скільки байтів тексту пішло в Telegram."""
+    question = template_engine.CompiledTemplate("QUESTION", "\n{summary}---\n**Пункт**\nВаш статус: {status}\n")
+    item_fragment = template_engine.TEMPLATES["CHECKLIST_SUMMARY_ITEM"]
+    category_header = template_engine.TEMPLATES["CHECKLIST_SUMMARY_CATEGORY"]
+    synthetic = bot.get_checklist_layout(sections)
+
+    def add_item(fields: dict, cl: dict, item: str) -> None:
+        # add_checklist_summary_item бере розкладку з bot.CHECKLIST_LAYOUT — підміняємо на синтетичну
+        layout, bot.CHECKLIST_LAYOUT = bot.CHECKLIST_LAYOUT, synthetic
+        try:
+            bot.add_checklist_summary_item(fields, cl, item)
+        finally:
+            bot.CHECKLIST_LAYOUT = layout
+
+    cl = {}
+    fields = {'summary_done': "", 'summary': category_header.render(category=sections[0][0])}
+    sent = 0
+    for category, items in sections:
+        for title, item in items:
+            for kind, value in (("status", "yes"), ("note", "Нотатка з <символами> & \"лапками\"")):
+                if incremental:
+                    summary = fields['summary']
+                else:
+                    # Як було: кожне питання заново форматує й екранує всі попередні пункти
+                    parts = []
+                    for done_category, done_items in sections:
+                        parts.append(category_header.render(category=done_category))
+                        for done_title, done_item in done_items:
+                            if f"{done_item}_note" not in cl:
+                                break
+                            parts.append(item_fragment.render(
+                                title=done_title,
+                                status=bot.format_checklist_field("status", cl[f"{done_item}_status"]),
+                                note=bot.format_checklist_field("note", cl[f"{done_item}_note"]),
+                            ))
+                        if done_category == category:
+                            break
+                    summary = "".join(parts)
+                sent += len(question.render(summary=summary, status=fields.get(f"{item}_status", "")).encode())
+                key = f"{item}_{kind}"
+                cl[key] = value
+                fields[key] = bot.format_checklist_field(key, value)
+            if incremental:
+                add_item(fields, cl, item)
+    return sent
+
+def bench_templates(number: int = 2000) -> None:
+    """Повний прохід Чек-ліста: старий str.format(**dict) проти скомпільованих шаблонів і підсумку, що дописується."""
+    bot = _load_bot()
+    steps = _checklist_answers(bot)
+    notes = {step.key: step for step in bot.CHECKLIST_WIZARD.steps if isinstance(step, bot.ChecklistNoteStep)}
+
+    def legacy():
+        # Як було: на кожному кроці заново готуємо всі поля і розпаковуємо їх у format()
+        cl = {}
+        for name, key, value in steps:
+            getattr(templates, name).format(**bot.get_checklist_template_data(cl))
+            cl[key] = value
+
+    def compiled():
+        context = _Context()
+        context.user_data['cl'] = {}
+        context.user_data['cl_fields'] = bot.get_checklist_template_data({})
+        for name, key, value in steps:
+            template_engine.render(name, context.user_data['cl_fields'])
+            bot.CHECKLIST_WIZARD.save(context, key, value)
+            if key in notes:
+                bot.add_checklist_summary_item(context.user_data['cl_fields'], context.user_data['cl'], notes[key].item)
+
+    _report("Шаблони Чек-ліста (18 кроків)", {
+        "str.format(**всі поля) на кожному кроці": timeit.timeit(legacy, number=number),
+        "CompiledTemplate + Wizard.save": timeit.timeit(compiled, number=number),
+    }, number)
+
+    # Підсумок Чек-ліста: повний перерахунок на кожному кроці росте квадратично з довжиною чек-ліста
+    for categories, per_category in ((3, 3), (6, 5)):
+        sections = _checklist_sections(categories, per_category)
+        size = categories * per_category
+        rounds = max(number // 10, 1)
+        _report(f"Підсумок Чек-ліста, {size} пунктів", {
+            "усі попередні пункти на кожному кроці (як було)": timeit.timeit(lambda: _checklist_pass(bot, sections, False), number=rounds),
+            "фрагменти пунктів дописуються по одному": timeit.timeit(lambda: _checklist_pass(bot, sections, True), number=rounds),
+        }, rounds)
+        print(f"  Текст у Telegram за прохід: {_checklist_pass(bot, sections, False) / 1024:.1f} КБ (як було) → "
+              f"{_checklist_pass(bot, sections, True) / 1024:.1f} КБ")
+
+
+# === Майстер: диспетчеризація кроків Чек-ліста ===
+
+def _checklist_updates(bot) -> list:
+    """Оновлення повного проходу Чек-ліста: (стан старого ConversationHandler, Update)."""
+    from telegram import Update
+
+    chat = {"id": 1, "type": "private", "first_name": "U"}
+    user = {"id": 1, "is_bot": False, "first_name": "U"}
+    message = {"message_id": 1, "date": 0, "chat": chat, "from": user, "text": "Нотатка"}
+    callback = {"id": "1", "from": user, "chat_instance": "1", "message": message, "data": "cl_yes"}
+    updates = []
+    for i, _ in enumerate(bot.CHECKLIST_ITEMS):
+        # Старі стани: C1_S1_NOTE=1, далі пари (STATUS, NOTE), CHECKLIST_GENERATE=18
+        updates.append((2 * i + 1, Update.de_json({"update_id": 2 * i, "callback_query": callback}, None)))
+        updates.append((2 * i + 2, Update.de_json({"update_id": 2 * i + 1, "message": message}, None)))
+    return updates
+
+def _legacy_checklist_conversation(bot):
+    """ConversationHandler як був: 28 станів, окремий хендлер на кожен."""
+    from telegram.ext import CallbackQueryHandler, CommandHandler, ConversationHandler, MessageHandler, filters
+
+    async def noop(update, context):
+        return None
+
+    states = {}
+    for i, _ in enumerate(bot.CHECKLIST_ITEMS):
+        states[2 * i + 1] = [CallbackQueryHandler(noop, pattern="^cl_(yes|no)$")]
+        states[2 * i + 2] = [MessageHandler(filters.TEXT & ~filters.COMMAND, noop)]
+        states[19 + i] = [CallbackQueryHandler(noop, pattern="^cl_skip_note$")]
+    return ConversationHandler(
+        entry_points=[CallbackQueryHandler(noop, pattern="^start_checklist$")],
+        states=states, fallbacks=[CommandHandler("cancel", noop)],
+    )
+
+class _Query:
+    def __init__(self, data: str):
+        self.data = data
+
+    async def answer(self):
+        pass
+
+class _Update:
+    def __init__(self, text: str = None, data: str = None):
+        self.message = _Context() if text is not None else None
+        if self.message is not None:
+            self.message.text = text
+        self.callback_query = _Query(data) if data is not None else None
+
+def bench_wizard(number: int = 2000) -> None:
+    """Крок Чек-ліста: пошук хендлера в ConversationHandler і обробка кроку загальним хендлером."""
+    import warnings
+
+    import wizard
+
+    bot = _load_bot()
+    updates = _checklist_updates(bot)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        legacy = _legacy_checklist_conversation(bot)
+        engine = bot.CHECKLIST_WIZARD.conversation_handler("^start_checklist$", [], persistent=False)
+    key = (1, 1)
+
+    def dispatch_legacy():
+        for state, update in updates:
+            legacy._conversations[key] = state
+            legacy.check_update(update)
+
+    def dispatch_wizard():
+        engine._conversations[key] = wizard.STEP
+        for _, update in updates:
+            engine.check_update(update)
+
+    _report(f"Пошук хендлера ({len(updates)} оновлень Чек-ліста)", {
+        "28 станів, хендлер на кожен (як було)": timeit.timeit(dispatch_legacy, number=number),
+        "1 стан майстра, загальний хендлер": timeit.timeit(dispatch_wizard, number=number),
+    }, number)
+
+    async def show(context, text, reply_markup=None, new_message=False):
+        pass
+
+    async def discard(update):
+        pass
+
+    template = bot.CHECKLIST_WIZARD
+    offline = wizard.Wizard(
+        template.name, template.section, template.title, template.steps, template.new_data, template.new_fields,
+        template.formatter, template.finish, show=show, discard_reply=discard, reset=lambda context: None,
+    )
+    steps = [_Update(data="cl_yes") if i % 2 == 0 else _Update(text="Нотатка") for i in range(len(offline.steps) - 1)]
+
+    async def checklist_pass():
+        context = _Context()
+        context._user_id = 1
+        context.user_data.update({'cl': {}, 'cl_fields': offline.new_fields({}), 'cl_step': 0})
+        for update in steps:
+            await offline.handle(update, context)
+
+    loop = asyncio.new_event_loop()
+    try:
+        seconds = timeit.timeit(lambda: loop.run_until_complete(checklist_pass()), number=number // 10)
+    finally:
+        loop.close()
+    print(f"  Wizard.handle без мережі: {seconds / (number // 10) / len(steps) * 1e6:.1f} мкс на крок")
+
+
+# === Збирання документів для PDF ===
+
+def _dpia_answers() -> dict:
+    return {
+        'project_name': "Бот розкладу", 'team': "@dev", 'goal': "Надсилати розклад групи",
+        'minimization_data': [
+            {'item': f"Поле {i}", 'needed': i % 2 == 0, 'reason': "Потрібно для роботи"} for i in range(6)
+        ],
+        'retention_period': "1 рік", 'retention_mechanism': "Команда /delete", 'storage': "SQLite на сервері",
+        'risk': "Витік бази", 'mitigation': "Шифрування диска",
+    }
+
+def bench_documents(number: int = 200) -> None:
+    """HTML для рушія: заповнений Markdown + markdown2 проти прямого збирання HTML."""
+    bot = _load_bot()
+    answers = {
+        'dpia': _dpia_answers(),
+        'cl': {key: ("yes" if "status" in key else "Нотатка") for key in bot.CHECKLIST_FIELDS},
+    }
+    builders = {
+        'dpia': (documents.build_dpia_markdown, documents.build_dpia_html),
+        'cl': (documents.build_checklist_markdown, documents.build_checklist_html),
+    }
+
+    for section, (build_markdown, build_html) in builders.items():
+        data = answers[section]
+        _report(f"HTML документа '{section}'", {
+            "Markdown → markdown2 (сумісність)": timeit.timeit(lambda: pdf_utils._md_to_html(build_markdown(data)), number=number),
+            "HTML напряму з відповідей": timeit.timeit(lambda: pdf_utils._wrap_html(build_html(data)), number=number),
+        }, number)
+
+
+# === PDF: власна розкладка проти xhtml2pdf ===
+
+def _blocks_text(blocks: list) -> str:
+    """Увесь текст блоків pdf_native у порядку документа."""
+    parts = []
+    for block in blocks:
+        kind = block[0]
+        if kind in ("heading", "para"):
+            parts.append(block[-1])
+        elif kind == "list":
+            parts.extend(block[2])
+        elif kind == "quote":
+            parts.append([(_blocks_text(block[1]), 0)])
+        elif kind == "table":
+            parts.extend(block[1] + [cell for row in block[2] for cell in row])
+    return "".join(text for runs in parts for text, _ in runs)
+
+def _pdf_text(pdf_bytes: bytes) -> tuple:
+    """(кількість сторінок, текст) — через pypdf (requirements-dev.txt)."""
+    from pypdf import PdfReader
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    return len(reader.pages), "".join(page.extract_text() or "" for page in reader.pages)
+
+def _squash(text: str, repeated: tuple = ()) -> str:
+    """Текст без пробілів і маркерів списків; repeated — шапки таблиць, що повторюються на нових сторінках."""
+    text = "".join(text.split()).replace("•", "")
+    for header in repeated:
+        text = text.replace(header, "")
+    return text
+
+def _measure_pdf(generate, html_full: str, number: int) -> tuple:
+    """(секунд на number рендерів, пікова пам'ять одного рендера, байти PDF, секунд на шрифти за рендер)."""
+    import pdf_fonts
+    pdf_bytes = generate(html_full)  # прогрів: реєстрація шрифтів, імпорти, кеш підмножин
+    with pdf_fonts.font_timer() as fonts:
+        seconds = timeit.timeit(lambda: generate(html_full), number=number)
+    tracemalloc.start()
+    generate(html_full)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak, pdf_bytes, fonts.seconds / number
+
+def bench_pdf(number: int = 20) -> None:
+    """
+    Рендер PDF еталонних документів: час, шрифти, пікова пам'ять і звірка тексту.
+    Розкладку native проти xhtml2pdf перевіряє tests/test_pdf_native.py.
+    PDF_FONT_SUBSET_CACHE=0 python bench.py pdf — те саме без кешу підмножин шрифтів,
+    PDF_FONT_SEED=1 — з однаковою підмножиною 0 у всіх документів (більше влучань, більші PDF).
+    """
+    import pdf_fonts
+    import pdf_native
+    pdf_utils.probe_backends()  # шрифти xhtml2pdf; native реєструє свої сам
+    bot = _load_bot()
+    long_checklist = {key: ("yes" if "status" in key else "Довга нотатка до пункту. " * 12) for key in bot.CHECKLIST_FIELDS}
+    documents_html = {
+        name: pdf_utils._wrap_html(build(documents.GOLDEN_ANSWERS[name]))
+        for name, build in (
+            ('policy', documents.build_policy_html),
+            ('dpia', documents.build_dpia_html),
+            ('checklist', documents.build_checklist_html),
+        )
+    }
+    documents_html['checklist (довгі нотатки)'] = pdf_utils._wrap_html(documents.build_checklist_html(long_checklist))
+    engines = {"xhtml2pdf": pdf_utils._generate_with_xhtml2pdf, "власна розкладка (native)": pdf_native.render_html}
+
+    for name, html_full in documents_html.items():
+        blocks = pdf_native.parse_html(html_full)
+        headers = tuple(_squash(_blocks_text([("table", block[1], [])])) for block in blocks if block[0] == "table" and block[1])
+        expected = _squash(_blocks_text(blocks), headers)
+        results, summary = {}, []
+        for label, generate in engines.items():
+            seconds, peak, pdf_bytes, font_seconds = _measure_pdf(generate, html_full, number)
+            pages, text = _pdf_text(pdf_bytes)
+            # Весь текст документа має бути в PDF у тому ж порядку і без «квадратиків» замість кирилиці
+            verdict = "текст збігається" if _squash(text, headers) == expected else f"текст розійшовся ({text.count('■')} ■)"
+            results[label] = seconds
+            summary.append(
+                f"  {label:<35} шрифти {font_seconds * 1000:5.1f} мс, пам'ять {peak / 1024:5.0f} КБ, "
+                f"{len(pdf_bytes) / 1024:5.1f} КБ PDF, сторінок {pages}, {verdict}"
+            )
+        _report(f"PDF '{name}'", results, number)
+        print("\n".join(summary))
+    print(f"\n  Кеш підмножин шрифтів: {pdf_fonts.get_font_stats()}")
+
+def bench_css(number: int = 1000) -> None:
+    """xhtml2pdf: CSS розбирається на кожен документ (як було) проти розібраного один раз (PDF_CSS_PREPARSE)."""
+    pdf_utils.probe_backends()
+    html_full = pdf_utils._wrap_html(documents.build_checklist_html(documents.GOLDEN_ANSWERS['checklist']))
+    render = lambda: pdf_utils._generate_with_xhtml2pdf(html_full)
+    render()
+    results = {}
+    for label, preparse in (("CSS на кожен документ (як було)", False), ("CSS розібрано один раз", True)):
+        pdf_utils.PDF_CSS_PREPARSE = preparse
+        results[label] = timeit.timeit(render, number=number)
+    pdf_utils.PDF_CSS_PREPARSE = True
+    _report("xhtml2pdf, Чек-ліст", results, number)
+    saved = results["CSS на кожен документ (як було)"] - results["CSS розібрано один раз"]
+    print(f"  Зекономлено за {number} рендерів: {saved:.1f} с")
+
+
+# === Затримка «оновлення → відповідь»: polling проти webhook ===
+
+def _report_latency(title: str, results: dict) -> None:
+    print(f"\n== {title} ==")
+    for label, samples in results.items():
+        ordered = sorted(samples)
+        p95 = ordered[int(len(ordered) * 0.95) - 1]
+        print(f"  {label:<45} p50 {statistics.median(ordered) * 1000:7.1f} мс   p95 {p95 * 1000:7.1f} мс")
+
+async def _measure_start_latency(bot, api: fake_bot_api.FakeBotApi, mode: str, rounds: int) -> list:
+    """Запускає справжній Application з bot.py проти фейкового API і міряє /start → sendMessage."""
+    application = bot.build_application()
+    samples = []
+    async with application:
+        await application.start()
+        if mode == "webhook":
+            port = api._server.server_address[1] + 1
+            await application.updater.start_webhook(
+                listen="127.0.0.1", port=port, url_path="telegram",
+                webhook_url=f"http://127.0.0.1:{port}/telegram", secret_token="bench-secret",
+            )
+        else:
+            await application.updater.start_polling(poll_interval=0.0, timeout=10)
+
+        for i in range(rounds):
+            user_id = 10_000 + i
+            since = time.perf_counter()
+            api.push_message(user_id, "/start")
+            call = await asyncio.to_thread(
+                api.wait_for_call, lambda method, params: method == "sendMessage" and params.get("chat_id") == str(user_id), since,
+            )
+            if call is None:
+                raise RuntimeError(f"{mode}: бот не відповів на /start")
+            samples.append(call[0] - since)
+
+        await application.updater.stop()
+        await application.stop()
+    return samples
+
+def bench_webhook(rounds: int = 50, latency: float = 0.02) -> None:
+    """Локальний fake Bot API з RTT latency: скільки чекає користувач від /start до відповіді."""
+    import telegram_utils
+
+    api = fake_bot_api.FakeBotApi(latency=latency).start()
+    telegram_utils.TELEGRAM_API_BASE_URL = api.base_url
+    bot = _load_bot()
+    try:
+        results = {
+            f"{mode} (RTT {latency * 1000:.0f} мс)": asyncio.run(_measure_start_latency(bot, api, mode, rounds))
+            for mode in ("polling", "webhook")
+        }
+    finally:
+        api.stop()
+    _report_latency(f"/start → відповідь ({rounds} оновлень)", results)
+
+
+# === Крок майстра: прибирання у фоні проти видалення на критичному шляху ===
+
+async def _measure_step_latency(bot, api: fake_bot_api.FakeBotApi, cleanup_queue: bool, users: int) -> list:
+    """Відповідь на перше питання Політики → наступне питання (editMessageText)."""
+    application = bot.build_application()
+    samples = []
+    async with application:
+        await application.start()
+        if cleanup_queue:
+            await bot.post_init(application)
+        await application.updater.start_polling(poll_interval=0.0, timeout=10)
+
+        def replied(user_id, method_name):
+            return lambda method, params: method == method_name and params.get("chat_id") == str(user_id)
+
+        for i in range(users):
+            user_id = 20_000 + i + (users if cleanup_queue else 0)
+            since = time.perf_counter()
+            api.push_message(user_id, "/start")
+            await asyncio.to_thread(api.wait_for_call, replied(user_id, "sendMessage"), since)
+            since = time.perf_counter()
+            api.push_callback(user_id, "start_policy", api.last_message_id(user_id))
+            await asyncio.to_thread(api.wait_for_call, replied(user_id, "sendMessage"), since)
+
+            since = time.perf_counter()
+            api.push_message(user_id, "Мій проєкт")
+            call = await asyncio.to_thread(api.wait_for_call, replied(user_id, "editMessageText"), since)
+            if call is None:
+                raise RuntimeError("бот не показав наступне питання")
+            samples.append(call[0] - since)
+
+        await application.updater.stop()
+        await application.stop()
+        await bot.post_stop(application)
+    return samples
+
+def bench_cleanup(users: int = 30, latency: float = 0.02) -> None:
+    """Скільки користувач чекає наступне питання: з чергою прибирання і з видаленням «в лоб»."""
+    import telegram_utils
+
+    api = fake_bot_api.FakeBotApi(latency=latency).start()
+    telegram_utils.TELEGRAM_API_BASE_URL = api.base_url
+    bot = _load_bot()
+    try:
+        results = {
+            "видалення перед відповіддю (як було)": asyncio.run(_measure_step_latency(bot, api, False, users)),
+            "черга прибирання у фоні": asyncio.run(_measure_step_latency(bot, api, True, users)),
+        }
+    finally:
+        api.stop()
+    _report_latency(f"Крок Політики: відповідь → наступне питання (RTT {latency * 1000:.0f} мс)", results)
+    print(f"  Черга: {telegram_utils.message_cleanup.stats()}")
+
+
+# === HTTP-клієнт: стандартний HTTPXRequest PTB проти окремих пулів з keep-alive ===
+
+async def _measure_http(api: fake_bot_api.FakeBotApi, request, waves: int, concurrency: int, uploads: int) -> tuple:
+    """Хвилі паралельних кроків майстра (sendMessage) разом із завантаженнями PDF (sendDocument)."""
+    from telegram import Bot
+
+    document = os.urandom(300_000)
+    samples = []
+
+    async def step(chat_id: int) -> None:
+        started = time.perf_counter()
+        await bot.send_message(chat_id, "Наступне питання")
+        samples.append(time.perf_counter() - started)
+
+    bot = Bot(os.environ["BOT_TOKEN"], base_url=api.base_url, request=request)
+    async with bot:
+        connections = api.connections
+        started = time.perf_counter()
+        for wave in range(waves):
+            await asyncio.gather(
+                *(step(100 + i) for i in range(concurrency)),
+                *(bot.send_document(200 + i, document, filename="policy.pdf") for i in range(uploads)),
+            )
+        elapsed = time.perf_counter() - started
+        connections = api.connections - connections
+    return samples, waves * (concurrency + uploads) / elapsed, connections
+
+def bench_http(waves: int = 10, concurrency: int = 48, uploads: int = 4, latency: float = 0.02) -> None:
+    """Пропускна здатність HTTP-клієнта проти fake Bot API з RTT і ціною нового з'єднання (TLS)."""
+    from telegram.request import HTTPXRequest
+    import telegram_utils
+
+    api = fake_bot_api.FakeBotApi(latency=latency, connect_latency=2 * latency).start()
+    clients = {
+        "HTTPXRequest за замовчуванням (як було)": lambda: HTTPXRequest(connection_pool_size=256),
+        "RoutingRequest (пул + завантаження)": telegram_utils.create_request,
+    }
+    results, summary = {}, []
+    try:
+        for label, factory in clients.items():
+            samples, throughput, connections = asyncio.run(_measure_http(api, factory(), waves, concurrency, uploads))
+            results[label] = samples
+            summary.append(f"  {label:<45} {throughput:7.1f} викликів/с, нових з'єднань: {connections}")
+    finally:
+        api.stop()
+    _report_latency(f"sendMessage під навантаженням ({waves} хвиль по {concurrency} + {uploads} PDF, RTT {latency * 1000:.0f} мс)", results)
+    print("\n".join(summary))
+
+
+BENCHMARKS = {
+    "templates": bench_templates,
+    "documents": bench_documents,
+    "pdf": bench_pdf,
+    "css": bench_css,
+    "wizard": bench_wizard,
+    "webhook": bench_webhook,
+    "cleanup": bench_cleanup,
+    "http": bench_http,
+}
+
+def main(argv: list) -> None:
+    names = argv or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
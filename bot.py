@@ -15,16 +15,14 @@ import logging
 import os
 import html
 # (v3.1.2) ВИДАЛЕНО import asyncio
-from datetime import date
 from dotenv import load_dotenv
 from telegram import Update, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application,
     CommandHandler,
     ConversationHandler,
-    MessageHandler,
     CallbackQueryHandler,
-    filters,
+    TypeHandler,
     ContextTypes,
 )
 from telegram.constants import ParseMode
@@ -33,7 +31,32 @@ from telegram.error import BadRequest
 # Локальні імпорти
 import templates
 # (Важливо!) Ми припускаємо, що це 'pdf_utils.py' від твого товариша (v3.2)
-from pdf_utils import create_pdf_from_markdown, clear_temp_file
+from documents import build_checklist, build_dpia, build_policy
+from pdf_utils import (
+    PdfRenderCancelled,
+    cancel_renders,
+    create_pdf_bytes_from_markdown_async,
+    probe_backends,
+    shutdown_pdf_workers,
+)
+from persistence import create_persistence, forget_user
+from session import sessions
+from telegram_utils import (
+    BOT_CONCURRENT_UPDATES,
+    BOT_MAX_PENDING_UPDATES,
+    MESSAGE_CLEANUP_QUEUE,
+    PerChatUpdateProcessor,
+    configure_api_endpoint,
+    configure_http_client,
+    create_rate_limiter,
+    delete_message_later,
+    main_message_editor,
+    message_cleanup,
+    run_application,
+    send_document_cached,
+)
+from template_engine import render as render_template, validate_templates
+from wizard import ChoiceStep, TextStep, Wizard
 
 # Налаштування логування
 logging.basicConfig(
@@ -48,69 +71,6 @@ if not BOT_TOKEN:
     logger.error("!!! Змінна BOT_TOKEN не знайдена в .env файлі !!!")
     exit()
 
-# === Етапи для Conversation Handlers ===
-
-# --- Етапи для "Політики" (Безшовний UX) ---
-(
-    POLICY_START, # Не використовується, але для повноти
-    POLICY_Q_CONTACT,
-    POLICY_Q_DATA_COLLECTED,
-    POLICY_Q_DATA_STORAGE,
-    POLICY_Q_DELETE_MECHANISM,
-    POLICY_GENERATE,
-) = range(6)
-
-# --- Етапи для "DPIA" (Безшовний UX) ---
-(
-    DPIA_START, # Не використовується
-    DPIA_Q_TEAM,
-    DPIA_Q_GOAL,
-    DPIA_Q_DATA_LIST,
-    DPIA_Q_MINIMIZATION_START,
-    DPIA_Q_MINIMIZATION_STATUS,
-    DPIA_Q_MINIMIZATION_REASON,
-    DPIA_Q_RETENTION_PERIOD,
-    DPIA_Q_RETENTION_MECHANISM,
-    DPIA_Q_STORAGE,
-    DPIA_Q_RISK,
-    DPIA_Q_MITIGATION,
-    DPIA_GENERATE,
-) = range(13)
-
-# --- Етапи для "Чек-ліста" (19 етапів + 9 'skip' станів = 28) ---
-(
-    CHECKLIST_START, # C0
-    C1_S1_NOTE, # C1
-    C1_S2_STATUS, # C2
-    C1_S2_NOTE, # C3
-    C1_S3_STATUS, # C4
-    C1_S3_NOTE, # C5
-    C2_S1_STATUS, # C6
-    C2_S1_NOTE, # C7
-    C2_S2_STATUS, # C8
-    C2_S2_NOTE, # C9
-    C2_S3_STATUS, # C10
-    C2_S3_NOTE, # C11
-    C3_S1_STATUS, # C12
-    C3_S1_NOTE, # C13
-    C3_S2_STATUS, # C14
-    C3_S2_NOTE, # C15
-    C3_S3_STATUS, # C16
-    C3_S3_NOTE, # C17
-    CHECKLIST_GENERATE, # C18
-    # (v2.8) Етапи для "Skip Logic"
-    C1_S2_STATUS_SKIP,
-    C1_S3_STATUS_SKIP,
-    C2_S1_STATUS_SKIP,
-    C2_S2_STATUS_SKIP,
-    C2_S3_STATUS_SKIP,
-    C3_S1_STATUS_SKIP,
-    C3_S2_STATUS_SKIP,
-    C3_S3_STATUS_SKIP,
-    CHECKLIST_GENERATE_SKIP,
-) = range(28) 
-
-
 # === 1. Головне Меню та Допоміжні Функції ===
 
 def get_main_menu_keyboard() -> InlineKeyboardMarkup:
@@ -247,12 +207,25 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         
     return ConversationHandler.END
 
+def interrupt_pdf_render(update: object) -> None:
+    """
+    (v3.5) Викликається, коли чат зайнятий попереднім оновленням (PerChatUpdateProcessor.on_busy).
+    /cancel під час генерації PDF зупиняє рендер одразу, а не чекає в черзі чату, поки той закінчиться.
+    """
+    if not isinstance(update, Update) or not update.message or not update.message.text:
+        return
+    command = update.message.text.split(maxsplit=1)[0].split("@", 1)[0]
+    if command == "/cancel" and cancel_renders(update.effective_chat.id):
+        logger.info(f"User {update.effective_user.id}: /cancel зупиняє генерацію PDF.")
+
 def clear_user_data(context: ContextTypes.DEFAULT_TYPE) -> None:
     """Безпечно очищує context.user_data."""
     user_id = context._user_id
     if context.user_data:
         logger.info(f"Очищення даних для user {user_id}.")
         context.user_data.clear()
+        # (v3.5) Стираємо і збережену копію на диску, не чекаючи наступного запису
+        forget_user(context.application, user_id)
     else:
         logger.info(f"Для user {user_id} немає даних для очищення.")
 
@@ -265,9 +238,13 @@ async def delete_main_message(context: ContextTypes.DEFAULT_TYPE, message_id: in
     chat_id = context._chat_id
     
     if msg_id_to_delete:
+        # (v3.5) Відкладений edit цього повідомлення вже не потрібен: інакше він піде у видалене
+        # повідомлення, а його on_failed запише новий main_message_id у user_data з фонової задачі
+        main_message_editor.forget(chat_id)
         try:
-            await context.bot.delete_message(chat_id=chat_id, message_id=msg_id_to_delete)
-            logger.info(f"Видалено 'Головне' повідомлення {msg_id_to_delete}")
+            # (v3.5) Видалення йде у фоні, не затримуючи наступне повідомлення
+            await delete_message_later(context.bot, chat_id, msg_id_to_delete)
+            logger.info(f"'Головне' повідомлення {msg_id_to_delete} відправлено на видалення")
         except BadRequest as e:
             logger.warning(f"Не вдалося видалити 'Головне' повідомлення {msg_id_to_delete}: {e}")
     else:
@@ -292,130 +269,81 @@ async def edit_main_message(context: ContextTypes.DEFAULT_TYPE, text: str, reply
                 parse_mode=ParseMode.MARKDOWN
             )
             context.user_data['main_message_id'] = sent_message.message_id
+            # (v3.5) Запам'ятовуємо, що зараз показано, щоб не надсилати ідентичні edit-и
+            main_message_editor.remember(
+                chat_id, sent_message.message_id, main_message_editor.digest(text, reply_markup, ParseMode.MARKDOWN)
+            )
         else:
-            await context.bot.edit_message_text(
-                chat_id=chat_id,
-                message_id=message_id,
-                text=text,
-                reply_markup=reply_markup,
-                parse_mode=ParseMode.MARKDOWN
+            async def resend() -> None:
+                # Повідомлення не вдалося відредагувати - надсилаємо нове, якщо воно досі "Головне"
+                if context.user_data.get('main_message_id') == message_id:
+                    await edit_main_message(context, text, reply_markup, new_message=True)
+
+            # (v3.5) Ідентичні edit-и відкидаються локально, швидкі послідовні - зливаються в один
+            await main_message_editor.edit(
+                context.bot, chat_id, message_id, text, reply_markup, ParseMode.MARKDOWN, on_failed=resend
             )
     except BadRequest as e:
-        if "Message is not modified" in str(e):
-            logger.info("Повідомлення не змінено, пропуск редагування.")
-        elif "message to edit not found" in str(e):
-             logger.warning(f"Не вдалося знайти повідомлення {message_id} для редагування. Надсилаю нове.")
-             await edit_main_message(context, text, reply_markup, new_message=True)
-        else:
-            logger.error(f"Помилка під час редагування/надсилання повідомлення: {e}", exc_info=True)
-            if message_id and not new_message:
-                await edit_main_message(context, text, reply_markup, new_message=True)
+        logger.error(f"Помилка під час надсилання повідомлення: {e}", exc_info=True)
     except Exception as e:
         logger.error(f"Невідома помилка в edit_main_message: {e}", exc_info=True)
 
 async def delete_user_text_reply(update: Update) -> None:
     """Видаляє повідомлення користувача (його текстову відповідь), щоб чат був чистим."""
     try:
-        await update.message.delete()
+        # (v3.5) У фоні: наступне питання з'являється, не чекаючи видалення
+        await delete_message_later(update.get_bot(), update.message.chat_id, update.message.message_id)
     except BadRequest as e:
         logger.warning(f"Не вдалося видалити текстову відповідь користувача: {e}")
 
-# === 2. (ОНОВЛЕНО v3.0) Логіка "Політики Конфіденційності" (Безшовний UX) ===
-
-def get_policy_template_data(data: dict) -> dict:
-    """Готує словник для шаблонів Політики."""
-    return {
-        'project_name': html.escape(data.get('project_name', '...')),
-        'contact': html.escape(data.get('contact', '...')),
-        'data_collected': html.escape(data.get('data_collected', '...')),
-        'data_storage': html.escape(data.get('data_storage', '...')),
-        'delete_mechanism': html.escape(data.get('delete_mechanism', '...')),
-    }
-
-async def start_policy(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """(v3.0) Починає "безшовну" розмову про Політику."""
-    query = update.callback_query
-    await query.answer()
-            
-    clear_user_data(context)
-    logger.info(f"User {query.from_user.id} почав 'Політику'.") 
-    context.user_data['policy'] = {}
-    
-    try:
-        # Редагуємо головне меню, щоб почати воркфлоу
-        text = templates.POLICY_Q_PROJECT_NAME.format(**get_policy_template_data({}))
-        # new_message=True, щоб замінити меню, а не редагувати його
-        await edit_main_message(context, text, new_message=True)
-    except BadRequest as e:
-        logger.warning(f"start_policy: Помилка: {e}")
-
-    return POLICY_Q_CONTACT
-
-async def policy_q_contact(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data['policy']['project_name'] = update.message.text
-    await delete_user_text_reply(update)
-    
-    text = templates.POLICY_Q_CONTACT.format(**get_policy_template_data(context.user_data['policy']))
-    await edit_main_message(context, text)
-    return POLICY_Q_DATA_COLLECTED
+def make_wizard(name: str, section: str, title: str, steps: list, new_data, new_fields, formatter, finish) -> Wizard:
+    """
+    (v3.5) Майстер, що веде розмову в "Головному" повідомленні.
+    (v3.4) Готові поля для шаблонів: кожна відповідь форматується та екранується
+    один раз — у момент збереження — і лежить у user_data['<розділ>_fields']
+    (похідний кеш: у неактивних сесій його прибирає session.py).
+    """
+    return Wizard(
+        name, section, title, steps, new_data, new_fields, formatter, finish,
+        show=edit_main_message, discard_reply=delete_user_text_reply, reset=clear_user_data,
+    )
 
-async def policy_q_data_collected(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data['policy']['contact'] = update.message.text
-    await delete_user_text_reply(update)
+# === 2. (ОНОВЛЕНО v3.0) Логіка "Політики Конфіденційності" (Безшовний UX) ===
 
-    text = templates.POLICY_Q_DATA_COLLECTED.format(**get_policy_template_data(context.user_data['policy']))
-    await edit_main_message(context, text)
-    return POLICY_Q_DATA_STORAGE
+POLICY_FIELDS = ('project_name', 'contact', 'data_collected', 'data_storage', 'delete_mechanism')
 
-async def policy_q_data_storage(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data['policy']['data_collected'] = update.message.text
-    await delete_user_text_reply(update)
-    
-    text = templates.POLICY_Q_DATA_STORAGE.format(**get_policy_template_data(context.user_data['policy']))
-    await edit_main_message(context, text)
-    return POLICY_Q_DELETE_MECHANISM
+def format_policy_field(key: str, value: str) -> str:
+    """Готує одну відповідь Політики для шаблонів."""
+    return html.escape(value)
 
-async def policy_q_delete_mechanism(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data['policy']['data_storage'] = update.message.text
-    await delete_user_text_reply(update)
-    
-    text = templates.POLICY_Q_DELETE_MECHANISM.format(**get_policy_template_data(context.user_data['policy']))
-    await edit_main_message(context, text)
-    return POLICY_GENERATE
+def get_policy_template_data(data: dict) -> dict:
+    """Готує словник для шаблонів Політики."""
+    return {key: format_policy_field(key, data.get(key, '...')) for key in POLICY_FIELDS}
 
 async def policy_generate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """(ОНОВЛЕНО v3.1) Генерує PDF Політики та показує кнопку "Повернутись"."""
-    context.user_data['policy']['delete_mechanism'] = update.message.text
     user_id = update.effective_user.id
     logger.info(f"User {user_id}: генерація PDF Політики.")
 
-    await delete_user_text_reply(update)
     await delete_main_message(context)
     
     generating_msg = await update.message.reply_text("Дякую! Генерую ваш PDF...")
 
-    data_dict = {
-        'project_name': html.escape(context.user_data['policy'].get('project_name', '[Назва Вашого Проєкту]')),
-        'contact': html.escape(context.user_data['policy'].get('contact', '[Ваш @username або email]')),
-        'data_collected': html.escape(context.user_data['policy'].get('data_collected', '[Дані, які ви збираєте]')),
-        'data_storage': html.escape(context.user_data['policy'].get('data_storage', '[Де ви зберігаєте дані]')),
-        'delete_mechanism': html.escape(context.user_data['policy'].get('delete_mechanism', '[Опишіть простий механізм]')),
-        'date': date.today().strftime("%d.%m.%Y"),
-    }
+    # (v3.5) Документ збирається з відповідей одразу в HTML (див. documents.py)
+    content, is_html = build_policy(context.user_data['policy'])
     
     # (v3.0) Очищуємо дані ДО генерації
     clear_user_data(context)
 
     try:
-        filled_markdown = templates.POLICY_TEMPLATE.format(**data_dict)
-        
-        pdf_file_path = create_pdf_from_markdown(
-            content=filled_markdown,
-            is_html=False, 
-            output_filename=f"policy_{user_id}.pdf"
+        pdf_bytes = await create_pdf_bytes_from_markdown_async(
+            content=content,
+            is_html=is_html,
+            owner=update.message.chat_id
         )
         
-        await context.bot.send_document(chat_id=update.message.chat_id, document=open(pdf_file_path, 'rb'))
+        # (v3.4) Однаковий PDF надсилається повторно через file_id, без завантаження
+        await send_document_cached(context.bot, update.message.chat_id, pdf_bytes, "privacy_policy.pdf")
         
         # (v3.2) Використовуємо helper-функцію
         await context.bot.send_message(
@@ -423,7 +351,10 @@ async def policy_generate(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             text="Ваша Політика Конфіденційності готова. Я видалив усі ваші відповіді зі своєї пам'яті.",
             reply_markup=get_post_action_keyboard()
         )
-        clear_temp_file(pdf_file_path)
+
+    except PdfRenderCancelled:
+        # (v3.5) Користувач натиснув /cancel — він сам відповість і поверне в меню
+        logger.info(f"User {user_id}: генерацію PDF Політики скасовано.")
 
     except Exception as e:
         logger.error(f"PDF generation failed for user {user_id}: {e}", exc_info=True)
@@ -433,18 +364,32 @@ async def policy_generate(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     finally:
         try:
-            await generating_msg.delete()
+            await delete_message_later(context.bot, generating_msg.chat_id, generating_msg.message_id)
         except Exception as e:
             logger.warning(f"Не вдалося видалити 'Генерую...' {e}")
             
         return ConversationHandler.END
 
+# (v3.5) Кроки Політики: кожна відповідь - своє питання POLICY_Q_<КЛЮЧ>
+POLICY_WIZARD = make_wizard(
+    "policy", "policy", "Політику",
+    steps=[TextStep(key, f"POLICY_Q_{key.upper()}") for key in POLICY_FIELDS],
+    new_data=dict,
+    new_fields=get_policy_template_data,
+    formatter=format_policy_field,
+    finish=policy_generate,
+)
+
 
 # === 3. (ОНОВЛЕНО v3.0) Логіка "DPIA Lite" (Безшовний UX) ===
 
-def get_dpia_template_data(data: dict) -> dict:
-    """Готує словник для шаблонів DPIA."""
-    # Готуємо дані для мінімізації
+DPIA_FIELDS = (
+    'project_name', 'team', 'goal', 'data_list', 'minimization_summary',
+    'retention_period', 'retention_mechanism', 'storage', 'risk', 'mitigation',
+)
+
+def get_dpia_minimization_summary(data: dict) -> str:
+    """Готує текст підсумку мінімізації для шаблонів DPIA."""
     minimization_text = ""
     minimization_data = data.get('minimization_data', [])
     if data.get('data_list') and not minimization_data:
@@ -460,255 +405,162 @@ def get_dpia_template_data(data: dict) -> dict:
                 minimization_text += f"\n**{i+1}. {item}:** ✅ **Так** (Навіщо: `{reason}`)"
             else:
                 minimization_text += f"\n**{i+1}. {item}:** ❌ **Ні** (`{reason}`)"
+    return minimization_text.strip()
+
+def format_dpia_field(key: str, value: str) -> str:
+    """Готує одну текстову відповідь DPIA для шаблонів."""
+    return html.escape(value)
 
+def get_dpia_list_fields(data: dict) -> dict:
+    """Поля DPIA, що залежать від списку даних та циклу мінімізації."""
     return {
-        'project_name': html.escape(data.get('project_name', '...')),
-        'team': html.escape(data.get('team', '...')),
-        'goal': html.escape(data.get('goal', '...')),
         'data_list': "\n".join([f"- `{html.escape(item)}`" for item in data.get('data_list', [])]),
-        'minimization_summary': minimization_text.strip(),
-        'retention_period': html.escape(data.get('retention_period', '...')),
-        'retention_mechanism': html.escape(data.get('retention_mechanism', '...')),
-        'storage': html.escape(data.get('storage', '...')),
-        'risk': html.escape(data.get('risk', '...')),
-        'mitigation': html.escape(data.get('mitigation', '...')),
+        'minimization_summary': get_dpia_minimization_summary(data),
     }
 
-async def start_dpia(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """(v3.0) Починає "безшовну" розмову про DPIA."""
-    query = update.callback_query
-    await query.answer()
+def get_dpia_template_data(data: dict) -> dict:
+    """Готує словник для шаблонів DPIA."""
+    template_data = {
+        key: format_dpia_field(key, data.get(key, '...'))
+        for key in DPIA_FIELDS if key not in ('data_list', 'minimization_summary')
+    }
+    template_data.update(get_dpia_list_fields(data))
+    return template_data
 
-    clear_user_data(context)
-    logger.info(f"User {query.from_user.id} почав 'DPIA'.")
-    
-    context.user_data['dpia'] = {
+def refresh_dpia_list_fields(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Оновлює поля списку даних/мінімізації після зміни циклу мінімізації."""
+    fields = context.user_data.get('dpia_fields')
+    if fields is not None:
+        # Без кешу полів нічого оновлювати: майстер збере їх з відповідей, коли знадобляться
+        fields.update(get_dpia_list_fields(context.user_data['dpia']))
+
+def new_dpia_data() -> dict:
+    return {
         'minimization_data': [],
         'data_list': [],
         'current_data_index': 0
     }
-    
-    text = templates.DPIA_Q_PROJECT_NAME.format(**get_dpia_template_data({}))
-    await edit_main_message(context, text, new_message=True)
-    return DPIA_Q_TEAM
 
-async def dpia_q_team(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data['dpia']['project_name'] = update.message.text
-    await delete_user_text_reply(update)
-    
-    text = templates.DPIA_Q_TEAM.format(**get_dpia_template_data(context.user_data['dpia']))
-    await edit_main_message(context, text)
-    return DPIA_Q_GOAL
+class DataListStep(TextStep):
+    """Список даних (кожен пункт з нового рядка). Порожній список - питання ще раз."""
 
-async def dpia_q_goal(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data['dpia']['team'] = update.message.text
-    await delete_user_text_reply(update)
-    
-    text = templates.DPIA_Q_GOAL.format(**get_dpia_template_data(context.user_data['dpia']))
-    await edit_main_message(context, text)
-    return DPIA_Q_DATA_LIST
+    __slots__ = ()
 
-async def dpia_q_data_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data['dpia']['goal'] = update.message.text
-    await delete_user_text_reply(update)
-    
-    text = templates.DPIA_Q_DATA_LIST.format(**get_dpia_template_data(context.user_data['dpia']))
-    await edit_main_message(context, text)
-    return DPIA_Q_MINIMIZATION_START
-
-async def dpia_q_minimization_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Отримує список даних і запускає цикл мінімізації."""
-    data_list = [item.strip() for item in update.message.text.split('\n') if item.strip()]
-    await delete_user_text_reply(update)
-
-    if not data_list:
-        text = templates.DPIA_Q_DATA_LIST_ERROR.format(**get_dpia_template_data(context.user_data['dpia']))
-        await edit_main_message(context, text)
-        return DPIA_Q_MINIMIZATION_START
-
-    context.user_data['dpia']['data_list'] = data_list
-    context.user_data['dpia']['current_data_index'] = 0
-    context.user_data['dpia']['minimization_data'] = []
-    
-    return await dpia_ask_minimization_status(context)
+    async def handle(self, wizard: Wizard, update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+        data_list = [item.strip() for item in update.message.text.split('\n') if item.strip()]
+        if not data_list:
+            text = render_template("DPIA_Q_DATA_LIST_ERROR", wizard.fields(context))
+            await wizard.show(context, text)
+            return False
 
-async def dpia_ask_minimization_status(context: ContextTypes.DEFAULT_TYPE) -> int:
-    """(v3.0) Динамічно ставить питання про статус для поточного пункту даних."""
-    index = context.user_data['dpia']['current_data_index']
-    data_list = context.user_data['dpia']['data_list']
-    
-    if index >= len(data_list):
-        return await dpia_minimization_finished(context)
+        context.user_data['dpia']['data_list'] = data_list
+        context.user_data['dpia']['current_data_index'] = 0
+        context.user_data['dpia']['minimization_data'] = []
+        refresh_dpia_list_fields(context)
+        return True
 
-    current_data_item = data_list[index]
-    context.user_data['dpia']['current_data_item'] = current_data_item # Зберігаємо для наступного кроку
-    
-    keyboard = [
-        [
-            InlineKeyboardButton("✅ Так", callback_data="min_yes"),
-            InlineKeyboardButton("❌ Ні", callback_data="min_no"),
-        ]
+MINIMIZATION_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("✅ Так", callback_data="min_yes"),
+        InlineKeyboardButton("❌ Ні", callback_data="min_no"),
     ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    template_data = get_dpia_template_data(context.user_data['dpia'])
-    text = templates.DPIA_Q_MINIMIZATION_ASK.format(
-        **template_data,
-        count=f"{index + 1}/{len(data_list)}",
-        item=f"`{html.escape(current_data_item)}`"
-    )
-
-    await edit_main_message(context, text, reply_markup)
-    return DPIA_Q_MINIMIZATION_REASON
-
-async def dpia_q_minimization_reason(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """(v3.0) Обробляє відповідь 'Так'/'Ні' (CallbackQuery)."""
-    query = update.callback_query
-    await query.answer()
-    
-    current_data_item = context.user_data['dpia'].get('current_data_item', '...')
-    
-    if query.data == "min_yes":
-        context.user_data['dpia']['minimization_data'].append({
-            "item": current_data_item,
-            "needed": True,
-            "reason": "" 
-        })
-        
-        template_data = get_dpia_template_data(context.user_data['dpia'])
-        text = templates.DPIA_Q_MINIMIZATION_REASON.format(
-            **template_data,
+])
+
+class MinimizationStep:
+    """
+    (v3.0) Цикл мінімізації: для кожного пункту списку даних - "Чи потрібен?" (кнопки),
+    для "Так" - ще й причина (текст). Крок завершується після останнього пункту.
+    """
+
+    __slots__ = ()
+    callbacks = ("min_yes", "min_no")
+
+    def accepts(self, context: ContextTypes.DEFAULT_TYPE, update: Update) -> bool:
+        awaiting_reason = context.user_data['dpia'].get('awaiting_reason', False)
+        if update.callback_query:
+            return not awaiting_reason and update.callback_query.data in self.callbacks
+        return awaiting_reason
+
+    def prompt(self, wizard: Wizard, context: ContextTypes.DEFAULT_TYPE) -> tuple:
+        """Динамічно ставить питання про статус для поточного пункту даних."""
+        index = context.user_data['dpia']['current_data_index']
+        data_list = context.user_data['dpia']['data_list']
+        current_data_item = data_list[index]
+        context.user_data['dpia']['current_data_item'] = current_data_item # Зберігаємо для наступного кроку
+
+        text = render_template(
+            "DPIA_Q_MINIMIZATION_ASK",
+            wizard.fields(context),
+            count=f"{index + 1}/{len(data_list)}",
             item=f"`{html.escape(current_data_item)}`"
         )
-        await edit_main_message(context, text)
-        return DPIA_Q_MINIMIZATION_STATUS
-        
-    elif query.data == "min_no":
-        context.user_data['dpia']['minimization_data'].append({
-            "item": current_data_item,
-            "needed": False,
-            "reason": "Відмовлено (мінімізовано)"
-        })
-        
-        context.user_data['dpia']['current_data_index'] += 1
-        return await dpia_ask_minimization_status(context)
-
-async def dpia_q_minimization_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """(v3.0) Отримує текстову причину для відповіді 'Так'."""
-    reason = update.message.text
-    await delete_user_text_reply(update)
-    
-    if context.user_data['dpia']['minimization_data']:
-        context.user_data['dpia']['minimization_data'][-1]['reason'] = reason
-    
-    context.user_data['dpia']['current_data_index'] += 1
-    return await dpia_ask_minimization_status(context)
-
-async def dpia_minimization_finished(context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Викликається, коли цикл мінімізації завершено."""
-    
-    text = templates.DPIA_Q_RETENTION_PERIOD.format(**get_dpia_template_data(context.user_data['dpia']))
-    await edit_main_message(context, text)
-    return DPIA_Q_RETENTION_MECHANISM
-
-async def dpia_q_retention_mechanism(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data['dpia']['retention_period'] = update.message.text
-    await delete_user_text_reply(update)
-    
-    text = templates.DPIA_Q_RETENTION_MECHANISM.format(**get_dpia_template_data(context.user_data['dpia']))
-    await edit_main_message(context, text)
-    return DPIA_Q_STORAGE
-
-async def dpia_q_storage(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data['dpia']['retention_mechanism'] = update.message.text
-    await delete_user_text_reply(update)
-    
-    text = templates.DPIA_Q_STORAGE.format(**get_dpia_template_data(context.user_data['dpia']))
-    await edit_main_message(context, text)
-    return DPIA_Q_RISK
-
-async def dpia_q_risk(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data['dpia']['storage'] = update.message.text
-    await delete_user_text_reply(update)
-    
-    text = templates.DPIA_Q_RISK.format(**get_dpia_template_data(context.user_data['dpia']))
-    await edit_main_message(context, text)
-    return DPIA_Q_MITIGATION
-
-async def dpia_q_mitigation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data['dpia']['risk'] = update.message.text
-    await delete_user_text_reply(update)
-    
-    text = templates.DPIA_Q_MITIGATION.format(**get_dpia_template_data(context.user_data['dpia']))
-    await edit_main_message(context, text)
-    return DPIA_GENERATE
+        return text, MINIMIZATION_KEYBOARD
+
+    async def handle(self, wizard: Wizard, update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+        dpia = context.user_data['dpia']
+        query = update.callback_query
+
+        if query:
+            current_data_item = dpia.get('current_data_item', '...')
+            if query.data == "min_yes":
+                dpia['minimization_data'].append({
+                    "item": current_data_item,
+                    "needed": True,
+                    "reason": ""
+                })
+                refresh_dpia_list_fields(context)
+                dpia['awaiting_reason'] = True
+
+                text = render_template(
+                    "DPIA_Q_MINIMIZATION_REASON",
+                    wizard.fields(context),
+                    item=f"`{html.escape(current_data_item)}`"
+                )
+                await wizard.show(context, text)
+                return False
+
+            dpia['minimization_data'].append({
+                "item": current_data_item,
+                "needed": False,
+                "reason": "Відмовлено (мінімізовано)"
+            })
+        else:
+            # Текстова причина для відповіді 'Так'
+            if dpia['minimization_data']:
+                dpia['minimization_data'][-1]['reason'] = update.message.text
+            dpia['awaiting_reason'] = False
+        refresh_dpia_list_fields(context)
+
+        dpia['current_data_index'] += 1
+        if dpia['current_data_index'] < len(dpia['data_list']):
+            await wizard.show(context, *self.prompt(wizard, context))
+            return False
+        return True
 
 async def dpia_generate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """(ОНОВЛЕНО v3.1) Збирає останню відповідь і генерує PDF для DPIA."""
-    context.user_data['dpia']['mitigation'] = update.message.text
+    """(ОНОВЛЕНО v3.1) Генерує PDF для DPIA (остання відповідь вже збережена майстром)."""
     user_id = update.effective_user.id
     logger.info(f"User {user_id}: генерація PDF DPIA.")
 
-    await delete_user_text_reply(update)
     await delete_main_message(context)
     
     generating_msg = await update.message.reply_text("Дякую! Аудит завершено. Генерую ваш PDF...")
 
-    data = context.user_data['dpia']
-    
-    def get_data(key, default='[Не вказано]'):
-        return html.escape(data.get(key, default))
-
-    # Готуємо дані для PDF
-    table_rows = []
-    table_rows.append(f"| Назва проєкту: | {get_data('project_name')} |")
-    table_rows.append(f"| Керівник/Розробник: | {get_data('team')} |")
-    table_rows.append(f"| Мета: | {get_data('goal')} |")
-    
-    minimization_data = data.get('minimization_data', [])
-    if not minimization_data:
-        table_rows.append("| Дані: | [Не вказано] |")
-    else:
-        for i, item in enumerate(minimization_data):
-            data_name = f"Дані (пункт {i+1}):"
-            item_name = html.escape(item['item'])
-            item_reason = html.escape(item['reason'])
-            
-            if item['needed']:
-                data_value = f"{item_name} (✅ **Навіщо:** {item_reason})"
-            else:
-                data_value = f"~~{item_name}~~ (❌ **Відмовлено**)"
-            
-            table_rows.append(f"| {data_name} | {data_value} |")
-
-    table_rows.append(f"| Строк Зберігання: | {get_data('retention_period')} |")
-    table_rows.append(f"| Механізм Видалення: | {get_data('retention_mechanism')} |")
-    table_rows.append(f"| Місце Зберігання: | {get_data('storage')} |")
-    table_rows.append(f"| Головний Ризик: | {get_data('risk')} |")
-    table_rows.append(f"| Мінімізація Ризику: | {get_data('mitigation')} |")
-
-    table_header = "| Питання | Відповідь |\n| :--- | :--- |\n"
-    dpia_table_string = table_header + "\n".join(table_rows)
-
-    data_dict = {
-        'project_name': get_data('project_name'),
-        'date': date.today().strftime("%d.%m.%Y"),
-        'dpia_table': dpia_table_string
-    }
+    # (v3.5) Документ збирається з відповідей одразу в HTML (див. documents.py)
+    content, is_html = build_dpia(context.user_data['dpia'])
     
     # (v3.0) Очищуємо дані ДО генерації
     clear_user_data(context)
 
     try:
-        filled_markdown = templates.DPIA_TEMPLATE.format(**data_dict)
-        
-        pdf_file_path = create_pdf_from_markdown(
-            content=filled_markdown,
-            is_html=False, 
-            output_filename=f"dpia_{user_id}.pdf"
+        pdf_bytes = await create_pdf_bytes_from_markdown_async(
+            content=content,
+            is_html=is_html,
+            owner=update.message.chat_id
         )
         
-        await context.bot.send_document(chat_id=update.message.chat_id, document=open(pdf_file_path, 'rb'))
+        # (v3.4) Однаковий PDF надсилається повторно через file_id, без завантаження
+        await send_document_cached(context.bot, update.message.chat_id, pdf_bytes, "dpia_lite.pdf")
         
         # (v3.2) Використовуємо helper-функцію
         await context.bot.send_message(
@@ -716,7 +568,10 @@ async def dpia_generate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
             text="Ваш DPIA Lite готовий. Я видалив усі ваші відповіді зі своєї пам'яті.",
             reply_markup=get_post_action_keyboard()
         )
-        clear_temp_file(pdf_file_path)
+
+    except PdfRenderCancelled:
+        # (v3.5) Користувач натиснув /cancel — він сам відповість і поверне в меню
+        logger.info(f"User {user_id}: генерацію PDF DPIA скасовано.")
 
     except Exception as e:
         logger.error(f"PDF DPIA generation failed for user {user_id}: {e}", exc_info=True)
@@ -726,12 +581,33 @@ async def dpia_generate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     
     finally:
         try:
-            await generating_msg.delete()
+            await delete_message_later(context.bot, generating_msg.chat_id, generating_msg.message_id)
         except Exception as e:
             logger.warning(f"Не вдалося видалити 'Генерую...' {e}")
             
         return ConversationHandler.END
 
+# (v3.5) Кроки DPIA: текстові питання + список даних і цикл мінімізації
+DPIA_WIZARD = make_wizard(
+    "dpia", "dpia", "DPIA",
+    steps=[
+        TextStep('project_name', "DPIA_Q_PROJECT_NAME"),
+        TextStep('team', "DPIA_Q_TEAM"),
+        TextStep('goal', "DPIA_Q_GOAL"),
+        DataListStep('data_list', "DPIA_Q_DATA_LIST"),
+        MinimizationStep(),
+        TextStep('retention_period', "DPIA_Q_RETENTION_PERIOD"),
+        TextStep('retention_mechanism', "DPIA_Q_RETENTION_MECHANISM"),
+        TextStep('storage', "DPIA_Q_STORAGE"),
+        TextStep('risk', "DPIA_Q_RISK"),
+        TextStep('mitigation', "DPIA_Q_MITIGATION"),
+    ],
+    new_data=new_dpia_data,
+    new_fields=get_dpia_template_data,
+    formatter=format_dpia_field,
+    finish=dpia_generate,
+)
+
 
 # === 4. Логіка "Чек-ліста" (3/3) - v2.8 (Без змін, вона ідеальна) ===
 
@@ -771,283 +647,85 @@ def get_note_text_md(note: str) -> str:
         return "Нотатка: *Пропущено*"
     return f"Нотатка: `{html.escape(note)}`"
 
-def get_checklist_template_data(cl_data: dict) -> dict:
-    """(v2.8) Готує словник для заповнення шаблонів v2.8."""
-    data = {
-        'c1_s1_status': get_status_text_md(cl_data.get('c1_s1_status', '')),
-        'c1_s1_note': get_note_text_md(cl_data.get('c1_s1_note', '')),
-        'c1_s2_status': get_status_text_md(cl_data.get('c1_s2_status', '')),
-        'c1_s2_note': get_note_text_md(cl_data.get('c1_s2_note', '')),
-        'c1_s3_status': get_status_text_md(cl_data.get('c1_s3_status', '')),
-        'c1_s3_note': get_note_text_md(cl_data.get('c1_s3_note', '')),
-        
-        'c2_s1_status': get_status_text_md(cl_data.get('c2_s1_status', '')),
-        'c2_s1_note': get_note_text_md(cl_data.get('c2_s1_note', '')),
-        'c2_s2_status': get_status_text_md(cl_data.get('c2_s2_status', '')),
-        'c2_s2_note': get_note_text_md(cl_data.get('c2_s2_note', '')),
-        'c2_s3_status': get_status_text_md(cl_data.get('c2_s3_status', '')),
-        'c2_s3_note': get_note_text_md(cl_data.get('c2_s3_note', '')),
-
-        'c3_s1_status': get_status_text_md(cl_data.get('c3_s1_status', '')),
-        'c3_s1_note': get_note_text_md(cl_data.get('c3_s1_note', '')),
-        'c3_s2_status': get_status_text_md(cl_data.get('c3_s2_status', '')),
-        'c3_s2_note': get_note_text_md(cl_data.get('c3_s2_note', '')),
-        'c3_s3_status': get_status_text_md(cl_data.get('c3_s3_status', '')),
-        'c3_s3_note': get_note_text_md(cl_data.get('c3_s3_note', '')),
-    }
-    return data
-
-async def start_checklist(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """(v2.9) Починає "безшовну" розмову про Чек-ліст (з CallbackQuery)."""
-    query = update.callback_query
-    await query.answer()
-
-    clear_user_data(context)
-    logger.info(f"User {query.from_user.id} почав 'Чек-ліст'.")
-    context.user_data['cl'] = {} 
-    
-    # (v3.0) Редагуємо головне меню, щоб почати
-    text = templates.CHECKLIST_C1_S1_STATUS.format(**get_checklist_template_data({}))
-    await edit_main_message(context, text, get_checklist_status_keyboard(), new_message=True)
-    
-    return C1_S1_NOTE
-
-# --- Категорія 1 (Логіка v2.8) ---
-
-async def checklist_c1_s1_note(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    query = update.callback_query
-    await query.answer()
-    context.user_data['cl']['c1_s1_status'] = "yes" if query.data == "cl_yes" else "no"
-    
-    template_data = get_checklist_template_data(context.user_data['cl'])
-    text = templates.CHECKLIST_C1_S1_NOTE.format(**template_data)
-    await edit_main_message(context, text, get_skip_note_keyboard())
-    return C1_S2_STATUS 
-
-async def _ask_c1_s2_status(context: ContextTypes.DEFAULT_TYPE) -> int:
-    template_data = get_checklist_template_data(context.user_data['cl'])
-    text = templates.CHECKLIST_C1_S2_STATUS.format(**template_data)
-    await edit_main_message(context, text, get_checklist_status_keyboard())
-    return C1_S2_NOTE
-
-async def checklist_c1_s2_status_from_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data['cl']['c1_s1_note'] = update.message.text
-    await delete_user_text_reply(update)
-    return await _ask_c1_s2_status(context)
-
-async def checklist_c1_s2_status_from_skip(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    query = update.callback_query
-    await query.answer()
-    context.user_data['cl']['c1_s1_note'] = "*Пропущено*"
-    return await _ask_c1_s2_status(context)
-
-async def checklist_c1_s2_note(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    query = update.callback_query
-    await query.answer()
-    context.user_data['cl']['c1_s2_status'] = "yes" if query.data == "cl_yes" else "no"
-    template_data = get_checklist_template_data(context.user_data['cl'])
-    text = templates.CHECKLIST_C1_S2_NOTE.format(**template_data)
-    await edit_main_message(context, text, get_skip_note_keyboard())
-    return C1_S3_STATUS
-
-async def _ask_c1_s3_status(context: ContextTypes.DEFAULT_TYPE) -> int:
-    template_data = get_checklist_template_data(context.user_data['cl'])
-    text = templates.CHECKLIST_C1_S3_STATUS.format(**template_data)
-    await edit_main_message(context, text, get_checklist_status_keyboard())
-    return C1_S3_NOTE
-
-async def checklist_c1_s3_status_from_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data['cl']['c1_s2_note'] = update.message.text
-    await delete_user_text_reply(update)
-    return await _ask_c1_s3_status(context)
-
-async def checklist_c1_s3_status_from_skip(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    query = update.callback_query
-    await query.answer()
-    context.user_data['cl']['c1_s2_note'] = "*Пропущено*"
-    return await _ask_c1_s3_status(context)
-
-async def checklist_c1_s3_note(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    query = update.callback_query
-    await query.answer()
-    context.user_data['cl']['c1_s3_status'] = "yes" if query.data == "cl_yes" else "no"
-    template_data = get_checklist_template_data(context.user_data['cl'])
-    text = templates.CHECKLIST_C1_S3_NOTE.format(**template_data)
-    await edit_main_message(context, text, get_skip_note_keyboard())
-    return C2_S1_STATUS
-
-# --- Категорія 2 (Логіка v2.8) ---
-
-async def _ask_c2_s1_status(context: ContextTypes.DEFAULT_TYPE) -> int:
-    template_data = get_checklist_template_data(context.user_data['cl'])
-    text = templates.CHECKLIST_C2_S1_STATUS.format(**template_data)
-    await edit_main_message(context, text, get_checklist_status_keyboard())
-    return C2_S1_NOTE
-
-async def checklist_c2_s1_status_from_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data['cl']['c1_s3_note'] = update.message.text
-    await delete_user_text_reply(update)
-    return await _ask_c2_s1_status(context)
-
-async def checklist_c2_s1_status_from_skip(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    query = update.callback_query
-    await query.answer()
-    context.user_data['cl']['c1_s3_note'] = "*Пропущено*"
-    return await _ask_c2_s1_status(context)
-
-async def checklist_c2_s1_note(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    query = update.callback_query
-    await query.answer()
-    context.user_data['cl']['c2_s1_status'] = "yes" if query.data == "cl_yes" else "no"
-    template_data = get_checklist_template_data(context.user_data['cl'])
-    text = templates.CHECKLIST_C2_S1_NOTE.format(**template_data)
-    await edit_main_message(context, text, get_skip_note_keyboard())
-    return C2_S2_STATUS
-
-async def _ask_c2_s2_status(context: ContextTypes.DEFAULT_TYPE) -> int:
-    template_data = get_checklist_template_data(context.user_data['cl'])
-    text = templates.CHECKLIST_C2_S2_STATUS.format(**template_data)
-    await edit_main_message(context, text, get_checklist_status_keyboard())
-    return C2_S2_NOTE
-
-async def checklist_c2_s2_status_from_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data['cl']['c2_s1_note'] = update.message.text
-    await delete_user_text_reply(update)
-    return await _ask_c2_s2_status(context)
-
-async def checklist_c2_s2_status_from_skip(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    query = update.callback_query
-    await query.answer()
-    context.user_data['cl']['c2_s1_note'] = "*Пропущено*"
-    return await _ask_c2_s2_status(context)
-
-async def checklist_c2_s2_note(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    query = update.callback_query
-    await query.answer()
-    context.user_data['cl']['c2_s2_status'] = "yes" if query.data == "cl_yes" else "no"
-    template_data = get_checklist_template_data(context.user_data['cl'])
-    text = templates.CHECKLIST_C2_S2_NOTE.format(**template_data)
-    await edit_main_message(context, text, get_skip_note_keyboard())
-    return C2_S3_STATUS
-
-async def _ask_c2_s3_status(context: ContextTypes.DEFAULT_TYPE) -> int:
-    template_data = get_checklist_template_data(context.user_data['cl'])
-    text = templates.CHECKLIST_C2_S3_STATUS.format(**template_data)
-    await edit_main_message(context, text, get_checklist_status_keyboard())
-    return C2_S3_NOTE
-
-async def checklist_c2_s3_status_from_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data['cl']['c2_s2_note'] = update.message.text
-    await delete_user_text_reply(update)
-    return await _ask_c2_s3_status(context)
-
-async def checklist_c2_s3_status_from_skip(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    query = update.callback_query
-    await query.answer()
-    context.user_data['cl']['c2_s2_note'] = "*Пропущено*"
-    return await _ask_c2_s3_status(context)
-
-async def checklist_c2_s3_note(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    query = update.callback_query
-    await query.answer()
-    context.user_data['cl']['c2_s3_status'] = "yes" if query.data == "cl_yes" else "no"
-    template_data = get_checklist_template_data(context.user_data['cl'])
-    text = templates.CHECKLIST_C2_S3_NOTE.format(**template_data)
-    await edit_main_message(context, text, get_skip_note_keyboard())
-    return C3_S1_STATUS
-
-# --- Категорія 3 (Логіка v2.8) ---
-
-async def _ask_c3_s1_status(context: ContextTypes.DEFAULT_TYPE) -> int:
-    template_data = get_checklist_template_data(context.user_data['cl'])
-    text = templates.CHECKLIST_C3_S1_STATUS.format(**template_data)
-    await edit_main_message(context, text, get_checklist_status_keyboard())
-    return C3_S1_NOTE
-
-async def checklist_c3_s1_status_from_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data['cl']['c2_s3_note'] = update.message.text
-    await delete_user_text_reply(update)
-    return await _ask_c3_s1_status(context)
-
-async def checklist_c3_s1_status_from_skip(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    query = update.callback_query
-    await query.answer()
-    context.user_data['cl']['c2_s3_note'] = "*Пропущено*"
-    return await _ask_c3_s1_status(context)
-
-async def checklist_c3_s1_note(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    query = update.callback_query
-    await query.answer()
-    context.user_data['cl']['c3_s1_status'] = "yes" if query.data == "cl_yes" else "no"
-    template_data = get_checklist_template_data(context.user_data['cl'])
-    text = templates.CHECKLIST_C3_S1_NOTE.format(**template_data)
-    await edit_main_message(context, text, get_skip_note_keyboard())
-    return C3_S2_STATUS
-
-async def _ask_c3_s2_status(context: ContextTypes.DEFAULT_TYPE) -> int:
-    template_data = get_checklist_template_data(context.user_data['cl'])
-    text = templates.CHECKLIST_C3_S2_STATUS.format(**template_data)
-    await edit_main_message(context, text, get_checklist_status_keyboard())
-    return C3_S2_NOTE
-
-async def checklist_c3_s2_status_from_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data['cl']['c3_s1_note'] = update.message.text
-    await delete_user_text_reply(update)
-    return await _ask_c3_s2_status(context)
-
-async def checklist_c3_s2_status_from_skip(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int: # (v3.1.1) ВИПРАВЛЕНО ОДРУКІВКУ TPE -> TYPE
-    query = update.callback_query
-    await query.answer()
-    context.user_data['cl']['c3_s1_note'] = "*Пропущено*"
-    return await _ask_c3_s2_status(context)
-
-async def checklist_c3_s2_note(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    query = update.callback_query
-    await query.answer()
-    context.user_data['cl']['c3_s2_status'] = "yes" if query.data == "cl_yes" else "no"
-    template_data = get_checklist_template_data(context.user_data['cl'])
-    text = templates.CHECKLIST_C3_S2_NOTE.format(**template_data)
-    await edit_main_message(context, text, get_skip_note_keyboard())
-    return C3_S3_STATUS
-
-async def _ask_c3_s3_status(context: ContextTypes.DEFAULT_TYPE) -> int:
-    template_data = get_checklist_template_data(context.user_data['cl'])
-    text = templates.CHECKLIST_C3_S3_STATUS.format(**template_data)
-    await edit_main_message(context, text, get_checklist_status_keyboard())
-    return C3_S3_NOTE
-
-async def checklist_c3_s3_status_from_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data['cl']['c3_s2_note'] = update.message.text
-    await delete_user_text_reply(update)
-    return await _ask_c3_s3_status(context)
-
-async def checklist_c3_s3_status_from_skip(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    query = update.callback_query
-    await query.answer()
-    context.user_data['cl']['c3_s2_note'] = "*Пропущено*"
-    return await _ask_c3_s3_status(context)
-
-async def checklist_c3_s3_note(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    query = update.callback_query
-    await query.answer()
-    context.user_data['cl']['c3_s3_status'] = "yes" if query.data == "cl_yes" else "no"
-    template_data = get_checklist_template_data(context.user_data['cl'])
-    text = templates.CHECKLIST_C3_S3_NOTE.format(**template_data)
-    await edit_main_message(context, text, get_skip_note_keyboard())
-    return CHECKLIST_GENERATE
-
-# --- Генерація (Логіка v2.8) ---
-
-async def checklist_generate_from_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    context.user_data['cl']['c3_s3_note'] = update.message.text
-    await delete_user_text_reply(update)
-    return await checklist_generate(update, context)
+# (v3.5) Пункти Чек-ліста - з таблиці templates.CHECKLIST_PDF_SECTIONS: новий пункт - це новий рядок
+# там (+ шаблони питань CHECKLIST_<ПУНКТ>_STATUS / CHECKLIST_<ПУНКТ>_NOTE)
+CHECKLIST_ITEMS = tuple(key for _, items in templates.CHECKLIST_PDF_SECTIONS for _, key in items)
+CHECKLIST_FIELDS = frozenset(f"{item}_{kind}" for item in CHECKLIST_ITEMS for kind in ('status', 'note'))
+CHECKLIST_STATUS_ICONS = {"yes": "✅", "no": "❌"}
+
+def get_checklist_layout(sections: tuple) -> dict:
+    """Пункт → (категорія, назва пункту, ключі пунктів категорії, наступна категорія або None)."""
+    layout = {}
+    for index, (category, items) in enumerate(sections):
+        next_category = sections[index + 1][0] if index + 1 < len(sections) else None
+        keys = tuple(key for _, key in items)
+        for title, key in items:
+            layout[key] = (category, title, keys, next_category)
+    return layout
+
+CHECKLIST_LAYOUT = get_checklist_layout(templates.CHECKLIST_PDF_SECTIONS)
+
+def format_checklist_field(key: str, value: str) -> str:
+    """Готує одну відповідь Чек-ліста (статус або нотатку) для шаблонів."""
+    if key.endswith('_status'):
+        return get_status_text_md(value)
+    return get_note_text_md(value)
+
+def add_checklist_summary_item(fields: dict, cl_data: dict, item: str) -> None:
+    """
+    (v3.5) Дописує до підсумку в fields['summary'] щойно завершений пункт: рендериться лише
+    його фрагмент, а не весь попередній чек-ліст. Завершена категорія згортається в один
+    рядок зі статусами (fields['summary_done']), тож повідомлення не росте з кожним пунктом.
+    """
+    category, title, keys, next_category = CHECKLIST_LAYOUT[item]
+    if item != keys[-1]:
+        fields['summary'] += render_template(
+            "CHECKLIST_SUMMARY_ITEM", title=title, status=fields[f"{item}_status"], note=fields[f"{item}_note"]
+        )
+        return
+    statuses = " ".join(CHECKLIST_STATUS_ICONS.get(cl_data.get(f"{key}_status"), "—") for key in keys)
+    fields['summary_done'] += render_template("CHECKLIST_SUMMARY_CATEGORY_DONE", category=category, statuses=statuses)
+    fields['summary'] = fields['summary_done']
+    if next_category is not None:
+        fields['summary'] += render_template("CHECKLIST_SUMMARY_CATEGORY", category=next_category)
 
-async def checklist_generate_from_skip(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    query = update.callback_query
-    await query.answer()
-    context.user_data['cl']['c3_s3_note'] = "*Пропущено*"
-    return await checklist_generate(update, context)
+def get_checklist_template_data(cl_data: dict) -> dict:
+    """(v2.8) Готує словник для заповнення шаблонів: поля відповідей і підсумок уже завершених пунктів."""
+    fields = {key: format_checklist_field(key, cl_data.get(key, '')) for key in CHECKLIST_FIELDS}
+    fields['summary_done'] = ""
+    fields['summary'] = render_template("CHECKLIST_SUMMARY_CATEGORY", category=templates.CHECKLIST_PDF_SECTIONS[0][0])
+    for item in CHECKLIST_ITEMS:
+        if f"{item}_note" not in cl_data:
+            break
+        add_checklist_summary_item(fields, cl_data, item)
+    return fields
+
+CHECKLIST_STATUS_CHOICES = {"cl_yes": "yes", "cl_no": "no"}
+CHECKLIST_SKIP_NOTE = {"cl_skip_note": "*Пропущено*"}
+
+class ChecklistNoteStep(TextStep):
+    """Нотатка завершує пункт: його фрагмент одразу дописується до підсумку Чек-ліста."""
+
+    __slots__ = ("item",)
+
+    def __init__(self, item: str, reply_markup: InlineKeyboardMarkup):
+        super().__init__(f"{item}_note", f"CHECKLIST_{item.upper()}_NOTE", reply_markup, skip=CHECKLIST_SKIP_NOTE)
+        self.item = item
+
+    async def handle(self, wizard: Wizard, update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+        await super().handle(wizard, update, context)
+        add_checklist_summary_item(wizard.fields(context), context.user_data[wizard.section], self.item)
+        return True
+
+def get_checklist_steps(items: tuple) -> list:
+    """Два кроки на пункт: статус (кнопки) і нотатка (текст або "Пропустити")."""
+    status_keyboard = get_checklist_status_keyboard()
+    skip_keyboard = get_skip_note_keyboard()
+    steps = []
+    for item in items:
+        steps.append(ChoiceStep(f"{item}_status", f"CHECKLIST_{item.upper()}_STATUS", status_keyboard, CHECKLIST_STATUS_CHOICES))
+        steps.append(ChecklistNoteStep(item, skip_keyboard))
+    return steps
 
 async def checklist_generate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """(ОНОВЛЕНО v3.1) Генерує PDF Чек-ліста та показує кнопку "Повернутись"."""
@@ -1061,75 +739,26 @@ async def checklist_generate(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     generating_msg = await context.bot.send_message(
         chat_id=chat_id,
-        text="Дякую! Аудит 9/9 завершено. Генерую ваш Чек-ліст PDF..."
+        text=f"Дякую! Аудит {len(CHECKLIST_ITEMS)}/{len(CHECKLIST_ITEMS)} завершено. Генерую ваш Чек-ліст PDF..."
     )
 
-    data = context.user_data['cl']
-    
-    def get_status_md_text(status_key: str) -> str:
-        status = data.get(status_key)
-        if status == "yes":
-            return "Виконано"
-        elif status == "no":
-            return "Не виконано"
-        else:
-            return "Не заповнено"
-
-    def get_note_md_text_pdf(note_key: str) -> str:
-        note = data.get(note_key, "*Не заповнено*")
-        if note == "*Пропущено*":
-            return note
-        note_safe = html.escape(note)
-        return note_safe.replace("\n", "<br>") 
-
-    table_header = "| Пункт | Статус | Ваші Нотатки (для себе) |\n| :--- | :--- | :--- |\n"
-    
-    cat_1_header = "### Категорія 1: Контроль Доступу\n\n"
-    cat_1_rows = [
-        f"| 1.1. 2FA (Двофакторна Автентифікація) | {get_status_md_text('c1_s1_status')} | {get_note_md_text_pdf('c1_s1_note')} |",
-        f"| 1.2. Принцип 'Найменших привілеїв' | {get_status_md_text('c1_s2_status')} | {get_note_md_text_pdf('c1_s2_note')} |",
-        f"| 1.3. БЕЗ ПУБЛІЧНИХ ПОСИЛАНЬ | {get_status_md_text('c1_s3_status')} | {get_note_md_text_pdf('c1_s3_note')} |",
-    ]
-    cat_1_table = cat_1_header + table_header + "\n".join(cat_1_rows)
-
-    cat_2_header = "\n\n### Категорія 2: Права Користувачів\n\n"
-    cat_2_rows = [
-        f"| 2.1. Публічна Політика | {get_status_md_text('c2_s1_status')} | {get_note_md_text_pdf('c2_s1_note')} |",
-        f"| 2.2. Механізм Видалення (Ст. 8) | {get_status_md_text('c2_s2_status')} | {get_note_md_text_pdf('c2_s2_note')} |",
-        f"| 2.3. Контакт для скарг | {get_status_md_text('c2_s3_status')} | {get_note_md_text_pdf('c2_s3_note')} |",
-    ]
-    cat_2_table = cat_2_header + table_header + "\n".join(cat_2_rows)
-
-    cat_3_header = "\n\n### Категорія 3: Технічна Гігієна\n\n"
-    cat_3_rows = [
-        f"| 3.1. Безпека Токенів | {get_status_md_text('c3_s1_status')} | {get_note_md_text_pdf('c3_s1_note')} |",
-        f"| 3.2. Планування Строків (Retention) | {get_status_md_text('c3_s2_status')} | {get_note_md_text_pdf('c3_s2_note')} |",
-        f"| 3.3. Шифрування (Якщо є паролі) | {get_status_md_text('c3_s3_status')} | {get_note_md_text_pdf('c3_s3_note')} |",
-    ]
-    cat_3_table = cat_3_header + table_header + "\n".join(cat_3_rows)
-
-    checklist_content = f"{cat_1_table}{cat_2_table}{cat_3_table}"
-
-    data_dict = {
-        'date': date.today().strftime("%d.%m.%Y"),
-        'checklist_content': checklist_content 
-    }
+    # (v3.5) Документ збирається з відповідей одразу в HTML (див. documents.py)
+    content, is_html = build_checklist(context.user_data['cl'])
     
     # (v3.0) Очищуємо дані ДО генерації
     clear_user_data(context)
 
     try:
-        filled_markdown = templates.CHECKLIST_TEMPLATE_PDF.format(**data_dict)
-        
-        pdf_file_path = create_pdf_from_markdown(
-            content=filled_markdown,
-            is_html=False, 
-            output_filename=f"checklist_{user_id}.pdf"
+        pdf_bytes = await create_pdf_bytes_from_markdown_async(
+            content=content,
+            is_html=is_html,
+            owner=chat_id
         )
         
-        await generating_msg.delete()
+        await delete_message_later(context.bot, generating_msg.chat_id, generating_msg.message_id)
         
-        await context.bot.send_document(chat_id=chat_id, document=open(pdf_file_path, 'rb'))
+        # (v3.4) Однаковий PDF надсилається повторно через file_id, без завантаження
+        await send_document_cached(context.bot, chat_id, pdf_bytes, "security_checklist.pdf")
         
         # (v3.2) Використовуємо helper-функцію
         await context.bot.send_message(
@@ -1137,12 +766,19 @@ async def checklist_generate(update: Update, context: ContextTypes.DEFAULT_TYPE)
             text="Ваш детальний Чек-ліст готовий. Я видалив усі ваші відповіді зі своєї пам'яті.",
             reply_markup=get_post_action_keyboard()
         )
-        clear_temp_file(pdf_file_path)
+
+    except PdfRenderCancelled:
+        # (v3.5) Користувач натиснув /cancel — він сам відповість і поверне в меню
+        logger.info(f"User {user_id}: генерацію PDF Чек-ліста скасовано.")
+        try:
+            await delete_message_later(context.bot, generating_msg.chat_id, generating_msg.message_id)
+        except Exception:
+            pass
 
     except Exception as e:
         logger.error(f"PDF Checklist generation failed for user {user_id}: {e}", exc_info=True)
         try:
-            await generating_msg.delete()
+            await delete_message_later(context.bot, generating_msg.chat_id, generating_msg.message_id)
         except Exception:
             pass
         await context.bot.send_message(chat_id=chat_id, text=f"Під час генерації PDF сталася помилка: {e}")
@@ -1152,97 +788,89 @@ async def checklist_generate(update: Update, context: ContextTypes.DEFAULT_TYPE)
     finally:
         return ConversationHandler.END
 
+CHECKLIST_WIZARD = make_wizard(
+    "checklist", "cl", "Чек-ліст",
+    steps=get_checklist_steps(CHECKLIST_ITEMS),
+    new_data=dict,
+    new_fields=get_checklist_template_data,
+    formatter=format_checklist_field,
+    finish=checklist_generate,
+)
 
-# === 5. Налаштування та Запуск Бота ===
+WIZARDS = (POLICY_WIZARD, DPIA_WIZARD, CHECKLIST_WIZARD)
 
-def main() -> None: # (v3.1.2) Повернено до СИНХРОННОЇ
-    """Запускає бота."""
-    application = Application.builder().token(BOT_TOKEN).build()
-
-    # (ОНОВЛЕНО v3.0) Entry points тепер реагують на CallbackQuery з меню /start
-    policy_conv_handler = ConversationHandler(
-        entry_points=[CallbackQueryHandler(start_policy, pattern="^start_policy$")],
-        states={
-            POLICY_Q_CONTACT: [MessageHandler(filters.TEXT & ~filters.COMMAND, policy_q_contact)],
-            POLICY_Q_DATA_COLLECTED: [MessageHandler(filters.TEXT & ~filters.COMMAND, policy_q_data_collected)],
-            POLICY_Q_DATA_STORAGE: [MessageHandler(filters.TEXT & ~filters.COMMAND, policy_q_data_storage)],
-            POLICY_Q_DELETE_MECHANISM: [MessageHandler(filters.TEXT & ~filters.COMMAND, policy_q_delete_mechanism)],
-            POLICY_GENERATE: [MessageHandler(filters.TEXT & ~filters.COMMAND, policy_generate)],
-        },
-        fallbacks=[CommandHandler("cancel", cancel)],
-    )
-    
-    dpia_conv_handler = ConversationHandler(
-        entry_points=[CallbackQueryHandler(start_dpia, pattern="^start_dpia$")],
-        states={
-            DPIA_Q_TEAM: [MessageHandler(filters.TEXT & ~filters.COMMAND, dpia_q_team)],
-            DPIA_Q_GOAL: [MessageHandler(filters.TEXT & ~filters.COMMAND, dpia_q_goal)],
-            DPIA_Q_DATA_LIST: [MessageHandler(filters.TEXT & ~filters.COMMAND, dpia_q_data_list)],
-            DPIA_Q_MINIMIZATION_START: [MessageHandler(filters.TEXT & ~filters.COMMAND, dpia_q_minimization_start)],
-            DPIA_Q_MINIMIZATION_REASON: [CallbackQueryHandler(dpia_q_minimization_reason, pattern="^min_(yes|no)$")],
-            DPIA_Q_MINIMIZATION_STATUS: [MessageHandler(filters.TEXT & ~filters.COMMAND, dpia_q_minimization_status)],
-            # (v3.1 fix) DPIA_Q_RETENTION_PERIOD - це стан, а не функція. 
-            # Функція dpia_minimization_finished() повертає стан DPIA_Q_RETENTION_MECHANISM, 
-            # але має повертати DPIA_Q_RETENTION_PERIOD. 
-            # Але оскільки dpia_minimization_finished викликає edit_main_message з текстом для DPIA_Q_RETENTION_PERIOD, 
-            # наступний MessageHandler має бути DPIA_Q_RETENTION_MECHANISM. 
-            # Тому:
-            # 1. dpia_minimization_finished -> повертає DPIA_Q_RETENTION_MECHANISM
-            # 2. states[DPIA_Q_RETENTION_MECHANISM] -> викликає dpia_q_retention_mechanism
-            # Це вірно.
-            DPIA_Q_RETENTION_MECHANISM: [MessageHandler(filters.TEXT & ~filters.COMMAND, dpia_q_retention_mechanism)],
-            DPIA_Q_STORAGE: [MessageHandler(filters.TEXT & ~filters.COMMAND, dpia_q_storage)],
-            DPIA_Q_RISK: [MessageHandler(filters.TEXT & ~filters.COMMAND, dpia_q_risk)],
-            DPIA_Q_MITIGATION: [MessageHandler(filters.TEXT & ~filters.COMMAND, dpia_q_mitigation)],
-            DPIA_GENERATE: [MessageHandler(filters.TEXT & ~filters.COMMAND, dpia_generate)],
-        },
-        fallbacks=[CommandHandler("cancel", cancel)],
-    )
 
-    checklist_conv_handler = ConversationHandler(
-        entry_points=[CallbackQueryHandler(start_checklist, pattern="^start_checklist$")],
-        states={
-            # Cat 1
-            C1_S1_NOTE: [CallbackQueryHandler(checklist_c1_s1_note, pattern="^cl_(yes|no)$")],
-            C1_S2_STATUS: [MessageHandler(filters.TEXT & ~filters.COMMAND, checklist_c1_s2_status_from_text)],
-            C1_S2_STATUS_SKIP: [CallbackQueryHandler(checklist_c1_s2_status_from_skip, pattern="^cl_skip_note$")],
-            C1_S2_NOTE: [CallbackQueryHandler(checklist_c1_s2_note, pattern="^cl_(yes|no)$")],
-            C1_S3_STATUS: [MessageHandler(filters.TEXT & ~filters.COMMAND, checklist_c1_s3_status_from_text)],
-            C1_S3_STATUS_SKIP: [CallbackQueryHandler(checklist_c1_s3_status_from_skip, pattern="^cl_skip_note$")],
-            C1_S3_NOTE: [CallbackQueryHandler(checklist_c1_s3_note, pattern="^cl_(yes|no)$")],
-            
-            # Cat 2
-            C2_S1_STATUS: [MessageHandler(filters.TEXT & ~filters.COMMAND, checklist_c2_s1_status_from_text)],
-            C2_S1_STATUS_SKIP: [CallbackQueryHandler(checklist_c2_s1_status_from_skip, pattern="^cl_skip_note$")],
-            C2_S1_NOTE: [CallbackQueryHandler(checklist_c2_s1_note, pattern="^cl_(yes|no)$")],
-            C2_S2_STATUS: [MessageHandler(filters.TEXT & ~filters.COMMAND, checklist_c2_s2_status_from_text)],
-            C2_S2_STATUS_SKIP: [CallbackQueryHandler(checklist_c2_s2_status_from_skip, pattern="^cl_skip_note$")],
-            C2_S2_NOTE: [CallbackQueryHandler(checklist_c2_s2_note, pattern="^cl_(yes|no)$")],
-            C2_S3_STATUS: [MessageHandler(filters.TEXT & ~filters.COMMAND, checklist_c2_s3_status_from_text)],
-            C2_S3_STATUS_SKIP: [CallbackQueryHandler(checklist_c2_s3_status_from_skip, pattern="^cl_skip_note$")],
-            C2_S3_NOTE: [CallbackQueryHandler(checklist_c2_s3_note, pattern="^cl_(yes|no)$")],
-            
-            # Cat 3
-            C3_S1_STATUS: [MessageHandler(filters.TEXT & ~filters.COMMAND, checklist_c3_s1_status_from_text)],
-            C3_S1_STATUS_SKIP: [CallbackQueryHandler(checklist_c3_s1_status_from_skip, pattern="^cl_skip_note$")],
-            C3_S1_NOTE: [CallbackQueryHandler(checklist_c3_s1_note, pattern="^cl_(yes|no)$")],
-            C3_S2_STATUS: [MessageHandler(filters.TEXT & ~filters.COMMAND, checklist_c3_s2_status_from_text)],
-            C3_S2_STATUS_SKIP: [CallbackQueryHandler(checklist_c3_s2_status_from_skip, pattern="^cl_skip_note$")],
-            C3_S2_NOTE: [CallbackQueryHandler(checklist_c3_s2_note, pattern="^cl_(yes|no)$")],
-            C3_S3_STATUS: [MessageHandler(filters.TEXT & ~filters.COMMAND, checklist_c3_s3_status_from_text)],
-            C3_S3_STATUS_SKIP: [CallbackQueryHandler(checklist_c3_s3_status_from_skip, pattern="^cl_skip_note$")],
-            C3_S3_NOTE: [CallbackQueryHandler(checklist_c3_s3_note, pattern="^cl_(yes|no)$")],
-
-            # Generate
-            CHECKLIST_GENERATE: [MessageHandler(filters.TEXT & ~filters.COMMAND, checklist_generate_from_text)],
-            CHECKLIST_GENERATE_SKIP: [CallbackQueryHandler(checklist_generate_from_skip, pattern="^cl_skip_note$")],
-        },
-        fallbacks=[CommandHandler("cancel", cancel)],
-    )
+# === 5. Налаштування та Запуск Бота ===
 
-    application.add_handler(policy_conv_handler)
-    application.add_handler(dpia_conv_handler)
-    application.add_handler(checklist_conv_handler)
+# Які поля бот надає кожній групі шаблонів (перевіряється при старті)
+TEMPLATE_FIELDS = {
+    "POLICY_TEMPLATE": POLICY_FIELDS + ('date',),
+    "POLICY_Q_*": POLICY_FIELDS,
+    "DPIA_TEMPLATE": ('project_name', 'date', 'dpia_table'),
+    "DPIA_Q_MINIMIZATION_*": DPIA_FIELDS + ('count', 'item'),
+    "DPIA_Q_*": DPIA_FIELDS,
+    "CHECKLIST_TEMPLATE_PDF": ('date', 'checklist_content'),
+    "CHECKLIST_SUMMARY_ITEM": ('title', 'status', 'note'),
+    "CHECKLIST_SUMMARY_CATEGORY_DONE": ('category', 'statuses'),
+    "CHECKLIST_SUMMARY_CATEGORY": ('category',),
+    "CHECKLIST_*": CHECKLIST_FIELDS | {'summary'},
+}
+
+async def post_init(application: Application) -> None:
+    """Запускає фонові задачі бота."""
+    if MESSAGE_CLEANUP_QUEUE:
+        message_cleanup.start(application.bot)
+    # (v3.5) Покинуті майстри не живуть вічно (див. session.py)
+    sessions.start(application, derived_keys=[wizard.fields_key for wizard in WIZARDS])
+
+async def post_stop(application: Application) -> None:
+    """Дописує фонові edit-и та дочищає чергу видалень, поки бот ще може робити запити."""
+    await sessions.stop()
+    await main_message_editor.wait_idle()
+    await message_cleanup.stop()
+
+async def post_shutdown(application: Application) -> None:
+    """Звільняє ресурси після зупинки бота."""
+    shutdown_pdf_workers()
+
+def build_application() -> Application:
+    """Створює Application з усіма хендлерами (без запуску)."""
+    # (v3.5) З BOT_PERSISTENCE=sqlite стан майстрів переживає рестарти (див. persistence.py)
+    persistence = create_persistence()
+    builder = Application.builder().token(BOT_TOKEN).post_init(post_init).post_stop(post_stop).post_shutdown(post_shutdown)
+    builder = configure_api_endpoint(builder)
+    # (v3.5) Окремий пул з'єднань для PDF, довгий keep-alive для кроків майстра
+    builder = configure_http_client(builder)
+    # (v3.5) Різні користувачі обробляються паралельно, кроки одного користувача - по черзі;
+    # /cancel, що чекає своєї черги, одразу зупиняє генерацію PDF
+    builder = builder.concurrent_updates(
+        PerChatUpdateProcessor(BOT_CONCURRENT_UPDATES, BOT_MAX_PENDING_UPDATES, on_busy=interrupt_pdf_render)
+    )
+    # (v3.5) Ліміти Telegram: черги пріоритетів + повтор після RetryAfter
+    rate_limiter = create_rate_limiter()
+    if rate_limiter is not None:
+        builder = builder.rate_limiter(rate_limiter)
+    if persistence is not None:
+        builder = builder.persistence(persistence)
+    application = builder.build()
+
+    # (v3.5) Облік активності сесій - до всіх інших хендлерів
+    application.add_handler(TypeHandler(Update, sessions.touch), group=-1)
+
+    # (v3.5) Майстри описані таблицями кроків (див. wizard.py): один стан і один хендлер на майстер
+    fallbacks = [CommandHandler("cancel", cancel)]
+    # (v3.5) Покинуту розмову завершує PTB (conversation_timeout), а sessions.expire стирає решту сесії
+    timeout = sessions.idle_timeout
+    if timeout and application.job_queue is None:
+        logger.warning("JobQueue недоступний (pip install \"python-telegram-bot[job-queue]\"): розмови без тайм-ауту.")
+        timeout = None
+    for wizard in WIZARDS:
+        application.add_handler(
+            wizard.conversation_handler(
+                f"^start_{wizard.name}$", fallbacks, persistent=persistence is not None,
+                timeout=timeout, on_timeout=sessions.expire,
+            )
+        )
     
     # Головні команди та кнопки меню
     application.add_handler(CommandHandler("start", start))
@@ -1259,13 +887,24 @@ def main() -> None: # (v3.1.2) Повернено до СИНХРОННОЇ
     # Глобальний fallback 'cancel' (ловить /cancel будь-де)
     application.add_handler(CommandHandler("cancel", cancel)) 
 
+    return application
+
+def main() -> None: # (v3.1.2) Повернено до СИНХРОННОЇ
+    """Запускає бота."""
+    validate_templates(TEMPLATE_FIELDS)
+
+    # Один раз визначаємо доступні PDF-рушії (wkhtmltopdf / xhtml2pdf)
+    probe_backends()
+
+    application = build_application()
+
     # (v3.1.2) Ми не можемо отримати username до запуску run_polling(),
     # тому що run_polling() - це синхронний блокуючий виклик.
     # ЛОГ про username з'явиться автоматично ПІСЛЯ запуску.
     logger.info("Бот запускається...")
     
-    # (v3.1.2) run_polling() - це блокуюча, синхронна функція.
-    application.run_polling() 
+    # (v3.5) run_polling() або run_webhook() за BOT_RUN_MODE - блокуючі, синхронні функції.
+    run_application(application)
 
 if __name__ == "__main__":
     # (v3.1.2) Запускаємо синхронну main
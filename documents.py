@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+Збирання PDF-документів (Політика, DPIA Lite, Чек-ліст) з відповідей користувача.
+
+Два шляхи:
+  - "html" (за замовчуванням): HTML-тіло документа будується напряму з відповідей,
+    без markdown2 на кожен запит. Статичні Markdown-шаблони (POLICY_TEMPLATE тощо)
+    конвертуються в HTML один раз при імпорті; таблиці збираються одразу як HTML.
+  - "markdown" (сумісність): як раніше — заповнений Markdown-шаблон,
+    який pdf_utils проганяє через markdown2.
+Перемикається env DOCUMENT_RENDER_MODE=html|markdown.
+
+Усе статичне (HTML шаблонів, шапки таблиць, заголовки й назви пунктів Чек-ліста)
+готується один раз; на запит збираються лише фрагменти з відповідями.
+Що обидва шляхи дають байт у байт той самий HTML, перевіряють еталонні тести
+(tests/test_documents.py, еталони — tests/golden/).
+
+build_policy / build_dpia / build_checklist повертають (content, is_html),
+що передається прямо в pdf_utils.create_pdf_bytes_from_markdown*().
+"""
+
+import html
+import logging
+import os
+from datetime import date
+
+import markdown2
+
+import templates
+from pdf_utils import MARKDOWN_EXTRAS
+from template_engine import CompiledTemplate, render as render_template
+
+logger = logging.getLogger("documents")
+
+DOCUMENT_RENDER_MODE = os.getenv("DOCUMENT_RENDER_MODE", "html").lower()
+
+POLICY_DEFAULTS = {
+    'project_name': '[Назва Вашого Проєкту]',
+    'contact': '[Ваш @username або email]',
+    'data_collected': '[Дані, які ви збираєте]',
+    'data_storage': '[Де ви зберігаєте дані]',
+    'delete_mechanism': '[Опишіть простий механізм]',
+}
+
+CHECKLIST_TABLE_HEADERS = ("Пункт", "Статус", "Ваші Нотатки (для себе)")
+DPIA_TABLE_HEADERS = ("Питання", "Відповідь")
+
+
+def _today() -> str:
+    return date.today().strftime("%d.%m.%Y")
+
+def _get_status_text(status: str) -> str:
+    if status == "yes":
+        return "Виконано"
+    elif status == "no":
+        return "Не виконано"
+    else:
+        return "Не заповнено"
+
+
+# === Шлях "markdown" (сумісність) ===
+
+def build_policy_markdown(answers: dict) -> str:
+    data_dict = {key: html.escape(answers.get(key, default)) for key, default in POLICY_DEFAULTS.items()}
+    data_dict['date'] = _today()
+    return render_template("POLICY_TEMPLATE", data_dict)
+
+def build_dpia_markdown(answers: dict) -> str:
+    def get_data(key, default='[Не вказано]'):
+        return html.escape(answers.get(key, default))
+
+    # Готуємо дані для PDF
+    table_rows = []
+    table_rows.append(f"| Назва проєкту: | {get_data('project_name')} |")
+    table_rows.append(f"| Керівник/Розробник: | {get_data('team')} |")
+    table_rows.append(f"| Мета: | {get_data('goal')} |")
+
+    minimization_data = answers.get('minimization_data', [])
+    if not minimization_data:
+        table_rows.append("| Дані: | [Не вказано] |")
+    else:
+        for i, item in enumerate(minimization_data):
+            data_name = f"Дані (пункт {i+1}):"
+            item_name = html.escape(item['item'])
+            item_reason = html.escape(item['reason'])
+
+            if item['needed']:
+                data_value = f"{item_name} (✅ **Навіщо:** {item_reason})"
+            else:
+                data_value = f"~~{item_name}~~ (❌ **Відмовлено**)"
+
+            table_rows.append(f"| {data_name} | {data_value} |")
+
+    table_rows.append(f"| Строк Зберігання: | {get_data('retention_period')} |")
+    table_rows.append(f"| Механізм Видалення: | {get_data('retention_mechanism')} |")
+    table_rows.append(f"| Місце Зберігання: | {get_data('storage')} |")
+    table_rows.append(f"| Головний Ризик: | {get_data('risk')} |")
+    table_rows.append(f"| Мінімізація Ризику: | {get_data('mitigation')} |")
+
+    table_header = "| Питання | Відповідь |\n| :--- | :--- |\n"
+    data_dict = {
+        'project_name': get_data('project_name'),
+        'date': _today(),
+        'dpia_table': table_header + "\n".join(table_rows),
+    }
+    return render_template("DPIA_TEMPLATE", data_dict)
+
+def build_checklist_markdown(answers: dict) -> str:
+    def get_note_md_text_pdf(note_key: str) -> str:
+        note = answers.get(note_key, "*Не заповнено*")
+        if note == "*Пропущено*":
+            return note
+        note_safe = html.escape(note)
+        return note_safe.replace("\n", "<br>")
+
+    table_header = "| Пункт | Статус | Ваші Нотатки (для себе) |\n| :--- | :--- | :--- |\n"
+    sections = []
+    for title, items in templates.CHECKLIST_PDF_SECTIONS:
+        rows = [
+            f"| {name} | {_get_status_text(answers.get(f'{key}_status'))} | {get_note_md_text_pdf(f'{key}_note')} |"
+            for name, key in items
+        ]
+        sections.append(f"### {title}\n\n" + table_header + "\n".join(rows))
+
+    data_dict = {
+        'date': _today(),
+        'checklist_content': "\n\n".join(sections),
+    }
+    return render_template("CHECKLIST_TEMPLATE_PDF", data_dict)
+
+
+# === Шлях "html" ===
+
+def _compile_html_template(name: str, block_fields: tuple = ()) -> CompiledTemplate:
+    """
+    Один раз конвертує Markdown-шаблон templates.<name> у HTML, зберігаючи плейсхолдери.
+    block_fields — поля, що стоять окремим абзацом і підставляються готовими блоками
+    (таблицями), тому обгортка <p> навколо них прибирається.
+    """
+    source = getattr(templates, name)
+    html_source = markdown2.markdown(source, extras=MARKDOWN_EXTRAS)
+    for field in block_fields:
+        html_source = html_source.replace(f"<p>{{{field}}}</p>", f"{{{field}}}")
+    compiled = CompiledTemplate(f"{name}[html]", html_source)
+    expected = CompiledTemplate(name, source).fields
+    if compiled.fields != expected:
+        raise ValueError(f"Шаблон {name}: плейсхолдери загубились при конвертації в HTML")
+    return compiled
+
+POLICY_HTML = _compile_html_template("POLICY_TEMPLATE")
+DPIA_HTML = _compile_html_template("DPIA_TEMPLATE", block_fields=("dpia_table",))
+CHECKLIST_HTML = _compile_html_template("CHECKLIST_TEMPLATE_PDF", block_fields=("checklist_content",))
+
+def _html_text(value: str) -> str:
+    """Екранує відповідь користувача; переноси рядків → <br /> (як break-on-newline)."""
+    return html.escape(value).replace("\n", "<br />\n")
+
+def _html_table_head(headers: tuple) -> str:
+    """Початок таблиці (до <tbody>) у тій самій розмітці, що генерує markdown2 для `| :--- |`."""
+    cells = "".join(f'  <th style="text-align:left;">{header}</th>\n' for header in headers)
+    return f"<table>\n<thead>\n<tr>\n{cells}</tr>\n</thead>\n<tbody>\n"
+
+DPIA_TABLE_HEAD = _html_table_head(DPIA_TABLE_HEADERS)
+CHECKLIST_TABLE_HEAD = _html_table_head(CHECKLIST_TABLE_HEADERS)
+
+# (заголовок категорії + шапка таблиці, ((екранована назва пункту, ключ), ...))
+CHECKLIST_HTML_SECTIONS = tuple(
+    (
+        f"<h3>{html.escape(title, quote=False)}</h3>\n\n" + CHECKLIST_TABLE_HEAD,
+        tuple((html.escape(name, quote=False), key) for name, key in items),
+    )
+    for title, items in templates.CHECKLIST_PDF_SECTIONS
+)
+
+def _html_table(table_head: str, rows: list) -> str:
+    """Таблиця: готова шапка (_html_table_head) + рядки з комірками."""
+    parts = [table_head]
+    for row in rows:
+        parts.append("<tr>\n")
+        parts.extend(f'  <td style="text-align:left;">{cell}</td>\n' for cell in row)
+        parts.append("</tr>\n")
+    parts.append("</tbody>\n</table>")
+    return "".join(parts)
+
+def build_policy_html(answers: dict) -> str:
+    data_dict = {key: _html_text(answers.get(key, default)) for key, default in POLICY_DEFAULTS.items()}
+    data_dict['date'] = _today()
+    return POLICY_HTML.render(data_dict)
+
+def build_dpia_html(answers: dict) -> str:
+    def get_data(key, default='[Не вказано]'):
+        return _html_text(answers.get(key, default))
+
+    rows = [
+        ("Назва проєкту:", get_data('project_name')),
+        ("Керівник/Розробник:", get_data('team')),
+        ("Мета:", get_data('goal')),
+    ]
+    minimization_data = answers.get('minimization_data', [])
+    if not minimization_data:
+        rows.append(("Дані:", "[Не вказано]"))
+    for i, item in enumerate(minimization_data):
+        item_name = _html_text(item['item'])
+        if item['needed']:
+            data_value = f"{item_name} (✅ <strong>Навіщо:</strong> {_html_text(item['reason'])})"
+        else:
+            data_value = f"<s>{item_name}</s> (❌ <strong>Відмовлено</strong>)"
+        rows.append((f"Дані (пункт {i+1}):", data_value))
+    rows += [
+        ("Строк Зберігання:", get_data('retention_period')),
+        ("Механізм Видалення:", get_data('retention_mechanism')),
+        ("Місце Зберігання:", get_data('storage')),
+        ("Головний Ризик:", get_data('risk')),
+        ("Мінімізація Ризику:", get_data('mitigation')),
+    ]
+    return DPIA_HTML.render({
+        'project_name': get_data('project_name'),
+        'date': _today(),
+        'dpia_table': _html_table(DPIA_TABLE_HEAD, rows),
+    })
+
+def build_checklist_html(answers: dict) -> str:
+    def get_note(note_key: str) -> str:
+        note = answers.get(note_key, "*Не заповнено*")
+        if note in ("*Пропущено*", "*Не заповнено*"):
+            return f"<em>{note.strip('*')}</em>"
+        return html.escape(note).replace("\n", "<br>")
+
+    sections = []
+    for table_head, items in CHECKLIST_HTML_SECTIONS:
+        rows = [
+            (name, _get_status_text(answers.get(f'{key}_status')), get_note(f'{key}_note'))
+            for name, key in items
+        ]
+        sections.append(_html_table(table_head, rows))
+
+    return CHECKLIST_HTML.render({
+        'date': _today(),
+        'checklist_content': "\n\n".join(sections),
+    })
+
+
+# === Вибір шляху ===
+
+# Еталонні відповіді (tests/test_documents.py, bench.py): звичайний текст без Markdown-розмітки
+GOLDEN_ANSWERS = {
+    'policy': {
+        'project_name': "Бот розкладу", 'contact': "@kai_schedule",
+        'data_collected': "Telegram ID, номер групи", 'data_storage': "SQLite на сервері",
+        'delete_mechanism': "Команда /delete",
+    },
+    'dpia': {
+        'project_name': "Бот розкладу", 'team': "@kai_schedule", 'goal': "Надсилати розклад групи",
+        'minimization_data': [
+            {'item': "Telegram ID", 'needed': True, 'reason': "Щоб надсилати повідомлення"},
+            {'item': "Номер телефону", 'needed': False, 'reason': ""},
+        ],
+        'retention_period': "До кінця семестру", 'retention_mechanism': "Команда /delete",
+        'storage': "SQLite на сервері", 'risk': "Витік бази", 'mitigation': "Шифрування диска",
+    },
+    'checklist': {
+        'c1_s1_status': "yes", 'c1_s1_note': "Увімкнено для всіх",
+        'c1_s2_status': "no", 'c1_s2_note': "*Пропущено*",
+        'c2_s1_status': "yes",
+    },
+}
+
+def _build(build_html, build_markdown, answers: dict) -> tuple:
+    if DOCUMENT_RENDER_MODE == "markdown":
+        return build_markdown(answers), False
+    return build_html(answers), True
+
+def build_policy(answers: dict) -> tuple:
+    """Документ Політики: (content, is_html)."""
+    return _build(build_policy_html, build_policy_markdown, answers)
+
+def build_dpia(answers: dict) -> tuple:
+    """Документ DPIA Lite: (content, is_html)."""
+    return _build(build_dpia_html, build_dpia_markdown, answers)
+
+def build_checklist(answers: dict) -> tuple:
+    """Документ Чек-ліста: (content, is_html)."""
+    return _build(build_checklist_html, build_checklist_markdown, answers)
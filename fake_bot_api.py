@@ -0,0 +1,418 @@
+# -*- coding: utf-8 -*-
+"""
+Локальний «фейковий» Telegram Bot API для тестів і бенчмарків (без мережі й справжнього токена).
+
+Підтримує те, що використовує бот: getMe, getUpdates (long polling), setWebhook/deleteWebhook
+(оновлення доставляються POST-ом з X-Telegram-Bot-Api-Secret-Token), sendMessage,
+editMessageText, deleteMessage, deleteMessages, sendDocument, answerCallbackQuery.
+latency — штучна затримка кожної відповіді (імітація RTT до Telegram), latency_jitter — випадкова надбавка до неї;
+connect_latency — затримка кожного нового з'єднання (TCP + TLS рукостискання), connections — їх лічильник.
+error_rate — частка викликів (з error_methods), на які сервер відповідає помилкою error_kind:
+  flood  — 429 Too Many Requests з retry_after (як справжній флуд-контроль Telegram);
+  server — 502 Bad Gateway (збій на боці Telegram).
+Такі виклики не потрапляють у calls, а рахуються в injected_errors.
+
+Бот підключається через TELEGRAM_API_BASE_URL=http://127.0.0.1:<port>/bot.
+
+Запуск окремо:
+  python fake_bot_api.py --port 8081 --latency 0.03 --connect-latency 0.06
+  python fake_bot_api.py --port 8081 --latency 0.03 --error-rate 0.05 --error-kind flood
+"""
+
+import argparse
+import email.parser
+import email.policy
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+logger = logging.getLogger("fake_bot_api")
+
+BOT_USER = {"id": 1000, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+
+# Методи, у які за замовчуванням вставляються помилки (службові getMe/getUpdates/setWebhook — ні).
+# answerCallbackQuery Telegram не обмежує флуд-контролем (і бот не ставить її в чергу), тож 429 для неї не імітуємо
+ERROR_METHODS = {
+    "flood": frozenset({"sendMessage", "editMessageText", "deleteMessage", "deleteMessages", "sendDocument"}),
+    "server": frozenset({
+        "sendMessage", "editMessageText", "deleteMessage", "deleteMessages", "sendDocument", "answerCallbackQuery",
+    }),
+}
+ERROR_KINDS = tuple(ERROR_METHODS)
+
+
+class ApiError(Exception):
+    """Помилка Bot API, яку сервер поверне боту як {"ok": false, ...}."""
+
+    def __init__(self, description: str, error_code: int = 400):
+        super().__init__(description)
+        self.description = description
+        self.error_code = error_code
+
+
+def make_user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+
+def make_chat(chat_id: int) -> dict:
+    return {"id": chat_id, "type": "private", "first_name": f"User{chat_id}"}
+
+
+class _Server(ThreadingHTTPServer):
+    # Стандартна черга listen() — 5 з'єднань; сплеск паралельних викликів бота не має в неї впиратись
+    request_queue_size = 256
+    daemon_threads = True
+
+
+class FakeBotApi:
+    """Bot API сервер у фоновому потоці. Усі виклики бота записуються в calls."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        connect_latency: float = 0.0,
+        latency_jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_kind: str = "flood",
+        error_methods: Optional[frozenset] = None,
+        retry_after: int = 1,
+        seed: Optional[int] = None,
+    ):
+        if error_kind not in ERROR_KINDS:
+            raise ValueError(f"Невідомий error_kind='{error_kind}'. Доступні: {', '.join(ERROR_KINDS)}")
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.connect_latency = connect_latency
+        self.connections = 0
+        self.error_rate = error_rate
+        self.error_kind = error_kind
+        self.error_methods = ERROR_METHODS[error_kind] if error_methods is None else error_methods
+        self.retry_after = retry_after
+        self.injected_errors = 0
+        self._random = random.Random(seed)
+        self._listeners: list = []
+        self._lock = threading.Condition()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._updates: list = []
+        self._messages: dict = {}  # (chat_id, message_id) → text
+        self._last_bot_message: dict = {}  # chat_id → message_id останнього повідомлення бота
+        self.calls: list = []  # (час, метод, параметри)
+        self.webhook_url: Optional[str] = None
+        self.webhook_secret: Optional[str] = None
+        self.webhook_errors = 0
+        self._webhook_pool: Optional[ThreadPoolExecutor] = None
+        self._methods: dict = {
+            "getMe": lambda params: BOT_USER,
+            "getUpdates": self._get_updates,
+            "setWebhook": self._set_webhook,
+            "deleteWebhook": self._delete_webhook,
+            "getWebhookInfo": lambda params: {"url": self.webhook_url or "", "has_custom_certificate": False, "pending_update_count": 0},
+            "sendMessage": self._send_message,
+            "editMessageText": self._edit_message_text,
+            "deleteMessage": self._delete_message,
+            "deleteMessages": self._delete_messages,
+            "sendDocument": self._send_document,
+            "answerCallbackQuery": lambda params: True,
+        }
+        self._server = _Server((host, port), self._make_handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def start(self) -> "FakeBotApi":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-bot-api", daemon=True)
+        self._thread.start()
+        logger.info(f"Fake Bot API: {self.base_url}")
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._webhook_pool is not None:
+            self._webhook_pool.shutdown(wait=False, cancel_futures=True)
+
+    # --- Вхідні оновлення (від «користувачів») ---
+
+    def push_update(self, update: dict) -> dict:
+        """Додає оновлення: у чергу getUpdates або одразу POST-ом на вебхук."""
+        update = {"update_id": next(self._update_ids), **update}
+        with self._lock:
+            webhook_url = self.webhook_url
+            if webhook_url is None:
+                self._updates.append(update)
+                self._lock.notify_all()
+        if webhook_url is not None:
+            self._webhook_pool.submit(self._deliver, webhook_url, update)
+        return update
+
+    def push_message(self, user_id: int, text: str) -> dict:
+        """Користувач надсилає текст (команди /start тощо отримують entity bot_command)."""
+        message_id = next(self._message_ids)
+        message = {"message_id": message_id, "date": int(time.time()), "chat": make_chat(user_id), "from": make_user(user_id), "text": text}
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        with self._lock:
+            self._messages[(user_id, message_id)] = text
+        return self.push_update({"message": message})
+
+    def push_callback(self, user_id: int, data: str, message_id: int) -> dict:
+        """Користувач натискає inline-кнопку під повідомленням бота message_id."""
+        with self._lock:
+            text = self._messages.get((user_id, message_id), "")
+        message = {"message_id": message_id, "date": int(time.time()), "chat": make_chat(user_id), "from": BOT_USER, "text": text}
+        return self.push_update({"callback_query": {
+            "id": str(next(self._update_ids)), "from": make_user(user_id), "chat_instance": str(user_id),
+            "message": message, "data": data,
+        }})
+
+    def _deliver(self, url: str, update: dict) -> None:
+        time.sleep(self._delay())
+        request = urllib.request.Request(url, data=json.dumps(update).encode("utf-8"), method="POST")
+        request.add_header("Content-Type", "application/json")
+        if self.webhook_secret:
+            request.add_header("X-Telegram-Bot-Api-Secret-Token", self.webhook_secret)
+        try:
+            urllib.request.urlopen(request, timeout=30).read()
+        except (urllib.error.URLError, OSError) as e:
+            self.webhook_errors += 1
+            logger.warning(f"Вебхук не прийняв оновлення {update['update_id']}: {e}")
+
+    # --- Очікування відповідей бота ---
+
+    def wait_for_call(self, predicate: Callable[[str, dict], bool], since: float, timeout: float = 10.0) -> Optional[tuple]:
+        """Чекає перший виклик бота після since, для якого predicate(метод, параметри) істинний."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while True:
+                for call in self.calls:
+                    if call[0] >= since and predicate(call[1], call[2]):
+                        return call
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._lock.wait(remaining)
+
+    def add_listener(self, callback: Callable[[tuple], None]) -> None:
+        """callback(виклик) для кожного нового запису в calls (викликається з потоку сервера)."""
+        self._listeners.append(callback)
+
+    def last_message_id(self, chat_id: int) -> Optional[int]:
+        """id останнього повідомлення, яке бот надіслав у чат (щоб «натиснути» його кнопку)."""
+        with self._lock:
+            return self._last_bot_message.get(chat_id)
+
+    # --- Методи Bot API ---
+
+    def _get_updates(self, params: dict) -> list:
+        offset = int(params.get("offset", 0))
+        timeout = float(params.get("timeout", 0))
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while True:
+                self._updates = [u for u in self._updates if u["update_id"] >= offset]
+                remaining = deadline - time.monotonic()
+                if self._updates or remaining <= 0 or self.webhook_url is not None:
+                    updates = list(self._updates)
+                    break
+                self._lock.wait(remaining)
+        if updates:
+            # Як і для вебхука: доставка оновлення боту коштує один прохід мережею
+            time.sleep(self._delay())
+        return updates
+
+    def _set_webhook(self, params: dict) -> bool:
+        with self._lock:
+            self.webhook_url = params["url"]
+            self.webhook_secret = params.get("secret_token")
+            max_connections = int(params.get("max_connections", 40))
+            self._webhook_pool = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix="fake-webhook")
+            self._lock.notify_all()
+        return True
+
+    def _delete_webhook(self, params: dict) -> bool:
+        with self._lock:
+            self.webhook_url = None
+            self.webhook_secret = None
+        return True
+
+    def _new_message(self, chat_id: int, text: str, **extra) -> dict:
+        message_id = next(self._message_ids)
+        with self._lock:
+            self._messages[(chat_id, message_id)] = text
+            self._last_bot_message[chat_id] = message_id
+        message = {"message_id": message_id, "date": int(time.time()), "chat": make_chat(chat_id), "from": BOT_USER, **extra}
+        if text:
+            message["text"] = text
+        return message
+
+    def _send_message(self, params: dict) -> dict:
+        return self._new_message(int(params["chat_id"]), params["text"])
+
+    def _edit_message_text(self, params: dict) -> dict:
+        key = (int(params["chat_id"]), int(params["message_id"]))
+        with self._lock:
+            if key not in self._messages:
+                raise ApiError("Bad Request: message to edit not found")
+            if self._messages[key] == params["text"]:
+                raise ApiError("Bad Request: message is not modified: specified new message content and reply markup are exactly the same as a current content and reply markup of the message")
+            self._messages[key] = params["text"]
+        return {"message_id": key[1], "date": int(time.time()), "chat": make_chat(key[0]), "from": BOT_USER, "text": params["text"]}
+
+    def _delete_message(self, params: dict) -> bool:
+        key = (int(params["chat_id"]), int(params["message_id"]))
+        with self._lock:
+            if self._messages.pop(key, None) is None:
+                raise ApiError("Bad Request: message to delete not found")
+        return True
+
+    def _delete_messages(self, params: dict) -> bool:
+        # Як і справжній API: відсутні повідомлення мовчки пропускаються
+        chat_id = int(params["chat_id"])
+        with self._lock:
+            for message_id in json.loads(params["message_ids"]):
+                self._messages.pop((chat_id, int(message_id)), None)
+        return True
+
+    def _send_document(self, params: dict) -> dict:
+        document = params.get("document")
+        size = len(document) if isinstance(document, bytes) else 0
+        file_id = f"fake-{next(self._message_ids)}" if isinstance(document, bytes) else document
+        return self._new_message(int(params["chat_id"]), "", document={
+            "file_id": file_id, "file_unique_id": file_id, "file_name": params.get("filename", "document.pdf"), "file_size": size,
+        })
+
+    # --- HTTP ---
+
+    def _delay(self) -> float:
+        if not self.latency_jitter:
+            return self.latency
+        with self._lock:
+            return self.latency + self._random.uniform(0, self.latency_jitter)
+
+    def _injected_error(self, method: str) -> Optional[tuple]:
+        """Відповідь-помилка замість виклику (з імовірністю error_rate) або None."""
+        if not self.error_rate or method not in self.error_methods:
+            return None
+        with self._lock:
+            if self._random.random() >= self.error_rate:
+                return None
+            self.injected_errors += 1
+        if self.error_kind == "flood":
+            return 429, {
+                "ok": False, "error_code": 429, "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+        return 502, {"ok": False, "error_code": 502, "description": "Bad Gateway"}
+
+    def _call(self, method: str, params: dict) -> tuple:
+        handler = self._methods.get(method)
+        if method != "getUpdates":
+            time.sleep(self._delay())
+            error = self._injected_error(method)
+            if error is not None:
+                return error
+            call = (time.perf_counter(), method, params)
+            with self._lock:
+                self.calls.append(call)
+                self._lock.notify_all()
+            for listener in self._listeners:
+                listener(call)
+        if handler is None:
+            return 404, {"ok": False, "error_code": 404, "description": f"Not Found: method {method} not supported"}
+        try:
+            return 200, {"ok": True, "result": handler(params)}
+        except ApiError as e:
+            return e.error_code, {"ok": False, "error_code": e.error_code, "description": e.description}
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with api._lock:
+                    api.connections += 1
+                time.sleep(api.connect_latency)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                method = self.path.rstrip("/").rsplit("/", 1)[-1]
+                status, payload = api._call(method, _parse_params(self.headers.get("Content-Type", ""), body))
+                data = json.dumps(payload).encode("utf-8")
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Бот закрив long polling з'єднання під час зупинки
+                    pass
+
+            do_GET = do_POST
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def _parse_params(content_type: str, body: bytes) -> dict:
+    """Параметри запиту PTB: form-urlencoded, JSON або multipart (sendDocument)."""
+    if content_type.startswith("multipart/form-data"):
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body
+        )
+        params = {}
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            payload = part.get_payload(decode=True)
+            if part.get_filename():
+                params[name] = payload
+                params.setdefault("filename", part.get_filename())
+            else:
+                params[name] = payload.decode("utf-8")
+        return params
+    if content_type.startswith("application/json"):
+        return json.loads(body or b"{}")
+    return {key: values[-1] for key, values in urllib.parse.parse_qs(body.decode("utf-8")).items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Локальний фейковий Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="затримка кожної відповіді, секунд")
+    parser.add_argument("--connect-latency", type=float, default=0.0, help="затримка кожного нового з'єднання, секунд")
+    parser.add_argument("--jitter", type=float, default=0.0, help="випадкова надбавка до latency, секунд")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="частка викликів, що завершуються помилкою")
+    parser.add_argument("--error-kind", choices=ERROR_KINDS, default="flood")
+    args = parser.parse_args()
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    api = FakeBotApi(
+        args.host, args.port, args.latency, args.connect_latency,
+        latency_jitter=args.jitter, error_rate=args.error_rate, error_kind=args.error_kind,
+    ).start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        api.stop()
+
+if __name__ == "__main__":
+    main()
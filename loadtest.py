@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""
+Навантажувальний тест бота без справжнього Telegram.
+
+N симульованих користувачів паралельно проходять Політику, DPIA і Чек-ліст (9 пунктів)
+у справжньому bot.py, підключеному до локального fake Bot API (fake_bot_api.py).
+Кожен крок — дія користувача (текст або кнопка) і очікувана відповідь бота
+(нове повідомлення, редагування «Головного» або готовий PDF); затримка кроку —
+від дії до цієї відповіді.
+
+Запуск:
+  python loadtest.py --users 20
+  python loadtest.py --users 50 --latency 0.03 --mode webhook
+  python loadtest.py --users 20 --error-rate 0.05 --error-kind flood
+  python loadtest.py --users 20 --rate-limit off   — лише без планувальника запитів (сира пропускна здатність)
+
+За замовчуванням (--rate-limit both) той самий сценарій проганяється двічі, в окремих процесах:
+з планувальником запитів і без нього. Якщо кроки з планувальником помітно повільніші, бот
+міряє власний ліміт, а не себе — це регресія PriorityRateLimiter.
+
+Звіт: p50/p95/p99 затримки кроків майстра і генерації PDF, PDF/с, таймаути,
+пікова RSS (процес бота разом із fake API; окремо — дочірні процеси PDF_EXECUTOR=process).
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger("loadtest")
+
+FLOWS = ("policy", "dpia", "checklist")
+
+
+class Step(NamedTuple):
+    """Дія користувача і відповідь бота, на яку вона чекає."""
+
+    name: str
+    kind: str  # "step" — крок майстра, "pdf" — генерація документа
+    action: str  # "message" | "callback"
+    payload: str
+    expect: Callable[[str, dict], bool]
+
+
+# --- Очікувані відповіді бота ---
+
+def _sent() -> Callable[[str, dict], bool]:
+    return lambda method, params: method == "sendMessage"
+
+def _menu() -> Callable[[str, dict], bool]:
+    return lambda method, params: method == "sendMessage" and "start_policy" in params.get("reply_markup", "")
+
+def _edited() -> Callable[[str, dict], bool]:
+    return lambda method, params: method == "editMessageText"
+
+def _document_ready() -> Callable[[str, dict], bool]:
+    """Фінальне повідомлення після PDF — або повідомлення про помилку генерації."""
+    return lambda method, params: method == "sendMessage" and (
+        "start_menu_post_generation" in params.get("reply_markup", "") or "сталася помилка" in params.get("text", "")
+    )
+
+def _is_document_error(params: dict) -> bool:
+    return "сталася помилка" in params.get("text", "")
+
+
+# --- Сценарії ---
+
+def _text_steps(names: tuple, answers: dict, last_is_pdf: bool = True) -> List[Step]:
+    steps = [Step(name, "step", "message", answers[name], _edited()) for name in names]
+    if last_is_pdf:
+        last = steps[-1]
+        steps[-1] = Step(last.name, "pdf", "message", last.payload, _document_ready())
+    return steps
+
+def policy_flow(user_id: int) -> List[Step]:
+    answers = {
+        "project_name": f"Бот розкладу #{user_id}",
+        "contact": f"@owner{user_id}",
+        "data_collected": "Telegram ID, ім'я, група",
+        "data_storage": "SQLite на сервері в ЄС",
+        "delete_mechanism": "Команда /delete або запит на пошту",
+    }
+    return [
+        Step("/start", "step", "message", "/start", _menu()),
+        Step("start_policy", "step", "callback", "start_policy", _sent()),
+        *_text_steps(tuple(answers), answers),
+    ]
+
+def dpia_flow(user_id: int) -> List[Step]:
+    answers = {
+        "project_name": f"Бот розкладу #{user_id}",
+        "team": f"@dev{user_id}",
+        "goal": "Надсилати розклад групи",
+        "data_list": "Email\nІм'я\nТелефон",
+    }
+    tail = {
+        "retention_period": "1 рік",
+        "retention_mechanism": "Cron видаляє старі записи",
+        "storage": "SQLite на сервері в ЄС",
+        "risk": "Витік бази",
+        "mitigation": "Шифрування диска і резервних копій",
+    }
+    return [
+        Step("/start", "step", "message", "/start", _menu()),
+        Step("start_dpia", "step", "callback", "start_dpia", _sent()),
+        *_text_steps(tuple(answers), answers, last_is_pdf=False),
+        # Мінімізація: Email — потрібен (з причиною), Ім'я — ні, Телефон — потрібен
+        Step("min_yes", "step", "callback", "min_yes", _edited()),
+        Step("min_reason", "step", "message", "Для розсилки розкладу", _edited()),
+        Step("min_no", "step", "callback", "min_no", _edited()),
+        Step("min_yes", "step", "callback", "min_yes", _edited()),
+        Step("min_reason", "step", "message", "Для термінових змін", _edited()),
+        *_text_steps(tuple(tail), tail),
+    ]
+
+def checklist_flow(user_id: int) -> List[Step]:
+    steps = [
+        Step("/start", "step", "message", "/start", _menu()),
+        Step("start_checklist", "step", "callback", "start_checklist", _sent()),
+    ]
+    for i in range(9):
+        status = "cl_yes" if (user_id + i) % 3 else "cl_no"
+        steps.append(Step(f"status_{i + 1}", "step", "callback", status, _edited()))
+        steps.append(Step(f"note_{i + 1}", "step", "message", f"Нотатка {i + 1} від {user_id}", _edited()))
+    last = steps[-1]
+    steps[-1] = Step(last.name, "pdf", "message", last.payload, _document_ready())
+    return steps
+
+SCENARIOS = {"policy": policy_flow, "dpia": dpia_flow, "checklist": checklist_flow}
+
+
+# --- Статистика ---
+
+def _percentile(ordered: list, q: float) -> float:
+    if not ordered:
+        return float("nan")
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+class Results:
+    def __init__(self):
+        self.samples: Dict[str, list] = {"step": [], "pdf": []}
+        self.pdf_ok = 0
+        self.pdf_failed = 0
+        self.timeouts: Dict[str, int] = {}
+        self.users_done = 0
+
+    def report(self, elapsed: float, api, users: int, rate_limit: str) -> None:
+        print(f"\n== Навантаження: {users} користувачів, {elapsed:.1f} с, планувальник запитів {rate_limit} ==")
+        labels = {"step": "Крок майстра", "pdf": "Генерація PDF"}
+        for kind, samples in self.samples.items():
+            ordered = sorted(samples)
+            print(
+                f"  {labels[kind]:<20} n={len(ordered):<6} "
+                f"p50 {_percentile(ordered, 0.50) * 1000:8.1f} мс   "
+                f"p95 {_percentile(ordered, 0.95) * 1000:8.1f} мс   "
+                f"p99 {_percentile(ordered, 0.99) * 1000:8.1f} мс"
+            )
+        print(f"  PDF: {self.pdf_ok} готово, {self.pdf_failed} з помилкою — {self.pdf_ok / elapsed:.2f} PDF/с")
+        print(f"  Користувачів пройшли всі сценарії: {self.users_done}/{users}")
+        if self.timeouts:
+            print(f"  Таймаути кроків: {self.timeouts}")
+        print(f"  Викликів Bot API: {len(api.calls)}, вставлених помилок: {api.injected_errors}, з'єднань: {api.connections}")
+        # ru_maxrss у Linux — у кілобайтах
+        print(f"  Пікова RSS: бот + fake API {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} МБ, "
+              f"дочірні процеси {resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024:.0f} МБ")
+
+
+# --- Симульований користувач ---
+
+class Inbox:
+    """Виклики бота, розкладені по чатах: fake API пише з потоку сервера, користувачі читають в event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queues: Dict[int, asyncio.Queue] = {}
+
+    def queue(self, chat_id: int) -> asyncio.Queue:
+        if chat_id not in self.queues:
+            self.queues[chat_id] = asyncio.Queue()
+        return self.queues[chat_id]
+
+    def _put(self, chat_id: int, call: tuple) -> None:
+        self.queue(chat_id).put_nowait(call)
+
+    def on_call(self, call: tuple) -> None:
+        chat_id = call[2].get("chat_id")
+        if chat_id is not None:
+            self.loop.call_soon_threadsafe(self._put, int(chat_id), call)
+
+async def _wait_response(queue: asyncio.Queue, step: Step, since: float, timeout: float) -> Optional[tuple]:
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        try:
+            call = await asyncio.wait_for(queue.get(), remaining)
+        except asyncio.TimeoutError:
+            return None
+        if call[0] >= since and step.expect(call[1], call[2]):
+            return call
+
+async def run_user(api, inbox: Inbox, user_id: int, flows: tuple, results: Results, think: float, step_timeout: float) -> None:
+    queue = inbox.queue(user_id)
+    for flow in flows:
+        for step in SCENARIOS[flow](user_id):
+            if think:
+                await asyncio.sleep(think)
+            since = time.perf_counter()
+            if step.action == "message":
+                api.push_message(user_id, step.payload)
+            else:
+                api.push_callback(user_id, step.payload, api.last_message_id(user_id) or 0)
+            call = await _wait_response(queue, step, since, step_timeout)
+            if call is None:
+                key = f"{flow}/{step.name}"
+                results.timeouts[key] = results.timeouts.get(key, 0) + 1
+                logger.warning(f"User {user_id}: немає відповіді на {key} за {step_timeout} с")
+                return
+            results.samples[step.kind].append(call[0] - since)
+            if step.kind == "pdf":
+                if _is_document_error(call[2]):
+                    results.pdf_failed += 1
+                else:
+                    results.pdf_ok += 1
+    results.users_done += 1
+
+
+# --- Запуск ---
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def run_load(args) -> None:
+    import bench
+    import fake_bot_api
+    import telegram_utils
+
+    api = fake_bot_api.FakeBotApi(
+        latency=args.latency, connect_latency=args.connect_latency, latency_jitter=args.jitter,
+        error_rate=args.error_rate, error_kind=args.error_kind, seed=args.seed,
+    ).start()
+    telegram_utils.TELEGRAM_API_BASE_URL = api.base_url
+    bot = bench._load_bot()
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    loop = asyncio.get_running_loop()
+    # Кожен очікувач PDF-рушія чи черги не має забирати потік у сусідів
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=max(32, args.users + 8)))
+    inbox = Inbox(loop)
+    api.add_listener(inbox.on_call)
+    results = Results()
+
+    application = bot.build_application()
+    try:
+        async with application:
+            await application.start()
+            await bot.post_init(application)
+            if args.mode == "webhook":
+                port = _free_port()
+                await application.updater.start_webhook(
+                    listen="127.0.0.1", port=port, url_path="telegram",
+                    webhook_url=f"http://127.0.0.1:{port}/telegram", secret_token="loadtest-secret",
+                )
+            else:
+                await application.updater.start_polling(poll_interval=0.0, timeout=10)
+
+            flows = tuple(args.flows)
+            started = time.perf_counter()
+            users = []
+            for i in range(args.users):
+                users.append(asyncio.create_task(
+                    run_user(api, inbox, 50_000 + i, flows, results, args.think, args.step_timeout)
+                ))
+                if args.ramp:
+                    await asyncio.sleep(args.ramp / args.users)
+            await asyncio.gather(*users)
+            elapsed = time.perf_counter() - started
+
+            await application.updater.stop()
+            await application.stop()
+            await bot.post_stop(application)
+        await bot.post_shutdown(application)
+    finally:
+        api.stop()
+    results.report(elapsed, api, args.users, args.rate_limit)
+    print(f"  Планувальник запитів: {json.dumps(application.bot.rate_limiter.stats(), ensure_ascii=False) if application.bot.rate_limiter else 'вимкнено'}")
+    print(f"  Сесії: {json.dumps(bot.sessions.stats(), ensure_ascii=False)}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Навантажувальний тест бота проти fake Bot API")
+    parser.add_argument("--users", type=int, default=20, help="скільки користувачів одночасно")
+    parser.add_argument("--flows", nargs="+", choices=FLOWS, default=list(FLOWS), help="сценарії кожного користувача (по черзі)")
+    parser.add_argument("--mode", choices=("polling", "webhook"), default="polling")
+    parser.add_argument("--latency", type=float, default=0.02, help="RTT до Bot API, секунд")
+    parser.add_argument("--jitter", type=float, default=0.0, help="випадкова надбавка до latency, секунд")
+    parser.add_argument("--connect-latency", type=float, default=0.0, help="ціна нового з'єднання, секунд")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="частка викликів бота, що завершуються помилкою")
+    parser.add_argument("--error-kind", choices=("flood", "server"), default="flood")
+    parser.add_argument("--think", type=float, default=0.2, help="пауза користувача перед кожним кроком, секунд")
+    parser.add_argument("--ramp", type=float, default=1.0, help="за скільки секунд підключаються всі користувачі")
+    parser.add_argument("--step-timeout", type=float, default=60.0, help="скільки чекати відповідь на крок, секунд")
+    parser.add_argument("--seed", type=int, default=None, help="зерно для вставлення помилок і jitter")
+    parser.add_argument(
+        "--rate-limit", choices=("both", "on", "off"), default="both",
+        help="з планувальником запитів, без нього (RATE_LIMIT_GLOBAL_PER_SEC=0) чи обидва прогони (за замовчуванням)",
+    )
+    parser.add_argument("--no-rate-limit", action="store_true", help="те саме, що --rate-limit off")
+    parser.add_argument("--verbose", action="store_true", help="логи бота рівня INFO")
+    args = parser.parse_args()
+    if args.no_rate_limit:
+        args.rate_limit = "off"
+
+    if args.rate_limit == "both":
+        # Окремі процеси: налаштування читаються при імпорті, а пікова RSS — своя в кожного прогону
+        for rate_limit in ("on", "off"):
+            subprocess.run([sys.executable, os.path.abspath(__file__), *sys.argv[1:], "--rate-limit", rate_limit], check=True)
+        return
+
+    # Налаштування бота читаються при імпорті модулів, тому задаються до нього
+    os.environ.setdefault("BOT_TOKEN", "loadtest")
+    os.environ.setdefault("BOT_PERSISTENCE", "none")
+    if args.rate_limit == "off":
+        os.environ["RATE_LIMIT_GLOBAL_PER_SEC"] = "0"
+    asyncio.run(run_load(args))
+
+if __name__ == "__main__":
+    main()
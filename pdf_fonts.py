@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+"""
+Шрифти PDF: реєстрація один раз на процес і кеш підмножин (subset) TTF.
+
+Кирилиця в PDF — це вбудований TTF. reportlab (на ньому працюють і pdf_native, і xhtml2pdf)
+вбудовує не весь файл, а підмножини по ≤256 гліфів: на кожен документ заново збирає
+програму шрифту (makeSubset), ширини гліфів і ToUnicode-мапу, а потім стискає їх zlib.
+Для однакового набору гліфів результат однаковий, тож тут він кешується:
+  - шрифти реєструються в reportlab один раз (register_fonts), TTF не читаються на кожен документ;
+  - CachedSubsetTTFont бере готові (вже стиснені) об'єкти підмножини з SubsetCache за ключем
+    «шрифт + номер + набір гліфів»;
+  - підмножина містить лише символи документа, тож у кеш потрапляють документи з тим самим
+    набором гліфів (повторні PDF, шаблони без відповідей). З PDF_FONT_SEED=1 кожен документ
+    починає підмножину 0 з однакового набору SEED_CHARACTERS (українська абетка та
+    типографіка шаблонів): влучань у кеш більше, але кожен PDF на ~16 КБ більший;
+  - register_xhtml2pdf_fonts() підставляє ці шрифти замість Helvetica/Times/Courier для
+    font-family з PDF_CSS_STYLE (без цього xhtml2pdf малює кирилицю «квадратиками»).
+font_timer() міряє час шрифтів одного рендера, get_font_stats() — лічильники кешу.
+
+CachedSubsetTTFont повторює внутрішню кухню TTFont.addObjects, тож кеш вмикається лише на
+перевіреному діапазоні версій reportlab (CACHED_SUBSETS_VERSIONS — той самий, що в requirements.txt,
+вивід байт у байт як у reportlab). На іншій версії шрифти вбудовуються звичайним addObjects.
+
+Шрифти DejaVu лежать у репозиторії (fonts/, ліцензія — fonts/LICENSE), тож PDF з кирилицею
+працює і на хості без системних шрифтів (стандартний стек Heroku). Каталог шукається по черзі:
+PDF_FONT_DIR (якщо задано), fonts/ поруч із цим модулем, системні каталоги DejaVu (FONT_DIRS).
+
+Налаштування через env:
+  PDF_FONT_DIR          — каталог шрифтів (за замовчуванням — перший з FONT_DIRS, де є основний шрифт)
+  PDF_FONT_REGULAR      — основний шрифт (DejaVuSans.ttf)
+  PDF_FONT_BOLD         — жирний (DejaVuSans-Bold.ttf)
+  PDF_FONT_SERIF        — шрифт із засічками для заголовків у xhtml2pdf (DejaVuSerif.ttf)
+  PDF_FONT_HEADING      — заголовки (DejaVuSerif-Bold.ttf)
+  PDF_FONT_MONO         — <code> (DejaVuSansMono.ttf)
+  PDF_FONT_SUBSET_CACHE — скільки підмножин тримати в кеші (за замовчуванням 64; 0 — без кешу)
+  PDF_FONT_SEED         — 1 | 0: починати підмножину 0 з SEED_CHARACTERS (за замовчуванням 0)
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional
+
+import reportlab
+from reportlab.lib.fonts import addMapping
+from reportlab.pdfbase import pdfdoc, pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+try:
+    # Внутрішні імена reportlab, на які спирається CachedSubsetTTFont
+    from reportlab.pdfbase.ttfonts import FF_NONSYMBOLIC, FF_SYMBOLIC, SUBSETN, makeToUnicodeCMap
+except ImportError:
+    FF_NONSYMBOLIC = FF_SYMBOLIC = SUBSETN = makeToUnicodeCMap = None
+
+logger = logging.getLogger("pdf_fonts")
+
+PDF_FONT_DIR = os.getenv("PDF_FONT_DIR")
+# Де шукати шрифти без PDF_FONT_DIR: вбудовані в репозиторій, далі системні (Debian/Ubuntu, Fedora/Arch)
+FONT_DIRS = (
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts"),
+    "/usr/share/fonts/truetype/dejavu",
+    "/usr/share/fonts/dejavu",
+    "/usr/share/fonts/TTF",
+)
+PDF_FONTS = {
+    "regular": os.getenv("PDF_FONT_REGULAR", "DejaVuSans.ttf"),
+    "bold": os.getenv("PDF_FONT_BOLD", "DejaVuSans-Bold.ttf"),
+    "serif": os.getenv("PDF_FONT_SERIF", "DejaVuSerif.ttf"),
+    "heading": os.getenv("PDF_FONT_HEADING", "DejaVuSerif-Bold.ttf"),
+    "mono": os.getenv("PDF_FONT_MONO", "DejaVuSansMono.ttf"),
+}
+PDF_FONT_SUBSET_CACHE = max(0, int(os.getenv("PDF_FONT_SUBSET_CACHE", "64")))
+PDF_FONT_SEED = os.getenv("PDF_FONT_SEED", "0") == "1"
+
+# Гліфи, з яких з PDF_FONT_SEED=1 починається кожна підмножина 0 (ASCII reportlab кладе туди сам)
+SEED_CHARACTERS = (
+    "АБВГҐДЕЄЖЗИІЇЙКЛМНОПРСТУФХЦЧШЩЬЮЯабвгґдеєжзиіїйклмнопрстуфхцчшщьюя"
+    "ЁЪЫЭёъыэ’«»—–…№•✔✘⚠→"
+)
+
+# Емодзі зі шаблонів, яких немає в текстових шрифтах → схожі символи Dingbats
+GLYPH_FALLBACKS = {"✅": "✔", "❌": "✘", "⚠️": "⚠", "➡️": "→"}
+
+# font-family з PDF_CSS_STYLE (та базові шрифти xhtml2pdf) → родина з кирилицею
+XHTML2PDF_FAMILIES = {
+    "privacykit-sans": (
+        "regular", "bold",
+        ("-apple-system", "blinkmacsystemfont", "segoe ui", "roboto", "helvetica", "arial",
+         "sans-serif", "sans", "sansserif", "system-ui", "ui-sans-serif", "verdana"),
+    ),
+    "privacykit-serif": (
+        "serif", "heading",
+        ("georgia", "serif", "times", "times-roman", "times new roman", "ui-serif"),
+    ),
+    "privacykit-mono": (
+        "mono", "mono",
+        ("menlo", "consolas", "monospace", "monospaced", "mono", "courier", "courier new", "ui-monospace"),
+    ),
+}
+
+
+# === Кеш підмножин ===
+
+class _Subset:
+    """Готові байти однієї підмножини: ширини, стиснені ToUnicode-мапа і програма шрифту."""
+
+    __slots__ = ("widths", "cmap", "font_file", "font_file_length")
+
+    def __init__(self, widths: bytes, cmap: bytes, font_file: bytes, font_file_length: int):
+        self.widths = widths
+        self.cmap = cmap
+        self.font_file = font_file
+        self.font_file_length = font_file_length
+
+    @property
+    def size(self) -> int:
+        return len(self.widths) + len(self.cmap) + len(self.font_file)
+
+
+class SubsetCache:
+    """LRU-кеш _Subset за ключем (шрифт, номер підмножини, коди гліфів)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, _Subset]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key: tuple) -> Optional[_Subset]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry
+
+    def put(self, key: tuple, entry: _Subset) -> None:
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                self.counters,
+                entries=len(self._entries),
+                bytes=sum(entry.size for entry in self._entries.values()),
+            )
+
+
+subset_cache = SubsetCache(PDF_FONT_SUBSET_CACHE)
+
+
+# === Час шрифтів одного рендера ===
+
+class FontTimer:
+    __slots__ = ("seconds",)
+
+    def __init__(self):
+        self.seconds = 0.0
+
+
+_local = threading.local()
+
+@contextmanager
+def font_timer():
+    """Міряє час вбудовування шрифтів у межах with (рендер іде в цьому ж потоці)."""
+    timer = FontTimer()
+    previous = getattr(_local, "timer", None)
+    _local.timer = timer
+    try:
+        yield timer
+    finally:
+        _local.timer = previous
+
+
+# Версії reportlab [від, до), на яких _add_cached_objects звірено з TTFont.addObjects
+CACHED_SUBSETS_VERSIONS = ((4, 2), (5, 1))
+
+def _supports_cached_subsets() -> bool:
+    version = tuple(int(part) for part in re.findall(r"\d+", reportlab.Version)[:2])
+    low, high = CACHED_SUBSETS_VERSIONS
+    return (
+        low <= version < high
+        and SUBSETN is not None
+        and all(hasattr(TTFont, name) for name in ("_assignState", "getSubsetInternalName", "addObjects"))
+        and hasattr(pdfdoc, "PDFTrueTypeFont")
+    )
+
+CACHED_SUBSETS = _supports_cached_subsets()
+
+
+class CachedSubsetTTFont(TTFont):
+    """
+    TTFont, що вбудовує підмножини з subset_cache.
+    addObjects повторює TTFont.addObjects з reportlab, але байти підмножини збирає лише раз.
+    """
+
+    def splitString(self, text, doc, encoding="utf-8"):
+        if PDF_FONT_SEED and doc not in self.state:
+            # Однаковий початок підмножини 0 у всіх документів — однаковий ключ кешу
+            super().splitString(SEED_CHARACTERS, doc)
+        return super().splitString(text, doc, encoding)
+
+    def addObjects(self, doc):
+        started = time.perf_counter()
+        if not CACHED_SUBSETS or not doc.compression or not isinstance(doc.encrypt, pdfdoc.NoEncryption):
+            # Неперевірена версія reportlab, незжатий чи зашифрований документ — як у reportlab, без кешу
+            super().addObjects(doc)
+        else:
+            self._add_cached_objects(doc)
+        timer = getattr(_local, "timer", None)
+        if timer is not None:
+            timer.seconds += time.perf_counter() - started
+
+    def _subset(self, number: int, subset: list, base_font_name: str) -> _Subset:
+        key = (self.fontName, number, tuple(subset))
+        entry = subset_cache.get(key)
+        if entry is None:
+            font_file = self.face.makeSubset(subset)
+            widths = pdfdoc.format(pdfdoc.PDFArray([self.face.getCharWidth(code) for code in subset]), None)
+            cmap = makeToUnicodeCMap(base_font_name, subset).encode("latin-1")
+            entry = _Subset(widths, zlib.compress(cmap), zlib.compress(font_file), len(font_file))
+            subset_cache.put(key, entry)
+        return entry
+
+    def _add_cached_objects(self, doc) -> None:
+        state = self._assignState(doc)
+        state.frozen = 1
+        face = self.face
+        flags = (face.flags & ~FF_NONSYMBOLIC) | FF_SYMBOLIC
+        for number, subset in enumerate(state.subsets):
+            internal_name = self.getSubsetInternalName(number, doc)[1:]
+            base_font_name = b"".join((SUBSETN(number), b"+", face.name, face.subfontNameX)).decode("pdfdoc")
+            entry = self._subset(number, subset, base_font_name)
+
+            pdf_font = pdfdoc.PDFTrueTypeFont()
+            pdf_font.__Comment__ = f"Font {self.fontName} subset {number}"
+            pdf_font.Name = internal_name
+            pdf_font.BaseFont = base_font_name
+            pdf_font.FirstChar = 0
+            pdf_font.LastChar = len(subset) - 1
+            pdf_font.Widths = entry.widths
+            pdf_font.ToUnicode = doc.Reference(_compressed_stream(entry.cmap), f"toUnicodeCMap:{base_font_name}")
+
+            font_file = _compressed_stream(entry.font_file, Length1=entry.font_file_length)
+            font_file_ref = doc.Reference(font_file, f"fontFile:{face.filename}({base_font_name})")
+            descriptor = pdfdoc.PDFDictionary({
+                "Type": "/FontDescriptor",
+                "Ascent": face.ascent,
+                "CapHeight": face.capHeight,
+                "Descent": face.descent,
+                "Flags": flags,
+                "FontBBox": pdfdoc.PDFArray(face.bbox),
+                "FontName": pdfdoc.PDFName(base_font_name),
+                "ItalicAngle": face.italicAngle,
+                "StemV": face.stemV,
+                "FontFile2": font_file_ref,
+                "MissingWidth": face.defaultWidth,
+            })
+            pdf_font.FontDescriptor = doc.Reference(descriptor, f"fontDescriptor:{base_font_name}")
+
+            doc.Reference(pdf_font, internal_name)
+            doc.idToObject["BasicFonts"].dict[internal_name] = pdf_font
+        del self.state[doc]
+
+
+def _compressed_stream(content: bytes, **entries) -> pdfdoc.PDFStream:
+    """Потік з уже стисненим вмістом: Filter у словнику — і reportlab не стискає його вдруге."""
+    dictionary = pdfdoc.PDFDictionary(entries)
+    dictionary["Filter"] = pdfdoc.PDFArray([pdfdoc.PDFName(pdfdoc.PDFZCompress.pdfname)])
+    return pdfdoc.PDFStream(dictionary, content)
+
+
+# === Реєстрація ===
+
+_font_names: dict = {}
+_glyph_fallbacks: dict = {}
+_xhtml2pdf_registered = False
+_fonts_lock = threading.Lock()
+
+def _font_dir() -> str:
+    """PDF_FONT_DIR, а без нього — перший каталог з FONT_DIRS, де є основний шрифт."""
+    if PDF_FONT_DIR:
+        return PDF_FONT_DIR
+    for directory in FONT_DIRS:
+        if os.path.exists(os.path.join(directory, PDF_FONTS["regular"])):
+            return directory
+    return FONT_DIRS[0]
+
+def _font_path(name: str, directory: str) -> str:
+    return name if os.path.isabs(name) else os.path.join(directory, name)
+
+def register_fonts() -> dict:
+    """
+    Реєструє TTF-шрифти в reportlab один раз на процес. Повертає {роль: ім'я шрифту}.
+    Без основного шрифту PDF з кирилицею неможливий (FileNotFoundError); решта ролей падають на нього.
+    """
+    with _fonts_lock:
+        if _font_names:
+            return _font_names
+        directory = _font_dir()
+        regular_path = _font_path(PDF_FONTS["regular"], directory)
+        if not os.path.exists(regular_path):
+            searched = [PDF_FONT_DIR] if PDF_FONT_DIR else list(FONT_DIRS)
+            raise FileNotFoundError(
+                f"немає шрифту з кирилицею {PDF_FONTS['regular']} у {', '.join(searched)} (PDF_FONT_DIR / PDF_FONT_REGULAR)"
+            )
+        started = time.perf_counter()
+        names = {}
+        for role, file_name in PDF_FONTS.items():
+            path = _font_path(file_name, directory)
+            if not os.path.exists(path):
+                continue
+            font_name = f"PrivacyKit-{role}"
+            pdfmetrics.registerFont(CachedSubsetTTFont(font_name, path))
+            names[role] = font_name
+        for role in PDF_FONTS:
+            names.setdefault(role, names["regular"])
+
+        glyphs = pdfmetrics.getFont(names["regular"]).face.charToGlyph
+        for source, target in GLYPH_FALLBACKS.items():
+            if any(ord(ch) not in glyphs for ch in source) and all(ord(ch) in glyphs for ch in target):
+                _glyph_fallbacks[source] = target
+        _font_names.update(names)
+        logger.info(
+            f"Шрифти PDF зареєстровано за {(time.perf_counter() - started) * 1000:.0f} мс: "
+            f"{len(set(names.values()))} накресл. з {directory}"
+        )
+        if not CACHED_SUBSETS:
+            logger.warning(
+                f"reportlab {reportlab.Version} поза перевіреним діапазоном {CACHED_SUBSETS_VERSIONS}: "
+                f"кеш підмножин шрифтів вимкнено"
+            )
+        return _font_names
+
+def register_xhtml2pdf_fonts() -> None:
+    """Підставляє шрифти з кирилицею замість базових шрифтів xhtml2pdf (один раз на процес)."""
+    global _xhtml2pdf_registered
+    names = register_fonts()
+    with _fonts_lock:
+        if _xhtml2pdf_registered:
+            return
+        from xhtml2pdf import default  # type: ignore
+
+        for family, (regular_role, bold_role, aliases) in XHTML2PDF_FAMILIES.items():
+            regular, bold = names[regular_role], names[bold_role]
+            # Курсиву немає — курсив малюється прямим накресленням; (0, 0) останнім: за ним ps2tt знаходить родину
+            addMapping(family, 0, 1, regular)
+            addMapping(family, 1, 1, bold)
+            addMapping(family, 1, 0, bold)
+            addMapping(family, 0, 0, regular)
+            for alias in aliases:
+                default.DEFAULT_FONT[alias] = family
+        _xhtml2pdf_registered = True
+
+def apply_glyph_fallbacks(text: str) -> str:
+    """Замінює символи, яких немає в шрифті, на схожі (див. GLYPH_FALLBACKS)."""
+    for source, target in _glyph_fallbacks.items():
+        if source in text:
+            text = text.replace(source, target)
+    return text
+
+def get_font_stats() -> dict:
+    """Лічильники кешу підмножин (hits / misses / evictions / entries / bytes, enabled)."""
+    return dict(subset_cache.stats(), enabled=CACHED_SUBSETS)
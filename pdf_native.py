@@ -0,0 +1,550 @@
+# -*- coding: utf-8 -*-
+"""
+Власний PDF-рушій для документів бота (Політика, DPIA Lite, Чек-ліст).
+
+У документів фіксований набір елементів: заголовки, абзаци, списки, цитата,
+горизонтальна лінія і таблиці на 2-3 колонки. Повний HTML/CSS-рушій (wkhtmltopdf,
+xhtml2pdf) для цього зайвий: тут розбирається лише цей піднабір HTML (те, що
+будують documents.py і markdown2 з наших шаблонів), а сторінки розкладаються
+напряму низькорівневим API reportlab (pdfgen.canvas): перенос кириличного тексту
+за шириною (і в комірках таблиць), розрив абзаців і рядків таблиці між сторінками,
+повтор шапки таблиці на новій сторінці.
+
+Будь-який інший тег → UnsupportedContent, і pdf_utils віддає документ наступному рушію.
+Розміри й кольори повторюють PDF_CSS_STYLE з pdf_utils (A4, поля 20/17/22/17 мм, 11pt).
+
+Шрифти — TTF з кирилицею з pdf_fonts.py (реєстрація один раз, кеш підмножин, env PDF_FONT_*).
+Курсив імітується нахилом, якщо окремого файлу немає.
+"""
+
+import io
+import re
+from html.parser import HTMLParser
+from typing import Callable, List, Optional, Tuple
+
+from reportlab.lib.colors import HexColor
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfgen import canvas
+
+from pdf_fonts import apply_glyph_fallbacks, register_fonts
+
+
+class UnsupportedContent(ValueError):
+    """У документі є розмітка, яку цей рушій не розкладає (його бере наступний рушій)."""
+
+
+# === Розбір HTML (лише піднабір документів бота) ===
+
+BOLD, ITALIC, STRIKE, CODE = 1, 2, 4, 8
+
+Run = Tuple[str, int]  # (текст, стиль: бітова маска BOLD | ITALIC | STRIKE | CODE)
+
+_INLINE_STYLES = {"strong": BOLD, "b": BOLD, "em": ITALIC, "i": ITALIC, "s": STRIKE, "del": STRIKE, "strike": STRIKE, "code": CODE}
+_TRANSPARENT = {"html", "body", "thead", "tbody", "a", "span"}
+_SKIPPED = {"head", "style", "title", "script"}
+_WHITESPACE = re.compile(r"\s+")
+
+
+class _DocumentParser(HTMLParser):
+    """
+    HTML → список блоків:
+      ("heading", рівень, runs) | ("para", runs) | ("list", нумерований, [runs, ...])
+      ("rule",) | ("quote", [блоки]) | ("table", [runs шапки], [[runs комірок], ...])
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: list = []
+        self._containers: List[list] = [self.blocks]  # куди додавати блоки (blockquote — вкладений список)
+        self._runs: Optional[List[Run]] = None  # поточний рядковий контейнер (абзац, комірка, пункт)
+        self._style = 0
+        self._style_stack: List[Tuple[str, int]] = []
+        self._skip = 0
+        self._list: Optional[tuple] = None
+        self._table: Optional[tuple] = None
+        self._row: Optional[list] = None
+        self._cell_is_head = False
+
+    # --- Рядковий текст ---
+
+    def _open_runs(self) -> List[Run]:
+        self._runs = []
+        return self._runs
+
+    def _close_runs(self) -> Optional[List[Run]]:
+        runs, self._runs = self._runs, None
+        return runs
+
+    def _add_text(self, text: str) -> None:
+        if self._runs is None:
+            if not text.strip():
+                return
+            # Текст без абзацу (напр., прямо в <body>) — окремий абзац
+            self._containers[-1].append(("para", self._open_runs()))
+        text = apply_glyph_fallbacks(text)
+        if self._runs and self._runs[-1][1] == self._style:
+            self._runs[-1] = (self._runs[-1][0] + text, self._style)
+        else:
+            self._runs.append((text, self._style))
+
+    # --- HTMLParser ---
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if self._skip or tag in _SKIPPED:
+            self._skip += tag in _SKIPPED
+            return
+        if tag in _INLINE_STYLES:
+            self._style_stack.append((tag, self._style))
+            self._style |= _INLINE_STYLES[tag]
+        elif tag in _TRANSPARENT or tag == "meta":
+            pass
+        elif tag == "br":
+            if self._runs is not None:
+                self._runs.append(("\n", self._style))
+        elif tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            self._containers[-1].append(("heading", int(tag[1]), self._open_runs()))
+        elif tag == "p":
+            if self._list is not None or self._row is not None:
+                # <p> усередині пункту списку / комірки — новий рядок у тому ж контейнері
+                if self._runs:
+                    self._runs.append(("\n", self._style))
+                return
+            self._containers[-1].append(("para", self._open_runs()))
+        elif tag in ("ul", "ol"):
+            if self._list is not None:
+                raise UnsupportedContent("вкладені списки")
+            self._list = ("list", tag == "ol", [])
+            self._containers[-1].append(self._list)
+        elif tag == "li" and self._list is not None:
+            self._list[2].append(self._open_runs())
+        elif tag == "hr":
+            self._containers[-1].append(("rule",))
+        elif tag == "blockquote":
+            quote = ("quote", [])
+            self._containers[-1].append(quote)
+            self._containers.append(quote[1])
+        elif tag == "table":
+            if self._table is not None:
+                raise UnsupportedContent("вкладені таблиці")
+            self._table = ("table", [], [])
+            self._containers[-1].append(self._table)
+        elif tag == "tr" and self._table is not None:
+            self._row = []
+        elif tag in ("th", "td") and self._row is not None:
+            self._cell_is_head = tag == "th"
+            self._row.append(self._open_runs())
+        else:
+            raise UnsupportedContent(f"<{tag}>")
+
+    def handle_startendtag(self, tag: str, attrs: list) -> None:
+        self.handle_starttag(tag, attrs)
+        if tag not in ("br", "hr", "meta"):
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag: str) -> None:
+        if self._skip:
+            self._skip -= tag in _SKIPPED
+            return
+        if tag in _INLINE_STYLES:
+            while self._style_stack:
+                opened, self._style = self._style_stack.pop()
+                if opened == tag:
+                    break
+        elif tag in ("h1", "h2", "h3", "h4", "h5", "h6", "li"):
+            self._close_runs()
+        elif tag == "p":
+            if self._list is None and self._row is None:
+                self._close_runs()
+        elif tag in ("ul", "ol"):
+            self._close_runs()
+            self._list = None
+        elif tag == "blockquote" and len(self._containers) > 1:
+            self._close_runs()
+            self._containers.pop()
+        elif tag in ("th", "td"):
+            self._close_runs()
+        elif tag == "tr" and self._row is not None:
+            if self._cell_is_head and not self._table[1] and not self._table[2]:
+                self._table[1].extend(self._row)
+            else:
+                self._table[2].append(self._row)
+            self._row = None
+        elif tag == "table":
+            self._table = None
+
+    def handle_data(self, data: str) -> None:
+        if self._skip:
+            return
+        text = _WHITESPACE.sub(" ", data)
+        if self._runs is None and not text.strip():
+            return
+        self._add_text(text)
+
+
+def parse_html(html_full: str) -> list:
+    """Розбирає HTML документа в блоки. UnsupportedContent — якщо є незнайома розмітка."""
+    register_fonts()
+    parser = _DocumentParser()
+    parser.feed(html_full)
+    parser.close()
+    return parser.blocks
+
+
+# === Розкладка сторінок ===
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN_TOP, MARGIN_RIGHT, MARGIN_BOTTOM, MARGIN_LEFT = 20 * mm, 17 * mm, 22 * mm, 17 * mm
+PX = 0.75  # 1px CSS у пунктах
+
+FONT_SIZE = 11
+LINE_HEIGHT = 1.5
+HEADING_SIZES = {1: 24, 2: 18, 3: 14, 4: 12, 5: 11, 6: 11}
+HEADING_BORDERS = {1: 2 * PX, 3: 1 * PX}
+PARAGRAPH_SPACING = FONT_SIZE
+HEADING_SPACE_BEFORE, HEADING_SPACE_AFTER = 25 * PX, 10 * PX
+LIST_INDENT = 40 * PX
+QUOTE_INDENT, QUOTE_BORDER, QUOTE_PADDING = 40 * PX, 4 * PX, 15 * PX
+CELL_PADDING = 10 * PX
+TABLE_SPACE_AFTER = 15 * PX
+FIRST_COLUMN_WIDTH = 0.3
+CODE_SCALE = 0.9
+ITALIC_SKEW = 12  # градусів
+
+TEXT_COLOR = HexColor("#333333")
+HEADING_COLOR = HexColor("#111111")
+QUOTE_COLOR = HexColor("#555555")
+BORDER_COLOR = HexColor("#dddddd")
+RULE_COLOR = HexColor("#eeeeee")
+HEAD_BACKGROUND = HexColor("#f9f9f9")
+FIRST_COLUMN_BACKGROUND = HexColor("#fdfdfd")
+CODE_BACKGROUND = HexColor("#f5f5f5")
+
+# Фрагмент рядка: (зсув x, текст, стиль, ширина)
+Fragment = Tuple[float, str, int, float]
+_TOKENS = re.compile(r"\n| +|[^ \n]+")
+
+
+class _TextStyle:
+    """Шрифт і розмір для рядкового контейнера: base — роль шрифту з PDF_FONTS, bold — жирний за замовчуванням."""
+
+    __slots__ = ("fonts", "size", "base", "bold", "color", "italic")
+
+    def __init__(self, fonts: dict, size: float, base: str = "regular", bold: bool = False, color=TEXT_COLOR, italic: bool = False):
+        self.fonts = fonts
+        self.size = size
+        self.base = base
+        self.bold = bold
+        self.color = color
+        self.italic = italic
+
+    @property
+    def leading(self) -> float:
+        return self.size * LINE_HEIGHT
+
+    def font(self, style: int) -> Tuple[str, float]:
+        if style & CODE:
+            return self.fonts["mono"], self.size * CODE_SCALE
+        if self.base == "regular" and (self.bold or style & BOLD):
+            return self.fonts["bold"], self.size
+        return self.fonts[self.base], self.size
+
+
+def wrap_runs(runs: List[Run], width: float, text_style: _TextStyle) -> List[List[Fragment]]:
+    """Жадібний перенос за шириною: слова не розриваються, якщо влазять у рядок; \\n — примусовий перенос."""
+    lines: List[List[Fragment]] = []
+    line: List[Fragment] = []
+    x = 0.0
+    pending_space = 0.0
+
+    def measure(text: str, style: int) -> float:
+        font_name, size = text_style.font(style)
+        return pdfmetrics.stringWidth(text, font_name, size)
+
+    def append(text: str, style: int, w: float) -> None:
+        nonlocal x
+        if line and line[-1][2] == style:
+            offset, previous, _, previous_width = line[-1]
+            joined = previous + (" " if pending_space else "") + text
+            line[-1] = (offset, joined, style, previous_width + pending_space + w)
+        else:
+            line.append((x, text, style, w))
+        x += w
+
+    for text, style in runs:
+        for token in _TOKENS.findall(text):
+            if token == "\n":
+                lines.append(line)
+                line, x, pending_space = [], 0.0, 0.0
+                continue
+            if token[0] == " ":
+                if line:
+                    pending_space = measure(" ", style)
+                continue
+            w = measure(token, style)
+            if line and x + pending_space + w > width:
+                lines.append(line)
+                line, x, pending_space = [], 0.0, 0.0
+            if w > width:
+                # Слово ширше за колонку (посилання, довгий токен) — ріжемо по символах
+                chunk = ""
+                for ch in token:
+                    if chunk and measure(chunk + ch, style) > width:
+                        append(chunk, style, measure(chunk, style))
+                        lines.append(line)
+                        line, x, pending_space = [], 0.0, 0.0
+                        chunk = ""
+                    chunk += ch
+                token, w = chunk, measure(chunk, style)
+            x += pending_space
+            append(token, style, w)
+            pending_space = 0.0
+    if line or not lines:
+        lines.append(line)
+    return lines
+
+
+class _PageWriter:
+    """Курсор по сторінках: y — верх вільного місця; нові сторінки — за потреби."""
+
+    def __init__(self, fonts: dict, title: Optional[str], check: Optional[Callable[[], None]] = None):
+        self.fonts = fonts
+        # Дедлайн/скасування рендера (pdf_utils): перевіряється між блоками, рядками таблиць і сторінками
+        self.check = check or (lambda: None)
+        self.buffer = io.BytesIO()
+        self.canvas = canvas.Canvas(self.buffer, pagesize=A4, pageCompression=1)
+        if title:
+            self.canvas.setTitle(title)
+        self.left = MARGIN_LEFT
+        self.width = PAGE_WIDTH - MARGIN_LEFT - MARGIN_RIGHT
+        self.bottom = MARGIN_BOTTOM
+        self.y = PAGE_HEIGHT - MARGIN_TOP
+        self.space = 0.0  # відступ перед наступним блоком (схлопується, як margin у CSS)
+        self.page_has_content = False
+
+    def new_page(self) -> None:
+        self.check()
+        self.canvas.showPage()
+        self.y = PAGE_HEIGHT - MARGIN_TOP
+        self.page_has_content = False
+
+    def add_space(self, space: float) -> None:
+        self.space = max(self.space, space)
+
+    def reserve(self, height: float) -> None:
+        """Готує місце під height пунктів (з відступом перед блоком) — або переходить на нову сторінку."""
+        space = self.space if self.page_has_content else 0.0
+        if self.page_has_content and self.y - space - height < self.bottom:
+            self.new_page()
+            space = 0.0
+        self.y -= space
+        self.space = 0.0
+        self.page_has_content = True
+
+    def fits(self, height: float) -> bool:
+        return self.y - height >= self.bottom
+
+    def finish(self) -> bytes:
+        self.canvas.save()
+        return self.buffer.getvalue()
+
+    # --- Малювання ---
+
+    def draw_line(self, fragments: List[Fragment], x: float, top: float, text_style: _TextStyle) -> None:
+        """Малює рядок, верх якого на висоті top."""
+        c = self.canvas
+        size = text_style.size
+        baseline = top - (text_style.leading - size) / 2 - size * 0.8
+        for offset, text, style, w in fragments:
+            font_name, font_size = text_style.font(style)
+            left = x + offset
+            if style & CODE:
+                c.setFillColor(CODE_BACKGROUND)
+                c.rect(left - 1.5, baseline - size * 0.25, w + 3, size * 1.15, stroke=0, fill=1)
+            c.setFillColor(text_style.color)
+            c.setFont(font_name, font_size)
+            if style & ITALIC or text_style.italic:
+                c.saveState()
+                c.translate(left, baseline)
+                c.skew(0, ITALIC_SKEW)
+                c.drawString(0, 0, text)
+                c.restoreState()
+            else:
+                c.drawString(left, baseline, text)
+            if style & STRIKE:
+                c.setStrokeColor(text_style.color)
+                c.setLineWidth(0.6)
+                c.line(left, baseline + size * 0.3, left + w, baseline + size * 0.3)
+
+    def text_block(self, runs: List[Run], text_style: _TextStyle, indent: float = 0.0, marker: Optional[str] = None,
+                   bar: Optional[float] = None) -> None:
+        """Абзац: рядки переносяться між сторінками; marker — маркер списку, bar — x лівої лінії цитати."""
+        width = self.width - indent
+        leading = text_style.leading
+        for i, line in enumerate(wrap_runs(runs, width, text_style)):
+            self.reserve(leading)
+            top = self.y
+            self.draw_line(line, self.left + indent, top, text_style)
+            if marker is not None and i == 0:
+                marker_width = pdfmetrics.stringWidth(marker, text_style.font(0)[0], text_style.size)
+                self.draw_line([(0.0, marker, 0, marker_width)], self.left + indent - marker_width - 6, top, text_style)
+            if bar is not None:
+                self.canvas.setFillColor(RULE_COLOR)
+                self.canvas.rect(self.left + bar, top - leading, QUOTE_BORDER, leading, stroke=0, fill=1)
+            self.y -= leading
+
+    def heading(self, level: int, runs: List[Run]) -> None:
+        text_style = _TextStyle(self.fonts, HEADING_SIZES[level], base="heading", color=HEADING_COLOR)
+        text_style_leading = text_style.size * 1.25  # line-height заголовків
+        self.add_space(HEADING_SPACE_BEFORE)
+        lines = wrap_runs(runs, self.width, text_style)
+        border = HEADING_BORDERS.get(level)
+        # Заголовок не лишається сам унизу сторінки: разом з ним — хоча б один рядок тексту
+        self.reserve(len(lines) * text_style_leading + FONT_SIZE * LINE_HEIGHT * 2)
+        for line in lines:
+            self.draw_line(line, self.left, self.y + (text_style.leading - text_style_leading) / 2, text_style)
+            self.y -= text_style_leading
+        if border:
+            self.y -= 5 * PX if level == 1 else 3 * PX
+            self.canvas.setFillColor(RULE_COLOR)
+            self.canvas.rect(self.left, self.y - border, self.width, border, stroke=0, fill=1)
+            self.y -= border
+        self.add_space(HEADING_SPACE_AFTER)
+
+    def rule(self) -> None:
+        self.add_space(FONT_SIZE / 2)
+        self.reserve(1)
+        self.canvas.setStrokeColor(BORDER_COLOR)
+        self.canvas.setLineWidth(PX)
+        self.canvas.line(self.left, self.y, self.left + self.width, self.y)
+        self.y -= 1
+        self.add_space(FONT_SIZE / 2)
+
+    # --- Таблиці ---
+
+    def _column_widths(self, columns: int) -> List[float]:
+        if columns == 1:
+            return [self.width]
+        first = self.width * FIRST_COLUMN_WIDTH
+        rest = (self.width - first) / (columns - 1)
+        return [first] + [rest] * (columns - 1)
+
+    def _draw_row(self, cells: List[List[List[Fragment]]], widths: List[float], styles: List[_TextStyle],
+                  backgrounds: list, lines_count: int) -> None:
+        c = self.canvas
+        leading = styles[0].leading
+        height = lines_count * leading + 2 * CELL_PADDING
+        top = self.y
+        x = self.left
+        for lines, width, text_style, background in zip(cells, widths, styles, backgrounds):
+            if background is not None:
+                c.setFillColor(background)
+                c.rect(x, top - height, width, height, stroke=0, fill=1)
+            line_top = top - CELL_PADDING
+            for line in lines:
+                self.draw_line(line, x + CELL_PADDING, line_top, text_style)
+                line_top -= leading
+            c.setStrokeColor(BORDER_COLOR)
+            c.setLineWidth(PX)
+            c.rect(x, top - height, width, height, stroke=1, fill=0)
+            x += width
+        self.y -= height
+
+    def table(self, head: List[List[Run]], rows: List[List[List[Run]]]) -> None:
+        columns = max([len(head)] + [len(row) for row in rows])
+        if not columns:
+            return
+        widths = self._column_widths(columns)
+        body = _TextStyle(self.fonts, FONT_SIZE)
+        bold = _TextStyle(self.fonts, FONT_SIZE, bold=True)
+        leading = body.leading
+        content_widths = [w - 2 * CELL_PADDING for w in widths]
+
+        head_lines = None
+        if head:
+            cells = head + [[]] * (columns - len(head))
+            head_lines = [wrap_runs(cell, w, bold) for cell, w in zip(cells, content_widths)]
+        head_height = (max(len(lines) for lines in head_lines) * leading + 2 * CELL_PADDING) if head_lines else 0.0
+
+        def draw_head() -> None:
+            if head_lines:
+                count = max(len(lines) for lines in head_lines)
+                self._draw_row(head_lines, widths, [bold] * columns, [HEAD_BACKGROUND] * columns, count)
+
+        # Перший рядок таблиці — разом із шапкою
+        self.reserve(head_height + leading + 2 * CELL_PADDING)
+        draw_head()
+
+        # Перша колонка — жирна, на світлому фоні (як td:first-child у PDF_CSS_STYLE)
+        styles = [bold] + [body] * (columns - 1)
+        backgrounds = [FIRST_COLUMN_BACKGROUND] + [None] * (columns - 1)
+        page_height = PAGE_HEIGHT - MARGIN_TOP - MARGIN_BOTTOM
+        for row in rows:
+            self.check()
+            cells = row + [[]] * (columns - len(row))
+            pending = [wrap_runs(cell, w, text_style) for cell, w, text_style in zip(cells, content_widths, styles)]
+            while True:
+                needed = max(len(lines) for lines in pending)
+                height = needed * leading + 2 * CELL_PADDING
+                fits_fresh_page = height <= page_height - head_height
+                if not self.fits(height) and (fits_fresh_page or not self.fits(leading + 2 * CELL_PADDING)):
+                    # Рядок, що влазить на нову сторінку, не розриваємо; довгий — ділимо по рядках тексту
+                    self.new_page()
+                    self.page_has_content = True
+                    draw_head()
+                    continue
+                count = min(needed, max(1, int((self.y - self.bottom - 2 * CELL_PADDING) // leading)))
+                self._draw_row([lines[:count] for lines in pending], widths, styles, backgrounds, count)
+                pending = [lines[count:] for lines in pending]
+                if not any(pending):
+                    break
+        self.add_space(TABLE_SPACE_AFTER)
+
+
+def _render_blocks(writer: _PageWriter, blocks: list, indent: float = 0.0, quote: bool = False) -> None:
+    fonts = writer.fonts
+    body = _TextStyle(fonts, FONT_SIZE, color=QUOTE_COLOR if quote else TEXT_COLOR, italic=quote)
+    bar = indent - QUOTE_PADDING - QUOTE_BORDER if quote else None
+    for block in blocks:
+        writer.check()
+        kind = block[0]
+        if kind == "heading":
+            writer.heading(block[1], block[2])
+        elif kind == "para":
+            writer.add_space(PARAGRAPH_SPACING)
+            writer.text_block(block[1], body, indent=indent, bar=bar)
+            writer.add_space(PARAGRAPH_SPACING)
+        elif kind == "list":
+            writer.add_space(PARAGRAPH_SPACING)
+            for number, item in enumerate(block[2], start=1):
+                marker = f"{number}." if block[1] else "•"
+                writer.text_block(item, body, indent=indent + LIST_INDENT, marker=marker, bar=bar)
+            writer.add_space(PARAGRAPH_SPACING)
+        elif kind == "rule":
+            writer.rule()
+        elif kind == "quote":
+            writer.add_space(PARAGRAPH_SPACING)
+            _render_blocks(writer, block[1], indent=indent + QUOTE_INDENT, quote=True)
+            writer.add_space(PARAGRAPH_SPACING)
+        elif kind == "table":
+            if quote:
+                raise UnsupportedContent("таблиця в цитаті")
+            writer.table(block[1], block[2])
+
+
+def _document_title(blocks: list) -> Optional[str]:
+    for block in blocks:
+        if block[0] == "heading":
+            return "".join(text for text, _ in block[2]).strip()
+    return None
+
+def render_html(html_full: str, check: Optional[Callable[[], None]] = None) -> bytes:
+    """
+    HTML документа (як для xhtml2pdf) → байти PDF. UnsupportedContent — якщо розмітка поза піднабором.
+    check() викликається між блоками та сторінками і може перервати рендер винятком (дедлайн, скасування).
+    """
+    blocks = parse_html(html_full)
+    writer = _PageWriter(register_fonts(), _document_title(blocks), check)
+    _render_blocks(writer, blocks)
+    return writer.finish()
@@ -2,27 +2,137 @@
 """
 Генерація PDF з Markdown (PDF-only).
 (v3.2 - Взято у товариша)
-Черга спроб:
-  A) pdfkit + wkhtmltopdf (рекомендовано; шлях можна задати через env WKHTMLTOPDF_CMD)
+Черга спроб (порядок — env PDF_BACKEND_ORDER, за замовчуванням "wkhtmltopdf,xhtml2pdf"):
+  0) native — власна розкладка документів бота напряму в PDF (pdf_native.py, reportlab):
+     без HTML/CSS-рушія; документ з незнайомою розміткою передається далі.
+     Вмикається явно (PDF_BACKEND_ORDER=native,wkhtmltopdf,xhtml2pdf): він у 4-7 разів швидший
+     за xhtml2pdf (bench.py pdf), а не в 10, як планувалось, тож за замовчуванням не стоїть першим
+  A) wkhtmltopdf (рекомендовано; шлях можна задати через env WKHTMLTOPDF_CMD)
   B) xhtml2pdf (pisa) — працює без зовнішніх бінарників (CSS дещо скромніший)
 
 Якщо жоден варіант недоступний — піднімається виняток із чіткою інструкцією, що встановити.
+
+Вміст — Markdown або, з is_html=True, вже готове HTML-тіло (без проходу markdown2).
+create_pdf_bytes_from_markdown() повертає PDF як bytes, нічого не записуючи на диск
+(бот надсилає ці байти одразу в send_document).
+
+Для async-хендлерів бота є create_pdf_bytes_from_markdown_async(): рендер виконується
+в обмеженому пулі воркерів (потоки або процеси), щоб не блокувати event loop.
+Налаштування через env:
+  PDF_EXECUTOR        — "thread" (за замовчуванням) або "process" (окремі процеси-воркери,
+                        які можна вбити поодинці: жорсткий дедлайн і ліміт пам'яті для будь-якого рушія)
+  PDF_WORKERS         — кількість воркерів у пулі (за замовчуванням 2)
+  PDF_MAX_CONCURRENT  — скільки рендерів виконується одночасно (за замовчуванням = PDF_WORKERS)
+  PDF_MAX_QUEUE       — скільки запитів може чекати в черзі (за замовчуванням 20)
+
+wkhtmltopdf працює через пул «теплих» процесів (_WkhtmltopdfPool): процес
+запускається заздалегідь (Qt/WebKit вже ініціалізовано) і чекає HTML у stdin,
+тож рендер не платить за холодний старт. Налаштування:
+  WKHTMLTOPDF_POOL_SIZE — скільки процесів тримати напоготові (0 — щоразу новий процес)
+  WKHTMLTOPDF_TIMEOUT   — ліміт часу на один документ, секунд (за замовчуванням 60)
+
+Межі рендера. Кожен документ має дедлайн, кожна спроба рушія — свій ліміт; рушій, що не
+вклався, рахується як збій, і документ іде наступному рушію:
+  PDF_RENDER_TIMEOUT    — дедлайн усього документа, секунд (за замовчуванням 60)
+  PDF_BACKEND_TIMEOUT   — ліміт однієї спроби рушія, секунд (за замовчуванням 20)
+  PDF_WORKER_MEMORY_MB  — ліміт пам'яті (RLIMIT_AS) процесів рендера: wkhtmltopdf і воркерів
+                          PDF_EXECUTOR=process (за замовчуванням 1024; 0 — без ліміту)
+cancel_renders(owner) скасовує рендери власника (бот викликає на /cancel з chat_id).
+native перевіряє дедлайн і скасування між блоками, процес wkhtmltopdf і воркер
+PDF_EXECUTOR=process вбиваються. xhtml2pdf у потоці перервати неможливо: бот перестає
+чекати на дедлайні, а потік доробляє документ сам — для жорсткої межі є PDF_EXECUTOR=process.
+
+Доступні рушії визначаються один раз (probe_backends() при старті бота): версії
+та шляхи кешуються, і кожен рендер одразу йде на найкращий робочий рушій.
+Після PDF_BACKEND_MAX_FAILURES збоїв поспіль рушій вимикається і перевіряється
+знову через PDF_BACKEND_REPROBE_AFTER секунд.
+
+Шрифти з кирилицею (pdf_fonts.py) реєструються один раз при пробі рушіїв — і для native,
+і для xhtml2pdf, а вбудовані підмножини TTF кешуються між документами. У лог кожного
+рендера пишеться розмір PDF і час, витрачений на шрифти.
+
+xhtml2pdf розбирає CSS (свій DEFAULT_CSS і наш PDF_CSS_RULES) один раз на процес: на кожен
+документ лишається лише @page і саме тіло (env PDF_CSS_PREPARSE=0 — вимкнути).
+
+Готові PDF кешуються за sha256(вміст + CSS): LRU у пам'яті
+(PDF_CACHE_MAX_BYTES, 0 — вимкнути) і, за бажанням, на диску (PDF_CACHE_DIR).
+Лічильники — get_cache_stats().
+
+Однакові одночасні запити (подвійне натискання, кілька користувачів з тим самим вмістом)
+не рендеряться паралельно: за тим самим ключем у польоті лише один рендер (single-flight),
+решта чекають на нього й отримують ті самі байти. Запит, скасований через cancel_renders(),
+лише перестає чекати; сам рендер зупиняється, коли від нього відмовилися всі.
 """
 
+import asyncio
+import hashlib
+import io
 import logging
 import os
-from typing import Optional
+import shutil
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Callable, Optional
 
 import markdown2
 
 logger = logging.getLogger("pdf_utils")
 logger.setLevel(logging.INFO)
 
+# --- Налаштування пулу рендерингу ---
+PDF_EXECUTOR = os.getenv("PDF_EXECUTOR", "thread").lower()
+PDF_WORKERS = max(1, int(os.getenv("PDF_WORKERS", "2")))
+PDF_MAX_CONCURRENT = max(1, int(os.getenv("PDF_MAX_CONCURRENT", str(PDF_WORKERS))))
+PDF_MAX_QUEUE = max(0, int(os.getenv("PDF_MAX_QUEUE", "20")))
+
+# --- Налаштування wkhtmltopdf ---
+WKHTMLTOPDF_POOL_SIZE = max(0, int(os.getenv("WKHTMLTOPDF_POOL_SIZE", "2")))
+WKHTMLTOPDF_TIMEOUT = float(os.getenv("WKHTMLTOPDF_TIMEOUT", "60"))
+# --- Межі рендера ---
+PDF_RENDER_TIMEOUT = float(os.getenv("PDF_RENDER_TIMEOUT", "60"))
+PDF_BACKEND_TIMEOUT = float(os.getenv("PDF_BACKEND_TIMEOUT", "20"))
+PDF_WORKER_MEMORY_MB = max(0, int(os.getenv("PDF_WORKER_MEMORY_MB", "1024")))
+# Як часто процес, що чекає на рендер, перевіряє дедлайн і скасування
+_POLL_INTERVAL = 0.05
+# Скільки чекати понад дедлайн, перш ніж вбивати воркер (кооперативна зупинка встигає першою)
+_KILL_GRACE = 1.0
+# --- Кеш готових PDF ---
+PDF_CACHE_MAX_BYTES = max(0, int(os.getenv("PDF_CACHE_MAX_BYTES", str(32 * 1024 * 1024))))
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR") or None
+
+# Розбирати CSS для xhtml2pdf один раз на процес ("0" — як у бібліотеки, на кожен документ)
+PDF_CSS_PREPARSE = os.getenv("PDF_CSS_PREPARSE", "1") == "1"
+
+# --- Рушії та запобіжник ---
+PDF_BACKEND_ORDER = os.getenv("PDF_BACKEND_ORDER", "wkhtmltopdf,xhtml2pdf")
+PDF_BACKEND_MAX_FAILURES = max(1, int(os.getenv("PDF_BACKEND_MAX_FAILURES", "3")))
+PDF_BACKEND_REPROBE_AFTER = float(os.getenv("PDF_BACKEND_REPROBE_AFTER", "300"))
+
+WKHTMLTOPDF_OPTIONS = {
+    'encoding': "UTF-8",
+    'page-size': 'A4',
+    'margin-top': '20mm',
+    'margin-bottom': '22mm',
+    'margin-left': '17mm',
+    'margin-right': '17mm',
+    'quiet': ''
+}
+
 # --- Ліниві імпорти, щоб не падати, якщо пакетів немає ---
-def _try_import_pdfkit():
+def _try_import_fonts():
     try:
-        import pdfkit  # type: ignore
-        return pdfkit
+        import pdf_fonts  # reportlab (ставиться разом з xhtml2pdf)
+        return pdf_fonts
+    except Exception:
+        return None
+
+def _try_import_native():
+    try:
+        import pdf_native  # reportlab (ставиться разом з xhtml2pdf)
+        return pdf_native
     except Exception:
         return None
 
@@ -34,9 +144,10 @@ def _try_import_xhtml2pdf():
         return None
 
 # --- Стилі, наближені до нашої v2.8 (чисті шрифти, охайні таблиці) ---
-PDF_CSS_STYLE = """
-<style>
-    @page { size: A4; margin: 20mm 17mm 22mm 17mm; }
+# @page — окремим <style>: xhtml2pdf будує з нього шаблон сторінки для кожного документа,
+# а решта правил чиста і розбирається один раз (див. _install_xhtml2pdf_css_cache)
+PDF_PAGE_CSS = "@page { size: A4; margin: 20mm 17mm 22mm 17mm; }"
+PDF_CSS_RULES = """
     body {
         font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Helvetica, Arial, sans-serif,
                      "Apple Color Emoji","Segoe UI Emoji","Segoe UI Symbol";
@@ -84,109 +195,744 @@ PDF_CSS_STYLE = """
     blockquote { border-left: 4px solid #eee; padding-left: 15px; color: #555; font-style: italic; }
     /* Спеціально для xhtml2pdf, щоб <br> працював у таблицях */
     br { display: block; content: ""; margin-bottom: 0.5em; } 
+"""
+PDF_CSS_STYLE = f"""
+<style>
+    {PDF_PAGE_CSS}
 </style>
+<style>{PDF_CSS_RULES}</style>
 """
 
+MARKDOWN_EXTRAS = ["tables", "fenced-code-blocks", "strike", "cuddled-lists", "break-on-newline"]
+
+# Статична обгортка документа (head + CSS) збирається один раз
+_HTML_HEAD = f"<html><head><meta charset='UTF-8'>{PDF_CSS_STYLE}</head><body>"
+_HTML_TAIL = "</body></html>"
+
+def _wrap_html(html_body: str) -> str:
+    """Обгортає тіло документа в <html> з нашими стилями."""
+    return _HTML_HEAD + html_body + _HTML_TAIL
+
 def _md_to_html(md_content: str) -> str:
     """Конвертує Markdown (з нашими шаблонами v2.8) в HTML."""
-    html_body = markdown2.markdown(
-        md_content,
-        extras=["tables", "fenced-code-blocks", "strike", "cuddled-lists", "break-on-newline"]
-    )
-    return f"<html><head><meta charset='UTF-8'>{PDF_CSS_STYLE}</head><body>{html_body}</body></html>"
+    html_body = markdown2.markdown(md_content, extras=MARKDOWN_EXTRAS)
+    return _wrap_html(html_body)
+
+def _to_full_html(content: str, is_html: bool) -> str:
+    """content — або Markdown, або вже готове HTML-тіло (is_html=True, без markdown2)."""
+    return _wrap_html(content) if is_html else _md_to_html(content)
+
+class _WkhtmltopdfPool:
+    """
+    Пул «теплих» процесів wkhtmltopdf.
+    Кожен процес стартує заздалегідь з аргументами `- -` (HTML зі stdin, PDF у stdout)
+    і чекає на документ. Після рендеру процес завершується, а на його місце одразу
+    запускається новий. Мертві процеси (краш, OOM-kill) виявляються перевіркою
+    здоров'я і автоматично перезапускаються.
+    """
+
+    def __init__(self, binary: str, options: dict, size: int, timeout: float, memory_limit_mb: int = 0):
+        self.binary = binary
+        self.size = size
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self._command = [binary]
+        for key, value in options.items():
+            self._command.append(f"--{key}")
+            if value:
+                self._command.append(str(value))
+        self._command += ["-", "-"]
+        self._idle: list = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self.restarts = 0
+        self.ensure_warm()
+
+    def _spawn(self) -> subprocess.Popen:
+        proc = subprocess.Popen(
+            self._command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        # Процес чекає HTML у stdin, тож ліміт встигає до початку роботи
+        _limit_memory(proc.pid, self.memory_limit_mb)
+        return proc
+
+    def check_health(self) -> None:
+        """Прибирає з пулу процеси, що померли, поки чекали на роботу."""
+        with self._lock:
+            alive = []
+            for proc in self._idle:
+                if proc.poll() is None:
+                    alive.append(proc)
+                else:
+                    self.restarts += 1
+                    logger.warning(f"Теплий wkhtmltopdf (pid {proc.pid}) завершився з кодом {proc.returncode}, перезапускаю.")
+            self._idle = alive
+
+    def ensure_warm(self) -> None:
+        """Перевіряє здоров'я пулу і добирає процеси до потрібної кількості."""
+        self.check_health()
+        with self._lock:
+            while not self._closed and len(self._idle) < self.size:
+                self._idle.append(self._spawn())
+
+    def _acquire(self) -> subprocess.Popen:
+        with self._lock:
+            while self._idle:
+                proc = self._idle.pop(0)
+                if proc.poll() is None:
+                    return proc
+                self.restarts += 1
+                logger.warning(f"Теплий wkhtmltopdf (pid {proc.pid}) мертвий, беру наступний.")
+        # Пул порожній — запускаємо процес «холодним»
+        return self._spawn()
+
+    def render(self, html_full: str, timeout: Optional[float] = None, cancelled: Optional[threading.Event] = None) -> bytes:
+        """
+        Рендерить HTML у PDF через готовий процес. Піднімає виняток при помилці.
+        Процес, що не вклався в min(timeout, WKHTMLTOPDF_TIMEOUT) або скасований, вбивається.
+        """
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        deadline = time.monotonic() + timeout
+        proc = self._acquire()
+        # Одразу готуємо заміну, щоб наступний документ теж потрапив на теплий процес
+        self.ensure_warm()
+        data = html_full.encode("utf-8")
+        while True:
+            try:
+                pdf_bytes, stderr = proc.communicate(data, timeout=_POLL_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                # Повторний communicate() продовжує з того ж місця, вхід передається лише раз
+                data = None
+                if cancelled is not None and cancelled.is_set():
+                    self._kill(proc)
+                    raise PdfRenderCancelled("Генерацію PDF скасовано.")
+                if time.monotonic() >= deadline:
+                    self._kill(proc)
+                    raise PdfRenderTimeout(f"wkhtmltopdf не вклався у {timeout:.1f} с")
+
+        # wkhtmltopdf може повернути ненульовий код через попередження (напр., мережеві ресурси),
+        # тому орієнтуємось на вміст stdout.
+        if not pdf_bytes.startswith(b"%PDF"):
+            raise IOError(
+                f"wkhtmltopdf завершився з кодом {proc.returncode}: "
+                f"{stderr.decode('utf-8', 'replace').strip()}"
+            )
+        return pdf_bytes
+
+    @staticmethod
+    def _kill(proc: subprocess.Popen) -> None:
+        proc.kill()
+        proc.communicate()
+        logger.warning(f"wkhtmltopdf (pid {proc.pid}) вбито.")
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            for proc in self._idle:
+                proc.kill()
+                proc.wait()
+            self._idle = []
+
+
+# === Визначення доступних рушіїв (один раз на процес) ===
+
+BACKENDS = ("native", "wkhtmltopdf", "xhtml2pdf")
+
+def _parse_backend_order(value: str) -> tuple:
+    order = tuple(name.strip().lower() for name in value.split(",") if name.strip())
+    unknown = [name for name in order if name not in BACKENDS]
+    if unknown or not order:
+        raise ValueError(f"PDF_BACKEND_ORDER: невідомі рушії {unknown}. Доступні: {', '.join(BACKENDS)}")
+    return order
+
+BACKEND_ORDER = _parse_backend_order(PDF_BACKEND_ORDER)
+
+
+class _BackendSkipped(Exception):
+    """Рушій не береться за цей документ (не збій: запобіжник не рахує)."""
+
+
+class PdfRenderTimeout(TimeoutError):
+    """Рендер не вклався у дедлайн (PDF_RENDER_TIMEOUT або PDF_BACKEND_TIMEOUT для однієї спроби)."""
+
+
+class PdfRenderCancelled(Exception):
+    """Рендер скасовано (cancel_renders, напр. користувач натиснув /cancel)."""
+
+
+class _RenderControl:
+    """
+    Дедлайн і прапорець скасування одного документа. Рушії перевіряють їх між кроками
+    (check()), а спроба окремого рушія отримує дочірній контроль зі своїм, коротшим дедлайном.
+    Відлік починається з start() — час у черзі пулу до дедлайну не входить.
+    """
+
+    __slots__ = ("timeout", "deadline", "cancelled")
+
+    def __init__(self, timeout: float, cancelled: Optional[threading.Event] = None):
+        self.timeout = timeout
+        self.deadline: Optional[float] = None
+        self.cancelled = cancelled or threading.Event()
 
-def _generate_with_pdfkit(html_full: str, output_filename: str) -> bool:
-    """Спроба 1: Генерація через pdfkit (wkhtmltopdf)."""
-    pdfkit = _try_import_pdfkit()
-    if not pdfkit:
-        logger.warning("Бібліотека 'pdfkit' не встановлена. Пропускаю...")
-        return False
+    def start(self) -> "_RenderControl":
+        if self.deadline is None:
+            self.deadline = time.monotonic() + self.timeout
+        return self
 
+    def remaining(self) -> float:
+        self.start()
+        return max(0.0, self.deadline - time.monotonic())
+
+    def attempt(self, timeout: float) -> "_RenderControl":
+        """Контроль для однієї спроби рушія: min(timeout, залишок), скасування — спільне."""
+        return _RenderControl(min(timeout, self.remaining()), self.cancelled).start()
+
+    def check(self) -> None:
+        if self.cancelled.is_set():
+            raise PdfRenderCancelled("Генерацію PDF скасовано.")
+        if self.remaining() <= 0:
+            raise PdfRenderTimeout(f"Генерація PDF не вклалася у {self.timeout:.3g} с.")
+
+
+def _limit_memory(pid: Optional[int], limit_mb: int) -> None:
+    """RLIMIT_AS для процесу рендера (pid=None — поточний процес). Без модуля resource (Windows) — нічого."""
+    if limit_mb <= 0:
+        return
     try:
-        # Шукаємо wkhtmltopdf
-        wkhtmltopdf_path_env = os.getenv("WKHTMLTOPDF_CMD")
-        config = None
-        if wkhtmltopdf_path_env and os.path.exists(wkhtmltopdf_path_env):
-            logger.info(f"Використовую wkhtmltopdf з WKHTMLTOPDF_CMD: {wkhtmltopdf_path_env}")
-            config = pdfkit.configuration(wkhtmltopdf=wkhtmltopdf_path_env)
-        
-        options = {
-            'encoding': "UTF-8",
-            'page-size': 'A4',
-            'margin-top': '20mm',
-            'margin-bottom': '22mm',
-            'margin-left': '17mm',
-            'margin-right': '17mm',
-            'quiet': ''
-        }
-        
-        pdfkit.from_string(html_full, output_filename, options=options, configuration=config)
-        return True
-    
-    except IOError as e:
-        if "No wkhtmltopdf executable found" in str(e):
-            logger.warning("wkhtmltopdf не знайдено у PATH. Спроба 2: xhtml2pdf...")
+        import resource
+        limit = limit_mb * 1024 * 1024
+        if pid is None:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
         else:
-            logger.error(f"pdfkit впав з помилкою вводу-виводу: {e}")
-        return False
+            resource.prlimit(pid, resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, AttributeError):
+        return
+    except (OSError, ValueError) as e:
+        logger.warning(f"Не вдалося обмежити пам'ять процесу рендера {pid or os.getpid()}: {e}")
+
+
+class _BackendState:
+    """Що відомо про рушій після проби: чи працює, версія, лічильник збоїв."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.available = False
+        self.version: Optional[str] = None
+        self.detail: Optional[str] = None
+        self.failures = 0
+        self.tripped_at: Optional[float] = None
+
+
+_backends: dict = {}
+_backends_lock = threading.Lock()
+_wkhtmltopdf_binary: Optional[str] = None
+_wkhtmltopdf_pool: Optional[_WkhtmltopdfPool] = None
+
+def _probe_wkhtmltopdf(state: _BackendState) -> None:
+    global _wkhtmltopdf_binary
+    binary = os.getenv("WKHTMLTOPDF_CMD")
+    if not (binary and os.path.exists(binary)):
+        binary = shutil.which("wkhtmltopdf")
+    if not binary:
+        state.detail = "wkhtmltopdf не знайдено у PATH (або WKHTMLTOPDF_CMD)"
+        return
+    try:
+        result = subprocess.run([binary, "--version"], stdin=subprocess.DEVNULL, capture_output=True, timeout=15)
+    except Exception as e:
+        state.detail = f"wkhtmltopdf не запускається: {e}"
+        return
+    if result.returncode != 0:
+        state.detail = f"wkhtmltopdf --version повернув код {result.returncode}"
+        return
+
+    _wkhtmltopdf_binary = binary
+    state.available = True
+    state.version = result.stdout.decode("utf-8", "replace").strip()
+
+def _probe_native(state: _BackendState) -> None:
+    pdf_fonts = _try_import_fonts()
+    if not pdf_fonts or not _try_import_native():
+        state.detail = "бібліотека 'reportlab' не встановлена"
+        return
+    try:
+        fonts = pdf_fonts.register_fonts()
+    except Exception as e:
+        state.detail = f"шрифти не зареєстровано: {e}"
+        return
+    import reportlab  # type: ignore
+    state.available = True
+    state.version = f"reportlab {reportlab.Version}, шрифт {pdf_fonts.PDF_FONTS['regular']} ({len(set(fonts.values()))} накресл.)"
+
+_preparsed_css: dict = {}
+_preparsed_css_lock = threading.Lock()
+
+def _install_xhtml2pdf_css_cache() -> None:
+    """
+    Обгортає розбір CSS-джерела в xhtml2pdf (pisaContext._parseCSSSource): DEFAULT_CSS бібліотеки
+    і PDF_CSS_RULES розбираються один раз, далі кожен документ бере готові правила.
+    Кешуються лише ці два тексти: правила без @-блоків не мають побічних ефектів у контексті,
+    тож розібраний результат однаковий для всіх документів.
+    """
+    from xhtml2pdf.context import pisaContext  # type: ignore
+    from xhtml2pdf.default import DEFAULT_CSS  # type: ignore
+
+    parse_source = getattr(pisaContext, "_parseCSSSource", None)
+    if parse_source is None or getattr(parse_source, "preparsed", False):
+        return
+    cacheable = frozenset((DEFAULT_CSS.strip(), PDF_CSS_RULES.strip()))
+
+    def _parse_css_source(context, text, source_name):
+        key = text.strip()
+        if not PDF_CSS_PREPARSE or key not in cacheable:
+            return parse_source(context, text, source_name)
+        stylesheet = _preparsed_css.get(key)
+        if stylesheet is None:
+            with _preparsed_css_lock:
+                stylesheet = _preparsed_css.get(key)
+                if stylesheet is None:
+                    stylesheet = _preparsed_css[key] = parse_source(context, text, source_name)
+        return stylesheet
+
+    _parse_css_source.preparsed = True
+    pisaContext._parseCSSSource = _parse_css_source
+
+def _probe_xhtml2pdf(state: _BackendState) -> None:
+    pisa = _try_import_xhtml2pdf()
+    if not pisa:
+        state.detail = "бібліотека 'xhtml2pdf' не встановлена"
+        return
+    import xhtml2pdf  # type: ignore
+    state.available = True
+    state.version = getattr(xhtml2pdf, "__version__", None)
+    _install_xhtml2pdf_css_cache()
+    pdf_fonts = _try_import_fonts()
+    try:
+        pdf_fonts.register_xhtml2pdf_fonts()
+    except Exception as e:
+        # Рушій працює, але з базовими шрифтами: кирилиця буде «квадратиками»
+        state.detail = f"без шрифтів з кирилицею: {e}"
+        logger.warning(f"xhtml2pdf: шрифти з кирилицею не зареєстровано ({e})")
+        return
+    state.version = f"{state.version}, шрифт {pdf_fonts.PDF_FONTS['regular']}"
+
+_PROBES = {
+    "native": _probe_native,
+    "wkhtmltopdf": _probe_wkhtmltopdf,
+    "xhtml2pdf": _probe_xhtml2pdf,
+}
+
+def _probe_backend(name: str) -> _BackendState:
+    state = _BackendState(name)
+    _PROBES[name](state)
+    if state.available:
+        logger.info(f"PDF-рушій '{name}' доступний: {state.version}")
+    else:
+        logger.warning(f"PDF-рушій '{name}' недоступний: {state.detail}")
+    return state
+
+def probe_backends(force: bool = False) -> dict:
+    """
+    Визначає, які PDF-рушії працюють у цьому процесі (викликається один раз при старті).
+    Результат кешується; повторна проба — лише з force=True або після спрацювання
+    запобіжника (PDF_BACKEND_MAX_FAILURES збоїв поспіль).
+    Повертає {назва: {"available", "version", "detail"}}.
+    """
+    with _backends_lock:
+        if force or not _backends:
+            for name in BACKEND_ORDER:
+                _backends[name] = _probe_backend(name)
+    return get_backend_status()
+
+def get_backend_status() -> dict:
+    """Поточний стан рушіїв (для логів та діагностики)."""
+    return {
+        name: {
+            "available": state.available,
+            "version": state.version,
+            "detail": state.detail,
+            "failures": state.failures,
+        }
+        for name, state in _backends.items()
+    }
+
+def _usable_backends() -> list:
+    """Рушії в порядку пріоритету, що зараз доступні (з урахуванням запобіжника)."""
+    if not _backends:
+        probe_backends()
+    usable = []
+    now = time.monotonic()
+    with _backends_lock:
+        for name in BACKEND_ORDER:
+            state = _backends[name]
+            if state.tripped_at is not None and now - state.tripped_at >= PDF_BACKEND_REPROBE_AFTER:
+                # Запобіжник спрацював давно — пробуємо рушій знову
+                if name == "wkhtmltopdf":
+                    _close_wkhtmltopdf_pool()
+                state = _backends[name] = _probe_backend(name)
+            if state.available:
+                usable.append(name)
+    return usable
+
+def _record_result(name: str, ok: bool) -> None:
+    with _backends_lock:
+        state = _backends.get(name)
+        if state is None:
+            return
+        if ok:
+            state.failures = 0
+            return
+        state.failures += 1
+        if state.failures >= PDF_BACKEND_MAX_FAILURES and state.available:
+            state.available = False
+            state.tripped_at = time.monotonic()
+            state.detail = f"{state.failures} збоїв поспіль"
+            logger.error(
+                f"PDF-рушій '{name}' вимкнено після {state.failures} збоїв поспіль; "
+                f"повторна перевірка через {PDF_BACKEND_REPROBE_AFTER:.0f} с."
+            )
+
+def _get_wkhtmltopdf_pool() -> Optional[_WkhtmltopdfPool]:
+    """
+    Ліниво створює пул теплих процесів для знайденого при пробі wkhtmltopdf.
+    З WKHTMLTOPDF_POOL_SIZE=0 пул нічого не тримає напоготові, але рендер так само
+    йде через нього — з дедлайном, скасуванням і лімітом пам'яті.
+    """
+    global _wkhtmltopdf_pool
+    if not _wkhtmltopdf_binary:
+        return None
+    with _backends_lock:
+        if _wkhtmltopdf_pool is None:
+            _wkhtmltopdf_pool = _WkhtmltopdfPool(
+                _wkhtmltopdf_binary, WKHTMLTOPDF_OPTIONS, WKHTMLTOPDF_POOL_SIZE, WKHTMLTOPDF_TIMEOUT,
+                PDF_WORKER_MEMORY_MB,
+            )
+            logger.info(f"Пул теплих wkhtmltopdf запущено: {_wkhtmltopdf_binary} x{WKHTMLTOPDF_POOL_SIZE}")
+        return _wkhtmltopdf_pool
+
+def _close_wkhtmltopdf_pool() -> None:
+    global _wkhtmltopdf_pool
+    if _wkhtmltopdf_pool is not None:
+        _wkhtmltopdf_pool.close()
+        _wkhtmltopdf_pool = None
+
+# Генератори приймають (html_full, control): дедлайн спроби і скасування пропускаються наверх
+# як PdfRenderTimeout / PdfRenderCancelled, решта помилок — None (рушій не впорався).
+
+def _generate_with_native(html_full: str, control: Optional[_RenderControl] = None) -> Optional[bytes]:
+    """Спроба 0: власна розкладка (pdf_native). Незнайома розмітка — _BackendSkipped, інша помилка — None."""
+    pdf_native = _try_import_native()
+    if not pdf_native:
+        return None
+    try:
+        return pdf_native.render_html(html_full, check=control.check if control else None)
+    except pdf_native.UnsupportedContent as e:
+        raise _BackendSkipped(str(e)) from None
+    except (PdfRenderTimeout, PdfRenderCancelled):
+        raise
+    except Exception as e:
+        logger.error(f"Власний PDF-рушій впав: {e}", exc_info=True)
+        return None
+
+def _generate_with_wkhtmltopdf(html_full: str, control: Optional[_RenderControl] = None) -> Optional[bytes]:
+    """Спроба 1: Генерація через wkhtmltopdf (пул процесів). Повертає байти PDF або None."""
+    pool = _get_wkhtmltopdf_pool()
+    if pool is None:
+        return None
+    try:
+        if control is None:
+            return pool.render(html_full)
+        return pool.render(html_full, control.remaining(), control.cancelled)
+    except (PdfRenderTimeout, PdfRenderCancelled):
+        raise
     except Exception as e:
-        logger.error(f"pdfkit впав з невідомою помилкою: {e}")
-        return False
+        logger.error(f"wkhtmltopdf впав: {e}")
+        return None
 
-def _generate_with_xhtml2pdf(html_full: str, output_filename: str) -> bool:
-    """Спроба 2: Генерація через xhtml2pdf (чистий Python)."""
+def _generate_with_xhtml2pdf(html_full: str, control: Optional[_RenderControl] = None) -> Optional[bytes]:
+    """
+    Спроба 2: Генерація через xhtml2pdf (чистий Python). Повертає байти PDF або None.
+    Перервати посеред документа неможливо: дедлайн і скасування перевіряються лише до старту.
+    """
     pisa = _try_import_xhtml2pdf()
     if not pisa:
         logger.warning("Бібліотека 'xhtml2pdf' не встановлена. Пропускаю...")
-        return False
+        return None
     
+    pdf_fonts = _try_import_fonts()
+    if pdf_fonts:
+        html_full = pdf_fonts.apply_glyph_fallbacks(html_full)
+    if control is not None:
+        control.check()
     try:
-        with open(output_filename, "w+b") as result_file:
-            # Конвертуємо HTML в PDF
-            pisa_status = pisa.CreatePDF(
-                html_full,                # HTML-вміст
-                dest=result_file,         # Файл
-                encoding='utf-8'
-            )
+        result_buffer = io.BytesIO()
+        # Конвертуємо HTML в PDF
+        pisa_status = pisa.CreatePDF(
+            html_full,                # HTML-вміст
+            dest=result_buffer,       # Буфер у пам'яті
+            encoding='utf-8'
+        )
         
         if not pisa_status.err:
-            logger.info("PDF успішно створено через xhtml2pdf.")
-            return True
+            return result_buffer.getvalue()
         else:
             logger.error(f"xhtml2pdf впав з помилкою: {pisa_status.err}")
-            return False
+            return None
             
     except Exception as e:
         logger.warning(f"xhtml2pdf впав: {e}")
-        return False
+        return None
 
-def create_pdf_from_markdown(content: str, is_html: bool, output_filename: str) -> str:
+_GENERATORS = {
+    "native": _generate_with_native,
+    "wkhtmltopdf": _generate_with_wkhtmltopdf,
+    "xhtml2pdf": _generate_with_xhtml2pdf,
+}
+
+def _render_document(
+    content: str,
+    is_html: bool = False,
+    control: Optional[_RenderControl] = None,
+    backends: Optional[tuple] = None,
+    on_attempt: Optional[Callable[[str, float], None]] = None,
+) -> tuple:
     """
-    (ОНОВЛЕНО v2.9)
-    Генерує *PDF-файл* з Markdown.
-    Повертає шлях до PDF (output_filename). Якщо PDF створити не вийшло — піднімає виняток з інструкцією.
+    Рендерить Markdown (або готове HTML-тіло, якщо is_html) у PDF на найкращому доступному рушії (BACKEND_ORDER).
+    Повертає (байти PDF, назва рушія). Якщо нічого не вийшло — піднімає виняток з інструкцією.
+    Кожна спроба обмежена PDF_BACKEND_TIMEOUT (рушій, що не вклався, — збій, документ іде далі),
+    увесь документ — дедлайном control (PdfRenderTimeout); скасування — PdfRenderCancelled.
+    backends — обмежити спроби цими рушіями; on_attempt(name, timeout) — перед кожною спробою.
     """
-    logger.info(f"Старт генерації PDF (v2.9 Гібрид): {output_filename}")
-    # is_html ігнорується, ми завжди передаємо Markdown з v2.8
-    html_full = _md_to_html(content)
+    control = (control or _RenderControl(PDF_RENDER_TIMEOUT)).start()
+    html_full = _to_full_html(content, is_html)
+    pdf_fonts = _try_import_fonts()
+    timed_out = False
 
-    # A) wkhtmltopdf (краща якість)
-    if _generate_with_pdfkit(html_full, output_filename):
-        logger.info(f"PDF створено через wkhtmltopdf: {output_filename}")
-        return output_filename
-
-    # B) xhtml2pdf (без зовнішніх бінарників)
-    if _generate_with_xhtml2pdf(html_full, output_filename):
-        logger.info(f"PDF створено через xhtml2pdf: {output_filename}")
-        return output_filename
+    for name in _usable_backends():
+        if backends is not None and name not in backends:
+            continue
+        control.check()
+        attempt = control.attempt(PDF_BACKEND_TIMEOUT)
+        if on_attempt is not None:
+            on_attempt(name, attempt.remaining())
+        started = time.perf_counter()
+        try:
+            if pdf_fonts:
+                with pdf_fonts.font_timer() as fonts:
+                    pdf_bytes = _GENERATORS[name](html_full, attempt)
+            else:
+                fonts = None
+                pdf_bytes = _GENERATORS[name](html_full, attempt)
+        except _BackendSkipped as e:
+            logger.info(f"PDF-рушій '{name}' не розкладає цей документ ({e}), пробую наступний...")
+            continue
+        except PdfRenderTimeout:
+            if control.cancelled.is_set() or control.remaining() <= 0:
+                raise
+            timed_out = True
+            _record_result(name, False)
+            logger.warning(f"PDF-рушій '{name}' не вклався у {attempt.timeout:.1f} с, пробую наступний...")
+            continue
+        _record_result(name, bool(pdf_bytes))
+        if pdf_bytes:
+            font_time = f", шрифти {fonts.seconds * 1000:.1f} мс" if fonts else ""
+            logger.info(
+                f"PDF створено через {name} ({len(pdf_bytes)} байт, {(time.perf_counter() - started) * 1000:.0f} мс{font_time})"
+            )
+            return pdf_bytes, name
+        logger.warning(f"PDF-рушій '{name}' не впорався, пробую наступний...")
 
-    # Обидва варіанти недоступні → пояснюємо, що встановити
+    if timed_out:
+        raise PdfRenderTimeout("Генерація PDF не вклалася у відведений час.")
+    # Жоден варіант недоступний → пояснюємо, що встановити
     raise Exception(
         "Не вдалося створити PDF.\n\n"
         "**Варіант A (рекомендовано):** Встановіть `wkhtmltopdf` у вашій системі (напр., `sudo apt install wkhtmltopdf`).\n"
         "**Варіант B (запасний):** Встановіть `xhtml2pdf` (`pip install xhtml2pdf`)."
     )
 
+
+# === Кеш готових PDF (за хешем вмісту) ===
+
+class PdfCache:
+    """
+    LRU-кеш готових PDF у пам'яті з обмеженням за сумарним розміром,
+    плюс необов'язковий дисковий рівень (каталог з файлами <ключ>.pdf).
+    Ключ — sha256 від Markdown та CSS, тож однакові відповіді
+    не рендеряться вдруге.
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._entries: OrderedDict = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 or bool(self.disk_dir)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            pdf_bytes = self._entries.get(key)
+            if pdf_bytes is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return pdf_bytes
+
+        pdf_bytes = self._read_disk(key)
+        with self._lock:
+            if pdf_bytes is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._put_memory(key, pdf_bytes)
+        return pdf_bytes
+
+    def put(self, key: str, pdf_bytes: bytes) -> None:
+        self._put_memory(key, pdf_bytes)
+        self._write_disk(key, pdf_bytes)
+
+    def _put_memory(self, key: str, pdf_bytes: bytes) -> None:
+        if len(pdf_bytes) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = pdf_bytes
+            self._size += len(pdf_bytes)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.pdf")
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Не вдалося прочитати PDF з дискового кешу: {e}")
+            return None
+
+    def _write_disk(self, key: str, pdf_bytes: bytes) -> None:
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(pdf_bytes)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Не вдалося записати PDF у дисковий кеш: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
+
+
+_pdf_cache = PdfCache(PDF_CACHE_MAX_BYTES, PDF_CACHE_DIR)
+# Рендери в польоті для синхронного API: ключ кешу → Future з байтами PDF
+_in_flight_sync: dict = {}
+_in_flight_lock = threading.Lock()
+
+def _cache_key(content: str, is_html: bool = False) -> str:
+    """
+    sha256 від вмісту (Markdown або HTML) та CSS. Рушій у ключ не входить: get і put
+    мусять давати той самий ключ, хоч би який рушій зрештою відрендерив документ,
+    а проба рушіїв (до 15 с на wkhtmltopdf --version) не має блокувати event loop.
+    """
+    digest = hashlib.sha256()
+    for part in ("html" if is_html else "markdown", PDF_CSS_STYLE, content):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def get_cache_stats() -> dict:
+    """Лічильники кешу PDF (hits / disk_hits / misses / evictions / entries / bytes)."""
+    return _pdf_cache.stats()
+
+def create_pdf_bytes_from_markdown(content: str, is_html: bool = False) -> bytes:
+    """
+    Генерує PDF з Markdown (або з готового HTML-тіла, якщо is_html=True) повністю в пам'яті.
+    Рендер одразу йде на найкращий рушій, знайдений при пробі (BACKEND_ORDER).
+    Однаковий вміст віддається з кешу без повторного рендеру.
+    Повертає байти PDF. Якщо PDF створити не вийшло — піднімає виняток з інструкцією.
+    """
+    logger.info("Старт генерації PDF (в пам'яті)")
+    key = _cache_key(content, is_html)
+    if _pdf_cache.enabled:
+        cached = _pdf_cache.get(key)
+        if cached is not None:
+            logger.info(f"PDF взято з кешу ({len(cached)} байт)")
+            return cached
+
+    with _in_flight_lock:
+        future = _in_flight_sync.get(key)
+        leader = future is None
+        if leader:
+            future = _in_flight_sync[key] = Future()
+    if not leader:
+        logger.info("Такий самий PDF уже генерується — чекаю на його результат")
+        return future.result()
+
+    try:
+        pdf_bytes, _ = _render_document(content, is_html)
+        if _pdf_cache.enabled:
+            _pdf_cache.put(key, pdf_bytes)
+        future.set_result(pdf_bytes)
+        return pdf_bytes
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _in_flight_lock:
+            del _in_flight_sync[key]
+
+def _write_pdf_file(output_filename: str, pdf_bytes: bytes) -> None:
+    """Атомарний запис: одночасні запити з тим самим ім'ям файлу не перемішують байти."""
+    tmp_path = f"{output_filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as result_file:
+        result_file.write(pdf_bytes)
+    os.replace(tmp_path, output_filename)
+
+def create_pdf_from_markdown(content: str, is_html: bool, output_filename: str) -> str:
+    """
+    (ОНОВЛЕНО v2.9)
+    Генерує *PDF-файл* з Markdown.
+    Повертає шлях до PDF (output_filename). Якщо PDF створити не вийшло — піднімає виняток з інструкцією.
+    Для бота краще використовувати create_pdf_bytes_from_markdown() — без диска.
+    """
+    logger.info(f"Старт генерації PDF (v2.9 Гібрид): {output_filename}")
+    pdf_bytes = create_pdf_bytes_from_markdown(content, is_html)
+    _write_pdf_file(output_filename, pdf_bytes)
+    return output_filename
+
 def clear_temp_file(filepath: str):
     """Видаляє тимчасовий PDF-файл після надсилання."""
     try:
@@ -196,4 +942,351 @@ def clear_temp_file(filepath: str):
         else:
             logger.warning(f"TІMЧАСОВИЙ ФАЙЛ НЕ ЗНАЙДЕНО для видалення: {filepath}")
     except Exception as e:
-        logger.error(f"Помилка під час видалення тимчасового файлу {filepath}: {e}")
\ No newline at end of file
+        logger.error(f"Помилка під час видалення тимчасового файлу {filepath}: {e}")
+
+
+# === Асинхронний API (пул воркерів) ===
+
+class PdfQueueFullError(Exception):
+    """Черга на генерацію PDF переповнена — запит відхилено одразу, без очікування."""
+
+
+def _render_worker_main(conn, memory_limit_mb: int) -> None:
+    """
+    Тіло процесу-воркера (PDF_EXECUTOR=process): ліміт пам'яті на себе, далі цикл
+    «завдання з Pipe → рендер → відповідь». Перед кожною спробою рушія повідомляє
+    батьківський процес, хто рендерить і скільки має часу, — щоб той знав, коли вбивати.
+    """
+    _limit_memory(None, memory_limit_mb)
+    # Проба (шрифти, CSS) — поки воркер чекає на перше завдання, а не під час рендера
+    probe_backends()
+    while True:
+        try:
+            content, is_html, timeout, backends = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            pdf_bytes, backend = _render_document(
+                content, is_html, _RenderControl(timeout), backends,
+                on_attempt=lambda name, budget: conn.send(("attempt", name, budget)),
+            )
+            conn.send(("done", pdf_bytes, backend))
+        except Exception as e:
+            try:
+                conn.send(("error", e))
+            except Exception:
+                # Виняток не серіалізується — передаємо текст
+                conn.send(("error", RuntimeError(str(e))))
+
+
+class _RenderWorker:
+    __slots__ = ("process", "conn")
+
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+
+
+class _RenderWorkerPool:
+    """
+    Процеси-воркери для PDF_EXECUTOR=process. На відміну від ProcessPoolExecutor, кожен воркер
+    можна вбити окремо: потік пулу, що чекає на відповідь, стежить за дедлайном спроби рушія
+    і скасуванням, вбиває завислий воркер, запускає замість нього новий і віддає документ
+    наступним рушіям. Воркер, вбитий ядром (OOM через PDF_WORKER_MEMORY_MB), замінюється так само.
+    """
+
+    def __init__(self, size: int, memory_limit_mb: int):
+        import multiprocessing
+        self._context = multiprocessing.get_context("spawn")
+        self.size = size
+        self.memory_limit_mb = memory_limit_mb
+        self._idle: list = []
+        self._lock = threading.Lock()
+        self.restarts = 0
+        self._closed = False
+        # Воркери стартують заздалегідь: spawn + імпорт + проба рушіїв займають секунди
+        self._idle = [self._spawn() for _ in range(size)]
+
+    def _spawn(self) -> _RenderWorker:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_render_worker_main, args=(child_conn, self.memory_limit_mb), name="pdf-worker", daemon=True
+        )
+        process.start()
+        child_conn.close()
+        return _RenderWorker(process, parent_conn)
+
+    def _acquire(self) -> _RenderWorker:
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.process.is_alive():
+                    return worker
+                self.restarts += 1
+        return self._spawn()
+
+    def _release(self, worker: _RenderWorker) -> None:
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(worker)
+                return
+        self._stop(worker)
+
+    def _discard(self, worker: _RenderWorker, reason: str) -> None:
+        self._stop(worker)
+        logger.warning(f"PDF-воркер (pid {worker.process.pid}) вбито: {reason}")
+        with self._lock:
+            self.restarts += 1
+            if not self._closed and len(self._idle) < self.size:
+                # Заміна прогрівається, поки ми пробуємо наступний рушій
+                self._idle.append(self._spawn())
+
+    @staticmethod
+    def _stop(worker: _RenderWorker) -> None:
+        worker.process.kill()
+        worker.process.join()
+        worker.conn.close()
+
+    def render(self, content: str, is_html: bool, control: _RenderControl) -> tuple:
+        """Рендерить документ у воркері. Повертає (байти PDF, назва рушія), як _render_document."""
+        backends = None
+        while True:
+            control.check()
+            worker = self._acquire()
+            worker.conn.send((content, is_html, control.remaining(), backends))
+            backend, attempt_deadline = None, None
+            while True:
+                try:
+                    ready = worker.conn.poll(_POLL_INTERVAL)
+                    message = worker.conn.recv() if ready else None
+                except (EOFError, OSError):
+                    self._discard(worker, f"процес завершився з кодом {worker.process.exitcode}")
+                    raise RuntimeError(f"PDF-воркер аварійно завершився під час рендера ({backend or 'старт'}).")
+                if message is not None:
+                    kind = message[0]
+                    if kind == "attempt":
+                        backend, attempt_deadline = message[1], time.monotonic() + message[2] + _KILL_GRACE
+                        continue
+                    self._release(worker)
+                    if kind == "done":
+                        return message[1], message[2]
+                    raise message[1]
+
+                if control.cancelled.is_set():
+                    self._discard(worker, "рендер скасовано")
+                    raise PdfRenderCancelled("Генерацію PDF скасовано.")
+                now = time.monotonic()
+                if now >= control.deadline + _KILL_GRACE:
+                    self._discard(worker, f"дедлайн документа {control.timeout:.3g} с")
+                    raise PdfRenderTimeout(f"Генерація PDF не вклалася у {control.timeout:.3g} с.")
+                if attempt_deadline is not None and now >= attempt_deadline:
+                    self._discard(worker, f"рушій '{backend}' не вклався у {PDF_BACKEND_TIMEOUT:.3g} с")
+                    _record_result(backend, False)
+                    break
+            # Завислий рушій пропускаємо: решта — у новому воркері
+            order = backends if backends is not None else BACKEND_ORDER
+            backends = tuple(order[order.index(backend) + 1:])
+            if not backends:
+                raise PdfRenderTimeout("Генерація PDF не вклалася у відведений час.")
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            self._stop(worker)
+
+
+_executor: Optional[Executor] = None
+_worker_pool: Optional[_RenderWorkerPool] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+_pending_renders = 0
+
+
+class _SharedRender:
+    """
+    Рендер у польоті (single-flight): однакові одночасні запити чекають на одну задачу.
+    Рендер скасовується, лише коли від нього відмовилися всі, хто чекав.
+    """
+
+    __slots__ = ("key", "control", "task", "waiters")
+
+    def __init__(self, key: str, control: _RenderControl):
+        self.key = key
+        self.control = control
+        self.task: Optional[asyncio.Future] = None
+        self.waiters = 0
+
+
+# Лише з event loop: ключ кешу → _SharedRender; власник (chat_id) → asyncio.Event його запитів
+_in_flight: dict = {}
+_active_renders: dict = {}
+
+def _get_executor() -> Executor:
+    """
+    Ліниво створює пул воркерів (один на процес). Рендер завжди йде в потоці пулу;
+    з PDF_EXECUTOR=process потік лише керує процесом-воркером (_RenderWorkerPool).
+    """
+    global _executor, _worker_pool
+    if _executor is None:
+        if PDF_EXECUTOR == "process":
+            _worker_pool = _RenderWorkerPool(PDF_WORKERS, PDF_WORKER_MEMORY_MB)
+        _executor = ThreadPoolExecutor(max_workers=PDF_WORKERS, thread_name_prefix="pdf")
+        logger.info(f"Пул PDF-воркерів запущено: {PDF_EXECUTOR} x{PDF_WORKERS}")
+    return _executor
+
+def _render_controlled(content: str, is_html: bool, control: _RenderControl) -> tuple:
+    """Виконується в потоці пулу: дедлайн документа рахується з цього моменту."""
+    control.start()
+    if _worker_pool is not None:
+        return _worker_pool.render(content, is_html, control)
+    return _render_document(content, is_html, control)
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(PDF_MAX_CONCURRENT)
+    return _semaphore
+
+def _mark_retrieved(future: asyncio.Future) -> None:
+    if not future.cancelled():
+        future.exception()
+
+async def _run_in_pool(func, *args, control: Optional[_RenderControl] = None):
+    """
+    Виконує func(*args) у пулі воркерів, тож polling та інші розмови не блокуються.
+    Одночасно працює не більше PDF_MAX_CONCURRENT рендерів; якщо в черзі вже
+    PDF_MAX_QUEUE запитів — піднімається PdfQueueFullError.
+    З control чекаємо до скасування або дедлайну (+_KILL_GRACE): рушій, якого не вдалося
+    зупинити (xhtml2pdf у потоці), доробляє у фоні, а бот одразу отримує
+    PdfRenderCancelled / PdfRenderTimeout. Скасування корутини (asyncio) скасовує і рендер.
+    """
+    global _pending_renders
+    if _pending_renders >= PDF_MAX_CONCURRENT + PDF_MAX_QUEUE:
+        logger.warning(f"Черга PDF переповнена ({_pending_renders}), відхиляю запит.")
+        raise PdfQueueFullError(
+            "Зараз забагато запитів на генерацію PDF. Будь ласка, спробуйте ще раз за хвилину."
+        )
+
+    _pending_renders += 1
+    try:
+        async with _get_semaphore():
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(_get_executor(), func, *args)
+            if control is None:
+                return await future
+            # Якщо ми перестанемо чекати, пізній результат чи виняток потоку не потрапить у лог як «never retrieved»
+            future.add_done_callback(_mark_retrieved)
+            try:
+                while not future.done():
+                    await asyncio.wait((future,), timeout=_POLL_INTERVAL)
+                    if future.done():
+                        break
+                    if control.cancelled.is_set():
+                        raise PdfRenderCancelled("Генерацію PDF скасовано.")
+                    # deadline з'являється, коли потік пулу взявся за документ
+                    if control.deadline is not None and time.monotonic() >= control.deadline + _KILL_GRACE:
+                        control.cancelled.set()
+                        logger.error(f"Рендер PDF не зупинився за {control.timeout:.3g} с; потік доробить його у фоні.")
+                        raise PdfRenderTimeout(f"Генерація PDF не вклалася у {control.timeout:.3g} с.")
+                return future.result()
+            except asyncio.CancelledError:
+                control.cancelled.set()
+                raise
+    finally:
+        _pending_renders -= 1
+
+async def create_pdf_bytes_from_markdown_async(content: str, is_html: bool = False, owner=None) -> bytes:
+    """
+    Async-версія create_pdf_bytes_from_markdown для хендлерів бота.
+    Кеш перевіряється в головному процесі, тож влучання не займає місце в черзі пулу.
+    owner (напр., chat_id) — хто замовив рендер: cancel_renders(owner) його скасує.
+    Однаковий вміст, що вже генерується, не рендериться вдруге: запит чекає на той самий рендер.
+    Піднімає PdfRenderTimeout після PDF_RENDER_TIMEOUT і PdfRenderCancelled після скасування.
+    """
+    key = _cache_key(content, is_html)
+    if _pdf_cache.enabled:
+        cached = _pdf_cache.get(key)
+        if cached is not None:
+            logger.info(f"PDF взято з кешу ({len(cached)} байт)")
+            return cached
+
+    flight = _in_flight.get(key)
+    if flight is None:
+        flight = _in_flight[key] = _SharedRender(key, _RenderControl(PDF_RENDER_TIMEOUT))
+        flight.task = asyncio.ensure_future(_render_shared(key, content, is_html, flight.control))
+        flight.task.add_done_callback(lambda task, flight=flight: _land(flight))
+    else:
+        logger.info("Такий самий PDF уже генерується — чекаю на його результат")
+
+    flight.waiters += 1
+    cancelled = asyncio.Event()
+    if owner is not None:
+        _active_renders.setdefault(owner, set()).add(cancelled)
+    cancel_wait = asyncio.ensure_future(cancelled.wait())
+    try:
+        await asyncio.wait((flight.task, cancel_wait), return_when=asyncio.FIRST_COMPLETED)
+        if flight.task.done():
+            return flight.task.result()
+        raise PdfRenderCancelled("Генерацію PDF скасовано.")
+    finally:
+        cancel_wait.cancel()
+        if owner is not None:
+            events = _active_renders[owner]
+            events.discard(cancelled)
+            if not events:
+                del _active_renders[owner]
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            # Результат більше нікому не потрібен: зупиняємо рендер, новий запит почне з нуля
+            flight.control.cancelled.set()
+            _land(flight)
+
+async def _render_shared(key: str, content: str, is_html: bool, control: _RenderControl) -> bytes:
+    pdf_bytes, _ = await _run_in_pool(_render_controlled, content, is_html, control, control=control)
+    if _pdf_cache.enabled:
+        _pdf_cache.put(key, pdf_bytes)
+    return pdf_bytes
+
+def _land(flight: _SharedRender) -> None:
+    """Рендер завершено або покинуто: наступний такий самий запит стартує новий."""
+    if _in_flight.get(flight.key) is flight:
+        del _in_flight[flight.key]
+    if flight.task.done():
+        _mark_retrieved(flight.task)
+
+def cancel_renders(owner) -> int:
+    """
+    Скасовує незавершені запити власника (бот викликає на /cancel з chat_id).
+    Рендер, на який більше ніхто не чекає, зупиняється (з черги — навіть не почнеться).
+    Повертає кількість скасованих запитів.
+    """
+    events = _active_renders.get(owner, ())
+    for cancelled in events:
+        cancelled.set()
+    if events:
+        logger.info(f"Скасовано PDF-рендерів для {owner}: {len(events)}")
+    return len(events)
+
+async def create_pdf_from_markdown_async(content: str, is_html: bool, output_filename: str, owner=None) -> str:
+    """
+    Async-обгортка над create_pdf_from_markdown (запис у файл).
+    owner — як у create_pdf_bytes_from_markdown_async: cancel_renders(owner) скасовує рендер.
+    """
+    pdf_bytes = await create_pdf_bytes_from_markdown_async(content, is_html, owner=owner)
+    _write_pdf_file(output_filename, pdf_bytes)
+    return output_filename
+
+def shutdown_pdf_workers() -> None:
+    """Зупиняє пул воркерів, процеси-воркери і теплі процеси wkhtmltopdf (викликається при зупинці бота)."""
+    global _executor, _worker_pool
+    _close_wkhtmltopdf_pool()
+    if _executor is not None:
+        for flight in _in_flight.values():
+            flight.control.cancelled.set()
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+        logger.info("Пул PDF-воркерів зупинено.")
+    if _worker_pool is not None:
+        _worker_pool.close()
+        _worker_pool = None
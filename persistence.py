@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Збереження стану розмов між перезапусками бота.
+
+Бот тримає прогрес майстрів у context.user_data, а крок — у ConversationHandler.
+Без persistence кожен деплой/рестарт обриває всіх, хто посеред Чек-ліста.
+
+SqlitePersistence — BasePersistence для python-telegram-bot, що зберігає
+user_data та стани ConversationHandler у SQLite (chat_data/bot_data бот не використовує).
+Запис пакетний:
+  - PTB сам збирає зміни і викликає update_* раз на PERSISTENCE_UPDATE_INTERVAL секунд;
+  - update_* лише серіалізують дані в пам'ять, а запис на диск — одна транзакція
+    не раніше ніж через PERSISTENCE_FLUSH_DELAY секунд після першої зміни (debounce),
+    в окремому потоці, щоб не блокувати event loop.
+
+Вмикається явно (BOT_PERSISTENCE=sqlite): рядки в базі прив'язані до Telegram ID, а
+політика приватності бота (templates.BOT_PRIVACY_POLICY) і /start обіцяють не зберігати
+ні ID, ні відповідей — перед увімкненням цей текст треба оновити. Також потрібна
+файлова система, що доступна на запис і переживає рестарт (не ефемерний диск dyno).
+
+Приватність: після генерації PDF бот обіцяє видалити відповіді. forget_user()
+стирає рядки користувача одразу (не чекаючи наступного інтервалу), SQLite працює
+з secure_delete, а записи, старші за PERSISTENCE_MAX_AGE, видаляються при старті.
+
+Налаштування через env:
+  BOT_PERSISTENCE              — sqlite | none (за замовчуванням none — стан лише в пам'яті)
+  PERSISTENCE_DB_PATH          — файл бази (за замовчуванням bot_state.sqlite3)
+  PERSISTENCE_UPDATE_INTERVAL  — як часто PTB віддає зміни, секунд (за замовчуванням 10)
+  PERSISTENCE_FLUSH_DELAY      — затримка пакетного запису, секунд (за замовчуванням 1)
+  PERSISTENCE_MAX_AGE          — через скільки секунд забувати незавершені розмови
+                                 (за замовчуванням 604800 = 7 днів, 0 — ніколи)
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Set, Tuple
+
+from telegram.ext import Application, BasePersistence, PersistenceInput
+
+logger = logging.getLogger("persistence")
+
+BOT_PERSISTENCE = os.getenv("BOT_PERSISTENCE", "none").lower()
+PERSISTENCE_DB_PATH = os.getenv("PERSISTENCE_DB_PATH", "bot_state.sqlite3")
+PERSISTENCE_UPDATE_INTERVAL = float(os.getenv("PERSISTENCE_UPDATE_INTERVAL", "10"))
+PERSISTENCE_FLUSH_DELAY = max(0.0, float(os.getenv("PERSISTENCE_FLUSH_DELAY", "1")))
+PERSISTENCE_MAX_AGE = max(0.0, float(os.getenv("PERSISTENCE_MAX_AGE", str(7 * 24 * 60 * 60))))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_data (
+    user_id    INTEGER PRIMARY KEY,
+    data       TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS conversations (
+    name       TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    user_id    INTEGER,
+    state      TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (name, key)
+);
+"""
+
+
+class SqlitePersistence(BasePersistence):
+    """user_data + стани ConversationHandler у SQLite з пакетним (debounced) записом."""
+
+    def __init__(self, path: str, update_interval: float = 10, flush_delay: float = 1, max_age: float = 0):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.path = path
+        self.flush_delay = flush_delay
+        self.max_age = max_age
+        self._db_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        # Ще не записане: user_id → JSON (None — видалити); (name, key) → JSON стану (None — видалити)
+        self._pending_users: Dict[int, Optional[str]] = {}
+        self._pending_conversations: Dict[Tuple[str, str], Optional[str]] = {}
+        self._pending_forget: Set[int] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self.writes = 0
+        self.rows_written = 0
+
+    # --- База ---
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # Видалені відповіді не лишаються у вільних сторінках файлу
+            conn.execute("PRAGMA secure_delete=ON")
+            conn.executescript(_SCHEMA)
+            if self.max_age:
+                cutoff = time.time() - self.max_age
+                with conn:
+                    conn.execute("DELETE FROM user_data WHERE updated_at < ?", (cutoff,))
+                    conn.execute("DELETE FROM conversations WHERE updated_at < ?", (cutoff,))
+            self._conn = conn
+            logger.info(f"SQLite persistence: {self.path}")
+        return self._conn
+
+    def _load(self, query: str, params: tuple = ()) -> list:
+        with self._db_lock:
+            return self._connect().execute(query, params).fetchall()
+
+    def _write(self, users: dict, conversations: dict, forget: set) -> None:
+        """Один пакет змін — одна транзакція."""
+        now = time.time()
+        with self._db_lock:
+            conn = self._connect()
+            with conn:
+                for user_id in forget:
+                    conn.execute("DELETE FROM user_data WHERE user_id = ?", (user_id,))
+                    conn.execute("DELETE FROM conversations WHERE user_id = ?", (user_id,))
+                for user_id, data in users.items():
+                    if data is None:
+                        conn.execute("DELETE FROM user_data WHERE user_id = ?", (user_id,))
+                    else:
+                        conn.execute(
+                            "INSERT OR REPLACE INTO user_data (user_id, data, updated_at) VALUES (?, ?, ?)",
+                            (user_id, data, now),
+                        )
+                for (name, key), state in conversations.items():
+                    if state is None:
+                        conn.execute("DELETE FROM conversations WHERE name = ? AND key = ?", (name, key))
+                    else:
+                        user_id = json.loads(key)[-1] if key != "[]" else None
+                        conn.execute(
+                            "INSERT OR REPLACE INTO conversations (name, key, user_id, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+                            (name, key, user_id, state, now),
+                        )
+            self.writes += 1
+            self.rows_written += len(users) + len(conversations) + len(forget)
+
+    # --- Пакетний запис ---
+
+    def _take_pending(self) -> tuple:
+        users, self._pending_users = self._pending_users, {}
+        conversations, self._pending_conversations = self._pending_conversations, {}
+        forget, self._pending_forget = self._pending_forget, set()
+        return users, conversations, forget
+
+    def _schedule_flush(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._delayed_flush())
+
+    async def _delayed_flush(self) -> None:
+        await asyncio.sleep(self.flush_delay)
+        # Поки триває запис, _schedule_flush нового завдання не створює, тож зміни,
+        # що прийшли за цей час (зокрема forget_user), дописує наступний прохід циклу
+        while True:
+            pending = self._take_pending()
+            if not any(pending):
+                return
+            try:
+                await asyncio.to_thread(self._write, *pending)
+            except Exception as e:
+                logger.error(f"Не вдалося записати стан у SQLite: {e}", exc_info=True)
+
+    def forget_user(self, user_id: int) -> None:
+        """Стирає збережені відповіді та кроки користувача з наступним (найближчим) записом."""
+        self._pending_users.pop(user_id, None)
+        self._pending_forget.add(user_id)
+        self._schedule_flush()
+
+    def stats(self) -> dict:
+        return {
+            "writes": self.writes,
+            "rows_written": self.rows_written,
+            "pending": len(self._pending_users) + len(self._pending_conversations) + len(self._pending_forget),
+        }
+
+    # --- BasePersistence: user_data ---
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        rows = await asyncio.to_thread(self._load, "SELECT user_id, data FROM user_data")
+        logger.info(f"Відновлено user_data для {len(rows)} користувачів")
+        return {user_id: json.loads(data) for user_id, data in rows}
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        # Порожній user_data (після clear_user_data) — це видалення рядка, а не запис {}
+        self._pending_users[user_id] = json.dumps(data, ensure_ascii=False) if data else None
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._pending_users[user_id] = None
+        self._schedule_flush()
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    # --- BasePersistence: стани розмов ---
+
+    async def get_conversations(self, name: str) -> dict:
+        rows = await asyncio.to_thread(self._load, "SELECT key, state FROM conversations WHERE name = ?", (name,))
+        return {tuple(json.loads(key)): json.loads(state) for key, state in rows}
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        state = json.dumps(new_state) if new_state is not None else None
+        self._pending_conversations[(name, json.dumps(list(key)))] = state
+        self._schedule_flush()
+
+    # --- BasePersistence: не використовується ботом ---
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    # --- Завершення ---
+
+    async def flush(self) -> None:
+        """Викликається PTB при зупинці: дописує все, що лишилось, і закриває базу."""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        pending = self._take_pending()
+        if any(pending):
+            await asyncio.to_thread(self._write, *pending)
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        logger.info(f"Persistence закрито: {self.stats()}")
+
+
+_BACKENDS = {
+    "sqlite": lambda: SqlitePersistence(
+        PERSISTENCE_DB_PATH,
+        update_interval=PERSISTENCE_UPDATE_INTERVAL,
+        flush_delay=PERSISTENCE_FLUSH_DELAY,
+        max_age=PERSISTENCE_MAX_AGE,
+    ),
+    "none": lambda: None,
+}
+
+def create_persistence() -> Optional[BasePersistence]:
+    """Створює persistence за BOT_PERSISTENCE (None — стан лише в пам'яті)."""
+    factory = _BACKENDS.get(BOT_PERSISTENCE)
+    if factory is None:
+        raise ValueError(f"Невідомий BOT_PERSISTENCE='{BOT_PERSISTENCE}'. Доступні: {', '.join(_BACKENDS)}")
+    return factory()
+
+def forget_user(application: Application, user_id: Optional[int]) -> None:
+    """Одразу стирає збережений стан користувача (якщо persistence це вміє)."""
+    if user_id is not None and isinstance(application.persistence, SqlitePersistence):
+        application.persistence.forget_user(user_id)
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+Обмежена пам'ять сесій: хто зараз посеред майстра і скільки це коштує.
+
+Прогрес майстрів лежить у context.user_data (так його зберігає persistence.py), а крок —
+у ConversationHandler. Користувач, що кинув Чек-ліст на півдорозі, без цього модуля
+лишається в пам'яті назавжди: на довгоживучому dyno це росте без меж.
+
+SessionRegistry пам'ятає для кожного користувача компактний запис Session
+(__slots__: user_id, chat_id, last_seen, compacted) у порядку LRU:
+  - touch() на кожне оновлення (TypeHandler у групі -1, до всіх інших хендлерів);
+  - фоновий sweeper раз на SESSION_SWEEP_INTERVAL секунд завершує сесії, неактивні
+    довше за SESSION_IDLE_TIMEOUT: стирає user_data (і збережену копію) та видаляє
+    «Головне» повідомлення з недопройденим питанням;
+  - сесії, неактивні довше за SESSION_COMPACT_AFTER, стискаються: з user_data зникають
+    похідні ключі (готові поля шаблонів '<розділ>_fields'), лишаються самі відповіді —
+    майстер перерахує поля з відповідей, коли користувач повернеться;
+  - понад SESSION_MAX_LIVE живих сесій найдавніша завершується одразу (LRU).
+stats() — датчик: кількість живих сесій та оцінка байтів їхніх user_data.
+
+Стан розмови завершує сам PTB: майстри мають conversation_timeout = SESSION_IDLE_TIMEOUT
+(потрібен JobQueue, extra python-telegram-bot[job-queue]), а expire() — хендлер стану
+ConversationHandler.TIMEOUT — стирає решту сесії. Розмова, відновлена з persistence,
+таймера не має: її завершить майстер, коли користувач повернеться без відповідей.
+
+Налаштування через env:
+  SESSION_IDLE_TIMEOUT    — через скільки секунд неактивності завершувати сесію
+                            (за замовчуванням 3600; 0 — ніколи)
+  SESSION_SWEEP_INTERVAL  — як часто перевіряти, секунд (за замовчуванням 60)
+  SESSION_COMPACT_AFTER   — через скільки секунд неактивності стискати сесію
+                            (за замовчуванням 300; 0 — ніколи)
+  SESSION_MAX_LIVE        — максимум живих сесій (за замовчуванням 10000)
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import Application, ContextTypes, ConversationHandler
+
+from persistence import forget_user
+from telegram_utils import delete_message_later, main_message_editor
+
+logger = logging.getLogger("session")
+
+SESSION_IDLE_TIMEOUT = max(0.0, float(os.getenv("SESSION_IDLE_TIMEOUT", "3600")))
+SESSION_SWEEP_INTERVAL = max(1.0, float(os.getenv("SESSION_SWEEP_INTERVAL", "60")))
+SESSION_COMPACT_AFTER = max(0.0, float(os.getenv("SESSION_COMPACT_AFTER", "300")))
+SESSION_MAX_LIVE = max(1, int(os.getenv("SESSION_MAX_LIVE", "10000")))
+
+
+class Session:
+    """Запис про одного користувача: чотири слоти, без __dict__."""
+
+    __slots__ = ("user_id", "chat_id", "last_seen", "compacted")
+
+    def __init__(self, user_id: int, chat_id: int, last_seen: float):
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.last_seen = last_seen
+        self.compacted = False
+
+
+def estimate_size(value) -> int:
+    """Оцінка пам'яті user_data: розмір dict/list/рядків разом із вкладеними."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+
+class SessionRegistry:
+    """
+    Живі сесії в порядку LRU (OrderedDict: найдавніша активність — першою).
+    Завершення сесії — те саме, що покинутий майстер після /cancel, але без повідомлень користувачу.
+    """
+
+    def __init__(self, idle_timeout: float, sweep_interval: float, max_live: int, compact_after: float = 0):
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self.max_live = max_live
+        self.compact_after = compact_after
+        self._sessions: "OrderedDict[int, Session]" = OrderedDict()
+        self._application: Optional[Application] = None
+        self._derived_keys: Tuple[str, ...] = ()
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {"started": 0, "expired": 0, "evicted": 0, "finished": 0, "compacted": 0}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def start(self, application: Application, derived_keys: Iterable[str] = ()) -> None:
+        """
+        Підхоплює сесії, відновлені з persistence, і запускає sweeper.
+        derived_keys — ключі user_data, які майстри вміють відновити з відповідей (їх прибирає стискання).
+        """
+        self._application = application
+        self._derived_keys = tuple(derived_keys)
+        now = time.monotonic()
+        for user_id, data in application.user_data.items():
+            if data:
+                # Бот працює в приватних чатах: chat_id == user_id
+                self._add(user_id, user_id, now)
+        if self.idle_timeout or self.compact_after:
+            self._task = asyncio.get_running_loop().create_task(self._sweeper(), name="session-sweeper")
+        logger.info(
+            f"Сесії: відновлено {len(self._sessions)}, тайм-аут {self.idle_timeout:g} с, максимум {self.max_live}"
+        )
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info(f"Sweeper сесій зупинено: {self.stats()}")
+
+    def _add(self, user_id: int, chat_id: int, now: float) -> Session:
+        session = self._sessions.get(user_id)
+        if session is None:
+            session = self._sessions[user_id] = Session(user_id, chat_id, now)
+            self.counters["started"] += 1
+        else:
+            session.chat_id = chat_id
+            session.last_seen = now
+            session.compacted = False
+            self._sessions.move_to_end(user_id)
+        return session
+
+    async def touch(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """TypeHandler(Update) у групі -1: позначає активність і тримає ліміт живих сесій."""
+        user, chat = update.effective_user, update.effective_chat
+        if user is None or chat is None:
+            return
+        self._add(user.id, chat.id, time.monotonic())
+        while len(self._sessions) > self.max_live:
+            _, oldest = self._sessions.popitem(last=False)
+            if await self._end(oldest):
+                self.counters["evicted"] += 1
+                logger.info(f"Сесію user {oldest.user_id} завершено: перевищено ліміт {self.max_live} сесій.")
+
+    async def expire(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        """
+        Хендлер стану ConversationHandler.TIMEOUT: розмову PTB завершує сам, тут стирається
+        решта сесії — її відповіді більше не знадобляться, а кнопки питання вже не працюють.
+        """
+        user = update.effective_user
+        session = self._sessions.pop(user.id, None) if user is not None else None
+        if session is not None and await self._end(session):
+            self.counters["expired"] += 1
+            logger.info(f"Сесію user {session.user_id} завершено: майстер неактивний {self.idle_timeout:g} с.")
+        return ConversationHandler.END
+
+    async def sweep(self, now: Optional[float] = None) -> int:
+        """
+        Завершує сесії, неактивні довше за idle_timeout, і стискає неактивні довше за compact_after.
+        Повертає, скільки завершених сесій мали незавершений стан.
+        """
+        now = time.monotonic() if now is None else now
+        expired = 0
+        while self.idle_timeout and self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_seen < self.idle_timeout:
+                break
+            del self._sessions[session.user_id]
+            if await self._end(session):
+                expired += 1
+        self.counters["expired"] += expired
+        if expired:
+            logger.info(f"Завершено {expired} неактивних сесій. {self.stats()}")
+        if self.compact_after:
+            self._compact(now)
+        return expired
+
+    def _compact(self, now: float) -> None:
+        """Прибирає похідні ключі з user_data сесій, неактивних довше за compact_after (від найдавнішої)."""
+        user_data = self._application.user_data
+        for session in self._sessions.values():
+            if now - session.last_seen < self.compact_after:
+                break
+            if session.compacted:
+                continue
+            session.compacted = True
+            data = user_data.get(session.user_id) or {}
+            removed = [key for key in self._derived_keys if data.pop(key, None) is not None]
+            if removed:
+                self.counters["compacted"] += 1
+
+    async def _sweeper(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Помилка sweeper-а сесій: {e}", exc_info=True)
+
+    async def _end(self, session: Session) -> bool:
+        """
+        Стирає стан сесії. False — стирати було нічого (майстер уже завершено чи скасовано).
+        Розмову, що лишилась у ConversationHandler, завершить її conversation_timeout,
+        а без таймера — сам майстер: без відповідей у user_data він повертає END.
+        """
+        application = self._application
+        data = application.user_data.get(session.user_id)
+        if not data:
+            self.counters["finished"] += 1
+            return False
+
+        message_id = data.get('main_message_id')
+        application.drop_user_data(session.user_id)
+        forget_user(application, session.user_id)
+        main_message_editor.forget(session.chat_id)
+        if message_id:
+            try:
+                # Недопройдене питання з кнопками не лишається висіти в чаті
+                await delete_message_later(application.bot, session.chat_id, message_id)
+            except TelegramError as e:
+                logger.warning(f"Не вдалося видалити «Головне» повідомлення user {session.user_id}: {e}")
+        return True
+
+    def stats(self) -> dict:
+        """Датчик: живі сесії, оцінка пам'яті їхніх user_data і лічильники завершень."""
+        user_data = self._application.user_data if self._application is not None else {}
+        size = sum(estimate_size(user_data.get(user_id) or {}) for user_id in self._sessions)
+        # Запис Session + вузол OrderedDict (≈100 байтів на ключ)
+        size += len(self._sessions) * (sys.getsizeof(Session(0, 0, 0.0)) + 100)
+        return dict(self.counters, live=len(self._sessions), estimated_bytes=size)
+
+
+sessions = SessionRegistry(SESSION_IDLE_TIMEOUT, SESSION_SWEEP_INTERVAL, SESSION_MAX_LIVE, SESSION_COMPACT_AFTER)
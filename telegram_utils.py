@@ -0,0 +1,842 @@
+# -*- coding: utf-8 -*-
+"""
+Допоміжні інструменти для роботи з Telegram Bot API.
+
+FileIdCache — пам'ятає file_id вже надісланих документів (за хешем вмісту),
+щоб повторно надсилати однаковий PDF без завантаження байтів.
+Налаштування через env:
+  FILE_ID_CACHE_TTL   — скільки секунд вважати file_id дійсним (за замовчуванням 86400)
+  FILE_ID_CACHE_SIZE  — максимум записів (за замовчуванням 1000)
+
+PerChatUpdateProcessor — паралельна обробка оновлень: різні чати обробляються одночасно,
+оновлення одного чату — строго по черзі (стан майстра в user_data не має гонок).
+Оновлення, що чекає зайнятого чату, одразу передається в on_busy (бот так скасовує PDF на /cancel).
+  BOT_CONCURRENT_UPDATES   — скільки хендлерів може виконуватись одночасно (за замовчуванням 16, 1 — як раніше)
+  BOT_MAX_PENDING_UPDATES  — скільки оновлень може чекати своєї черги (за замовчуванням 1024)
+
+PriorityRateLimiter — планувальник вихідних запитів до Bot API (rate_limiter PTB):
+глобальний token bucket + окремий bucket на кожен чат (лише для надсилання, send*),
+дві черги пріоритетів (відповіді користувачу раніше за прибирання — deleteMessage),
+автоматичний повтор після RetryAfter.
+  RATE_LIMIT_GLOBAL_PER_SEC  — запитів/с на весь бот (за замовчуванням 30; 0 — вимкнути планувальник)
+  RATE_LIMIT_GLOBAL_BURST    — скільки запитів можна «одним махом» (за замовчуванням 30)
+  RATE_LIMIT_CHAT_PER_SEC    — нових повідомлень/с в один чат (за замовчуванням 1)
+  RATE_LIMIT_CHAT_BURST      — сплеск нових повідомлень в один чат (за замовчуванням 5)
+  RATE_LIMIT_LOW_RESERVE     — скільки глобальних токенів не віддавати низькому пріоритету (за замовчуванням 5)
+  RATE_LIMIT_MAX_RETRIES     — повтори після RetryAfter (за замовчуванням 3)
+
+MessageCleanupQueue — фонове прибирання повідомлень (відповіді користувача, старі «Головні»,
+«Генерую...»): хендлер лише ставить id у чергу і одразу показує наступне питання,
+а видалення йдуть пачками (deleteMessages, до 100 id на чат) з повторами.
+  MESSAGE_CLEANUP_QUEUE      — 1 | 0 (0 — видаляти одразу, як раніше; за замовчуванням 1)
+  MESSAGE_CLEANUP_DELAY      — скільки секунд збирати пачку (за замовчуванням 0.5)
+  MESSAGE_CLEANUP_RETRIES    — повтори при мережевих збоях (за замовчуванням 3)
+
+MainMessageEditor — редагування «Головного» повідомлення без зайвих запитів: пам'ятає хеш
+тексту/клавіатури, що зараз показані в кожному чаті, і не надсилає ідентичні edit-и;
+поки один edit у дорозі, наступні зливаються — відправляється лише останній.
+  MAIN_MESSAGE_COALESCE      — 1 | 0 (1 — edit-и у фоні зі злиттям; 0 — чекати кожен edit; за замовчуванням 1)
+  MAIN_MESSAGE_TRACK_CHATS   — скільки чатів пам'ятати (за замовчуванням 10000)
+
+RoutingRequest — HTTP-клієнт Bot API з двома пулами з'єднань: великі завантаження (sendDocument)
+ідуть окремим пулом з довшими таймаутами і не займають з'єднання, потрібні edit-ам і callback-ам;
+основний пул тримає keep-alive з'єднання довше (без нового TCP/TLS рукостискання на кожен крок).
+  BOT_HTTP_CLIENT            — routed | default (default — стандартний HTTPXRequest PTB; за замовчуванням routed)
+  BOT_HTTP_VERSION           — 1.1 | 2 (HTTP/2 потребує пакета h2: pip install "httpx[http2]"; за замовчуванням 1.1)
+  BOT_HTTP_POOL_SIZE         — з'єднань основного пулу (за замовчуванням 64)
+  BOT_HTTP_KEEPALIVE_EXPIRY  — скільки секунд тримати вільне з'єднання (за замовчуванням 60)
+  BOT_HTTP_CONNECT_TIMEOUT   — таймаут з'єднання, секунд (за замовчуванням 5)
+  BOT_HTTP_READ_TIMEOUT      — таймаут відповіді для звичайних викликів (за замовчуванням 5)
+  BOT_HTTP_WRITE_TIMEOUT     — таймаут відправки для звичайних викликів (за замовчуванням 5)
+  BOT_HTTP_POOL_TIMEOUT      — скільки чекати вільне з'єднання (за замовчуванням 3)
+  BOT_HTTP_UPLOAD_POOL_SIZE  — з'єднань для завантажень (за замовчуванням 8)
+  BOT_HTTP_UPLOAD_READ_TIMEOUT   — таймаут відповіді на завантаження (за замовчуванням 30)
+  BOT_HTTP_UPLOAD_WRITE_TIMEOUT  — таймаут відправки файлу (за замовчуванням 60)
+
+Режим запуску (run_application):
+  BOT_RUN_MODE             — polling | webhook (за замовчуванням polling)
+  WEBHOOK_URL              — публічна адреса бота, напр. https://my-bot.herokuapp.com (обов'язково для webhook)
+  WEBHOOK_PATH             — шлях вебхука (за замовчуванням "telegram")
+  WEBHOOK_LISTEN           — інтерфейс локального HTTP-сервера (за замовчуванням 0.0.0.0)
+  WEBHOOK_PORT             — порт (за замовчуванням PORT від Heroku або 8443)
+  WEBHOOK_SECRET_TOKEN     — секрет у заголовку X-Telegram-Bot-Api-Secret-Token
+                             (якщо не задано — генерується при кожному старті)
+  WEBHOOK_MAX_CONNECTIONS  — скільки одночасних з'єднань Telegram відкриває до бота (1-100, за замовчуванням 40)
+  TELEGRAM_API_BASE_URL    — інший Bot API сервер, напр. локальний fake_bot_api.py
+                             (http://127.0.0.1:8081/bot)
+"""
+
+import hashlib
+import importlib.util
+import logging
+import asyncio
+import json
+import os
+import secrets
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+import httpx
+
+from telegram import Bot, InlineKeyboardMarkup, Message, Update
+from telegram.error import BadRequest, RetryAfter, TelegramError
+from telegram.ext import Application, ApplicationBuilder, BaseRateLimiter, BaseUpdateProcessor
+from telegram.request import BaseRequest, HTTPXRequest, RequestData
+
+logger = logging.getLogger("telegram_utils")
+
+FILE_ID_CACHE_TTL = float(os.getenv("FILE_ID_CACHE_TTL", str(24 * 60 * 60)))
+FILE_ID_CACHE_SIZE = max(0, int(os.getenv("FILE_ID_CACHE_SIZE", "1000")))
+
+BOT_CONCURRENT_UPDATES = max(1, int(os.getenv("BOT_CONCURRENT_UPDATES", "16")))
+BOT_MAX_PENDING_UPDATES = max(1, int(os.getenv("BOT_MAX_PENDING_UPDATES", "1024")))
+
+RATE_LIMIT_GLOBAL_PER_SEC = max(0.0, float(os.getenv("RATE_LIMIT_GLOBAL_PER_SEC", "30")))
+RATE_LIMIT_GLOBAL_BURST = max(1, int(os.getenv("RATE_LIMIT_GLOBAL_BURST", "30")))
+RATE_LIMIT_CHAT_PER_SEC = max(0.01, float(os.getenv("RATE_LIMIT_CHAT_PER_SEC", "1")))
+RATE_LIMIT_CHAT_BURST = max(1, int(os.getenv("RATE_LIMIT_CHAT_BURST", "5")))
+RATE_LIMIT_LOW_RESERVE = max(0, int(os.getenv("RATE_LIMIT_LOW_RESERVE", "5")))
+RATE_LIMIT_MAX_RETRIES = max(0, int(os.getenv("RATE_LIMIT_MAX_RETRIES", "3")))
+
+MESSAGE_CLEANUP_QUEUE = os.getenv("MESSAGE_CLEANUP_QUEUE", "1") != "0"
+MESSAGE_CLEANUP_DELAY = max(0.0, float(os.getenv("MESSAGE_CLEANUP_DELAY", "0.5")))
+MESSAGE_CLEANUP_RETRIES = max(0, int(os.getenv("MESSAGE_CLEANUP_RETRIES", "3")))
+
+MAIN_MESSAGE_COALESCE = os.getenv("MAIN_MESSAGE_COALESCE", "1") != "0"
+MAIN_MESSAGE_TRACK_CHATS = max(1, int(os.getenv("MAIN_MESSAGE_TRACK_CHATS", "10000")))
+
+BOT_HTTP_CLIENT = os.getenv("BOT_HTTP_CLIENT", "routed").lower()
+BOT_HTTP_VERSION = os.getenv("BOT_HTTP_VERSION", "1.1")
+BOT_HTTP_POOL_SIZE = max(1, int(os.getenv("BOT_HTTP_POOL_SIZE", "64")))
+BOT_HTTP_KEEPALIVE_EXPIRY = max(0.0, float(os.getenv("BOT_HTTP_KEEPALIVE_EXPIRY", "60")))
+BOT_HTTP_CONNECT_TIMEOUT = float(os.getenv("BOT_HTTP_CONNECT_TIMEOUT", "5"))
+BOT_HTTP_READ_TIMEOUT = float(os.getenv("BOT_HTTP_READ_TIMEOUT", "5"))
+BOT_HTTP_WRITE_TIMEOUT = float(os.getenv("BOT_HTTP_WRITE_TIMEOUT", "5"))
+BOT_HTTP_POOL_TIMEOUT = float(os.getenv("BOT_HTTP_POOL_TIMEOUT", "3"))
+BOT_HTTP_UPLOAD_POOL_SIZE = max(1, int(os.getenv("BOT_HTTP_UPLOAD_POOL_SIZE", "8")))
+BOT_HTTP_UPLOAD_READ_TIMEOUT = float(os.getenv("BOT_HTTP_UPLOAD_READ_TIMEOUT", "30"))
+BOT_HTTP_UPLOAD_WRITE_TIMEOUT = float(os.getenv("BOT_HTTP_UPLOAD_WRITE_TIMEOUT", "60"))
+
+BOT_RUN_MODE = os.getenv("BOT_RUN_MODE", "polling").lower()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram").strip("/")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT") or os.getenv("PORT") or "8443")
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN") or secrets.token_urlsafe(32)
+WEBHOOK_MAX_CONNECTIONS = min(100, max(1, int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))))
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL") or None
+
+
+class FileIdCache:
+    """Обмежений LRU-словник «хеш документа → file_id» з TTL для кожного запису."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(content: bytes, filename: str) -> str:
+        return hashlib.sha256(content).hexdigest() + ":" + filename
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        file_id, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return file_id
+
+    def put(self, key: str, file_id: str) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (file_id, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+file_id_cache = FileIdCache(FILE_ID_CACHE_SIZE, FILE_ID_CACHE_TTL)
+
+async def send_document_cached(bot: Bot, chat_id: int, content: bytes, filename: str) -> Message:
+    """
+    Надсилає документ. Якщо такий самий вміст уже надсилався — повторно
+    використовує його file_id замість завантаження байтів.
+    """
+    key = FileIdCache.make_key(content, filename)
+    file_id = file_id_cache.get(key)
+    if file_id:
+        try:
+            return await bot.send_document(chat_id=chat_id, document=file_id)
+        except BadRequest as e:
+            logger.warning(f"file_id для {filename} більше не дійсний ({e}), завантажую заново.")
+            file_id_cache.discard(key)
+
+    message = await bot.send_document(chat_id=chat_id, document=content, filename=filename)
+    if message.document:
+        file_id_cache.put(key, message.document.file_id)
+    return message
+
+
+# === Паралельна обробка оновлень зі строгим порядком у межах чату ===
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    Оновлення різних чатів виконуються паралельно (не більше max_running хендлерів одночасно),
+    оновлення одного чату — строго в порядку надходження.
+
+    Семафор PTB (max_concurrent_updates) тут обмежує лише кількість оновлень «в дорозі» (max_pending),
+    а max_running захоплюється вже ПІСЛЯ блокування чату: оновлення, що чекає свого чату,
+    не займає слот, і один «балакучий» користувач не гальмує інших.
+
+    on_busy(update) викликається одразу, якщо чат зайнятий попереднім оновленням: так /cancel
+    може перервати довгу роботу (рендер PDF), не чекаючи в черзі за нею.
+    """
+
+    def __init__(self, max_running: int, max_pending: int, on_busy: Optional[Callable[[object], None]] = None):
+        super().__init__(max_concurrent_updates=max(max_running, max_pending))
+        self.max_running = max_running
+        self.on_busy = on_busy
+        self._running = asyncio.Semaphore(max_running)
+        self._chat_locks: dict = {}  # chat_id → [asyncio.Lock, скільки оновлень чату в черзі]
+        self.running = 0
+        self.processed = 0
+        self.waited_for_chat = 0
+
+    async def _run(self, coroutine: Awaitable) -> None:
+        async with self._running:
+            self.running += 1
+            try:
+                await coroutine
+            finally:
+                self.running -= 1
+                self.processed += 1
+
+    @staticmethod
+    def _chat_key(update: object) -> Optional[int]:
+        if isinstance(update, Update):
+            if update.effective_chat:
+                return update.effective_chat.id
+            if update.effective_user:
+                return update.effective_user.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable) -> None:
+        key = self._chat_key(update)
+        if key is None:
+            await self._run(coroutine)
+            return
+
+        entry = self._chat_locks.get(key)
+        if entry is None:
+            entry = self._chat_locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        if entry[0].locked():
+            self.waited_for_chat += 1
+            if self.on_busy is not None:
+                try:
+                    self.on_busy(update)
+                except Exception as e:
+                    logger.error(f"Помилка on_busy для чату {key}: {e}", exc_info=True)
+        try:
+            async with entry[0]:
+                await self._run(coroutine)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chat_locks[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "processed": self.processed,
+            "waited_for_chat": self.waited_for_chat,
+            "active_chats": len(self._chat_locks),
+            "running": self.running,
+        }
+
+
+# === Планувальник вихідних запитів (ліміти Telegram) ===
+
+class _TokenBucket:
+    """rate токенів/с, не більше capacity."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float, reserve: float = 0) -> float:
+        """Скільки секунд чекати, доки буде 1 токен понад reserve (0 — можна зараз)."""
+        self._refill(now)
+        missing = 1 + reserve - self.tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+PRIORITY_HIGH = "high"
+PRIORITY_LOW = "low"
+
+# Прибирання (видалення старих повідомлень) може зачекати — його обганяють відповіді користувачу
+LOW_PRIORITY_ENDPOINTS = frozenset({"deleteMessage", "deleteMessages"})
+# Службові виклики та відповіді на натискання кнопок лімітам на повідомлення не підлягають
+UNLIMITED_ENDPOINTS = frozenset({
+    "getMe", "getUpdates", "setWebhook", "deleteWebhook", "getWebhookInfo", "getFile", "answerCallbackQuery",
+})
+# Ліміт ~1/с на чат стосується нових повідомлень: редагування та видалення рахує лише глобальний bucket
+CHAT_LIMITED_PREFIX = "send"
+
+
+class PriorityRateLimiter(BaseRateLimiter):
+    """
+    Тримає бота в межах лімітів Telegram (~30 запитів/с загалом, ~1 нове повідомлення/с у чат
+    зі сплесками: bucket чату рахує лише send*, а не edit-и та видалення).
+    Високий пріоритет (відповіді, редагування) обслуговується першим; низький (deleteMessage)
+    не бере останні RATE_LIMIT_LOW_RESERVE глобальних токенів і не бере глобальний токен,
+    поки високі чекають на нього (подія _high_idle, без опитування).
+    Пріоритет можна задати явно: bot.send_message(..., rate_limit_args={"priority": "low"}).
+    Після RetryAfter запит повторюється (до max_retries разів), а весь планувальник стоїть паузу.
+    """
+
+    CHAT_BUCKETS_PRUNE_AT = 1000
+
+    def __init__(self, global_rate: float, global_burst: int, chat_rate: float, chat_burst: int,
+                 low_reserve: int = 5, max_retries: int = 3):
+        self._global = _TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.low_reserve = min(low_reserve, max(0, global_burst - 1))
+        self.max_retries = max_retries
+        self._chats: dict = {}
+        self._paused_until = 0.0
+        # Високі запити, що чекають глобальний токен; поки їх є, _high_idle скинута
+        self._high_waiting = 0
+        self._high_idle = asyncio.Event()
+        self._high_idle.set()
+        self._lane_locks = {True: asyncio.Lock(), False: asyncio.Lock()}
+        self.counters = {
+            "requests": 0, "unlimited": 0, "throttled_high": 0, "throttled_low": 0,
+            "wait_seconds": 0.0, "retry_after": 0, "retries": 0, "gave_up": 0,
+        }
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _chat_bucket(self, chat_id) -> tuple:
+        """(bucket чату, {True: lock високої черги, False: lock низької})."""
+        entry = self._chats.get(chat_id)
+        if entry is None:
+            if len(self._chats) >= self.CHAT_BUCKETS_PRUNE_AT:
+                now = time.monotonic()
+                self._chats = {
+                    key: (bucket, locks) for key, (bucket, locks) in self._chats.items()
+                    if not bucket.is_full(now) or any(lock.locked() for lock in locks.values())
+                }
+            entry = self._chats[chat_id] = (
+                _TokenBucket(self.chat_rate, self.chat_burst),
+                {True: asyncio.Lock(), False: asyncio.Lock()},
+            )
+        return entry
+
+    async def _wait(self, bucket: _TokenBucket, high: bool, reserve: float = 0, yield_to_high: bool = False) -> None:
+        """
+        Чекає токен у bucket (та кінця паузи після RetryAfter) і забирає його.
+        yield_to_high — спершу дочекатися, поки жоден високий запит не чекає глобальний токен.
+        """
+        waited = False
+        while True:
+            if yield_to_high and not self._high_idle.is_set():
+                if not waited:
+                    waited = True
+                    self.counters["throttled_low"] += 1
+                started = time.monotonic()
+                await self._high_idle.wait()
+                self.counters["wait_seconds"] += time.monotonic() - started
+                continue
+            now = time.monotonic()
+            delay = max(self._paused_until - now, bucket.delay(now, reserve))
+            if delay <= 0:
+                bucket.take()
+                return
+            if not waited:
+                waited = True
+                self.counters["throttled_high" if high else "throttled_low"] += 1
+            self.counters["wait_seconds"] += delay
+            await asyncio.sleep(delay)
+
+    async def _acquire(self, chat_id, priority: str, chat_limited: bool = True) -> None:
+        """
+        Спершу токен чату (якщо запит його витрачає), потім глобальний. asyncio.Lock віддає чергу
+        в порядку надходження, тож запити одного чату (і однієї черги пріоритету) не обганяють один одного.
+        """
+        high = priority != PRIORITY_LOW
+        if chat_limited and chat_id is not None:
+            bucket, locks = self._chat_bucket(chat_id)
+            async with locks[high]:
+                await self._wait(bucket, high)
+        if not high:
+            async with self._lane_locks[False]:
+                await self._wait(self._global, False, self.low_reserve, yield_to_high=True)
+            return
+        self._high_waiting += 1
+        self._high_idle.clear()
+        try:
+            async with self._lane_locks[True]:
+                await self._wait(self._global, True)
+        finally:
+            self._high_waiting -= 1
+            if not self._high_waiting:
+                self._high_idle.set()
+
+    async def process_request(
+        self,
+        callback: Callable[..., Awaitable],
+        args: Any,
+        kwargs: dict,
+        endpoint: str,
+        data: dict,
+        rate_limit_args: Optional[dict],
+    ):
+        if endpoint in UNLIMITED_ENDPOINTS:
+            self.counters["unlimited"] += 1
+            return await callback(*args, **kwargs)
+
+        priority = (rate_limit_args or {}).get("priority")
+        if priority is None:
+            priority = PRIORITY_LOW if endpoint in LOW_PRIORITY_ENDPOINTS else PRIORITY_HIGH
+        chat_id = data.get("chat_id")
+        chat_limited = endpoint.startswith(CHAT_LIMITED_PREFIX)
+        self.counters["requests"] += 1
+
+        attempt = 0
+        while True:
+            await self._acquire(chat_id, priority, chat_limited)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                self.counters["retry_after"] += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + float(retry_after) + 0.1)
+                if attempt >= self.max_retries:
+                    self.counters["gave_up"] += 1
+                    raise
+                attempt += 1
+                self.counters["retries"] += 1
+                logger.warning(f"{endpoint}: RetryAfter {retry_after} с, повтор {attempt}/{self.max_retries}")
+
+    def stats(self) -> dict:
+        return dict(self.counters, chats=len(self._chats))
+
+
+def create_rate_limiter() -> Optional[PriorityRateLimiter]:
+    """Планувальник за налаштуваннями env (None, якщо RATE_LIMIT_GLOBAL_PER_SEC=0)."""
+    if not RATE_LIMIT_GLOBAL_PER_SEC:
+        return None
+    return PriorityRateLimiter(
+        RATE_LIMIT_GLOBAL_PER_SEC, RATE_LIMIT_GLOBAL_BURST, RATE_LIMIT_CHAT_PER_SEC, RATE_LIMIT_CHAT_BURST,
+        low_reserve=RATE_LIMIT_LOW_RESERVE, max_retries=RATE_LIMIT_MAX_RETRIES,
+    )
+
+
+# === Фонове прибирання повідомлень ===
+
+class MessageCleanupQueue:
+    """
+    Черга видалень поза критичним шляхом відповіді користувачу.
+    schedule() нічого не чекає; фоновий воркер раз на batch_delay забирає все накопичене
+    і видаляє по чатах: одне повідомлення — deleteMessage, кілька — deleteMessages.
+    BadRequest (повідомлення вже немає / старше 48 год) не повторюється, мережеві збої — до max_retries разів.
+    """
+
+    MAX_BATCH = 100  # ліміт deleteMessages
+
+    def __init__(self, batch_delay: float, max_retries: int):
+        self.batch_delay = batch_delay
+        self.max_retries = max_retries
+        self._bot: Optional[Bot] = None
+        self._pending: dict = {}  # chat_id → {message_id: спроба}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.counters = {"scheduled": 0, "deleted": 0, "api_calls": 0, "failed": 0, "retries": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, bot: Bot) -> None:
+        self._bot = bot
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._worker(), name="message-cleanup")
+        logger.info(f"Черга прибирання повідомлень запущена (пачка раз на {self.batch_delay} с)")
+
+    async def stop(self) -> None:
+        """Дочищає все, що лишилось у черзі, і зупиняє воркер."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        logger.info(f"Черга прибирання зупинена: {self.counters}")
+
+    def schedule(self, chat_id: int, message_id: int) -> None:
+        self._pending.setdefault(chat_id, {}).setdefault(message_id, 0)
+        self.counters["scheduled"] += 1
+        self._wakeup.set()
+
+    async def _worker(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            if not self._stopping:
+                await asyncio.sleep(self.batch_delay)
+            self._wakeup.clear()
+            try:
+                await self._flush()
+            except Exception as e:
+                logger.error(f"Помилка черги прибирання: {e}", exc_info=True)
+            if self._stopping and not self._pending:
+                return
+
+    async def _flush(self) -> None:
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        await asyncio.gather(*(self._delete_chat(chat_id, attempts) for chat_id, attempts in pending.items()))
+        if self._pending and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _delete_chat(self, chat_id: int, attempts: dict) -> None:
+        message_ids = sorted(attempts)
+        for start in range(0, len(message_ids), self.MAX_BATCH):
+            chunk = message_ids[start:start + self.MAX_BATCH]
+            self.counters["api_calls"] += 1
+            try:
+                if len(chunk) == 1:
+                    await self._bot.delete_message(chat_id=chat_id, message_id=chunk[0])
+                else:
+                    await self._bot.delete_messages(chat_id=chat_id, message_ids=chunk)
+                self.counters["deleted"] += len(chunk)
+            except BadRequest as e:
+                self.counters["failed"] += len(chunk)
+                logger.warning(f"Не вдалося видалити повідомлення {chunk} у чаті {chat_id}: {e}")
+            except TelegramError as e:
+                for message_id in chunk:
+                    if attempts[message_id] >= self.max_retries:
+                        self.counters["failed"] += 1
+                        continue
+                    self.counters["retries"] += 1
+                    self._pending.setdefault(chat_id, {})[message_id] = attempts[message_id] + 1
+                logger.warning(f"Збій видалення {chunk} у чаті {chat_id}, повторю: {e}")
+
+    def stats(self) -> dict:
+        return dict(self.counters, pending=sum(len(ids) for ids in self._pending.values()))
+
+
+message_cleanup = MessageCleanupQueue(MESSAGE_CLEANUP_DELAY, MESSAGE_CLEANUP_RETRIES)
+
+async def delete_message_later(bot: Bot, chat_id: int, message_id: int) -> None:
+    """
+    Видаляє повідомлення у фоні (через message_cleanup), не затримуючи відповідь користувачу.
+    Якщо черга не запущена (MESSAGE_CLEANUP_QUEUE=0) — видаляє одразу, як раніше.
+    """
+    if message_cleanup.running:
+        message_cleanup.schedule(chat_id, message_id)
+        return
+    await bot.delete_message(chat_id=chat_id, message_id=message_id)
+
+
+# === Редагування «Головного» повідомлення без no-op запитів ===
+
+class MainMessageEditor:
+    """
+    Для кожного чату пам'ятає (message_id, хеш тексту+клавіатури), що зараз показано.
+    Ідентичний edit не надсилається зовсім (замість запиту + BadRequest "Message is not modified").
+    З coalesce=True edit відправляється у фоні: поки попередній у дорозі, новіші замінюють
+    один одного, і до Telegram іде лише останній. on_failed викликається, якщо повідомлення
+    редагувати вже не можна (видалене тощо) — бот тоді надсилає нове.
+    """
+
+    def __init__(self, max_chats: int, coalesce: bool):
+        self.max_chats = max_chats
+        self.coalesce = coalesce
+        self._shown: OrderedDict = OrderedDict()  # chat_id → (message_id, digest)
+        self._inflight: dict = {}  # chat_id → asyncio.Task
+        self._pending: dict = {}  # chat_id → наступний edit
+        self.counters = {"sent": 0, "suppressed": 0, "coalesced": 0, "not_modified": 0, "failed": 0}
+
+    @staticmethod
+    def digest(text: str, reply_markup: Optional[InlineKeyboardMarkup] = None, parse_mode: Optional[str] = None) -> str:
+        markup = json.dumps(reply_markup.to_dict(), sort_keys=True) if reply_markup is not None else ""
+        return hashlib.blake2b(f"{parse_mode}\0{markup}\0{text}".encode("utf-8"), digest_size=16).hexdigest()
+
+    def remember(self, chat_id: int, message_id: int, digest: str) -> None:
+        """Записує, що в повідомленні message_id тепер показано digest (напр., після send_message)."""
+        self._shown[chat_id] = (message_id, digest)
+        self._shown.move_to_end(chat_id)
+        while len(self._shown) > self.max_chats:
+            self._shown.popitem(last=False)
+
+    def forget(self, chat_id: int) -> None:
+        """Забуває показане в чаті (повідомлення видалене або сесія завершена)."""
+        self._shown.pop(chat_id, None)
+        self._pending.pop(chat_id, None)
+
+    async def edit(self, bot: Bot, chat_id: int, message_id: int, text: str,
+                   reply_markup: Optional[InlineKeyboardMarkup] = None, parse_mode: Optional[str] = None,
+                   on_failed: Optional[Callable[[], Awaitable]] = None) -> None:
+        job = (message_id, self.digest(text, reply_markup, parse_mode), text, reply_markup, parse_mode, on_failed)
+        if chat_id in self._inflight:
+            if chat_id in self._pending:
+                self.counters["coalesced"] += 1
+            self._pending[chat_id] = job
+            return
+        if self._shown.get(chat_id) == job[:2]:
+            self.counters["suppressed"] += 1
+            return
+        if not self.coalesce:
+            await self._send(bot, chat_id, job)
+            return
+        self._inflight[chat_id] = asyncio.get_running_loop().create_task(self._drain(bot, chat_id, job))
+
+    async def _drain(self, bot: Bot, chat_id: int, job: tuple) -> None:
+        try:
+            while job is not None:
+                if self._shown.get(chat_id) == job[:2]:
+                    self.counters["suppressed"] += 1
+                else:
+                    await self._send(bot, chat_id, job)
+                job = self._pending.pop(chat_id, None)
+        except Exception as e:
+            logger.error(f"Помилка фонового редагування в чаті {chat_id}: {e}", exc_info=True)
+        finally:
+            self._inflight.pop(chat_id, None)
+
+    async def _send(self, bot: Bot, chat_id: int, job: tuple) -> None:
+        message_id, digest, text, reply_markup, parse_mode, on_failed = job
+        try:
+            await bot.edit_message_text(
+                chat_id=chat_id, message_id=message_id, text=text, reply_markup=reply_markup, parse_mode=parse_mode,
+            )
+            self.counters["sent"] += 1
+            self.remember(chat_id, message_id, digest)
+        except BadRequest as e:
+            if "Message is not modified" in str(e):
+                self.counters["not_modified"] += 1
+                self.remember(chat_id, message_id, digest)
+                logger.info("Повідомлення не змінено, пропуск редагування.")
+                return
+            self.counters["failed"] += 1
+            self._shown.pop(chat_id, None)
+            if "message to edit not found" in str(e).lower():
+                logger.warning(f"Не вдалося знайти повідомлення {message_id} для редагування. Надсилаю нове.")
+            else:
+                logger.error(f"Помилка під час редагування повідомлення: {e}", exc_info=True)
+            if on_failed is not None:
+                await on_failed()
+
+    async def wait_idle(self) -> None:
+        """Чекає, поки всі фонові edit-и будуть відправлені."""
+        while self._inflight:
+            await asyncio.gather(*list(self._inflight.values()), return_exceptions=True)
+
+    def stats(self) -> dict:
+        return dict(self.counters, tracked_chats=len(self._shown), inflight=len(self._inflight))
+
+
+main_message_editor = MainMessageEditor(MAIN_MESSAGE_TRACK_CHATS, MAIN_MESSAGE_COALESCE)
+
+
+# === HTTP-клієнт Bot API: окремі пули для завантажень і звичайних викликів ===
+
+# Методи, що завантажують файли (навіть якщо бот надсилає вже відомий file_id — з'єднання
+# для них однаково виділяємо окремо, щоб повільний upload не блокував відповіді)
+UPLOAD_ENDPOINTS = frozenset({
+    "sendDocument", "sendPhoto", "sendVideo", "sendAudio", "sendVoice", "sendAnimation",
+    "sendVideoNote", "sendSticker", "sendMediaGroup", "editMessageMedia", "setChatPhoto",
+})
+
+def resolve_http_version(http_version: str) -> str:
+    """HTTP/2 лише якщо встановлено h2; інакше — попередження і HTTP/1.1."""
+    if http_version in ("2", "2.0") and importlib.util.find_spec("h2") is None:
+        logger.warning("BOT_HTTP_VERSION=2, але пакет h2 не встановлено (pip install \"httpx[http2]\"). Використовую HTTP/1.1.")
+        return "1.1"
+    return http_version
+
+def create_http_client(
+    pool_size: int,
+    read_timeout: float,
+    write_timeout: float,
+    connect_timeout: float = BOT_HTTP_CONNECT_TIMEOUT,
+    pool_timeout: float = BOT_HTTP_POOL_TIMEOUT,
+    keepalive_expiry: float = BOT_HTTP_KEEPALIVE_EXPIRY,
+    http_version: str = "1.1",
+) -> HTTPXRequest:
+    """
+    HTTPXRequest з keep-alive на весь пул: за замовчуванням httpx тримає лише 20 вільних
+    з'єднань по 5 секунд, тож після паузи чи сплеску кожен виклик заново відкриває TCP/TLS.
+    """
+    return HTTPXRequest(
+        connection_pool_size=pool_size,
+        read_timeout=read_timeout,
+        write_timeout=write_timeout,
+        connect_timeout=connect_timeout,
+        pool_timeout=pool_timeout,
+        media_write_timeout=write_timeout,
+        http_version=http_version,
+        httpx_kwargs={"limits": httpx.Limits(
+            max_connections=pool_size, max_keepalive_connections=pool_size, keepalive_expiry=keepalive_expiry,
+        )},
+    )
+
+class RoutingRequest(BaseRequest):
+    """
+    Розводить виклики Bot API по двох HTTP-клієнтах: завантаження файлів — у upload,
+    решта (sendMessage, editMessageText, answerCallbackQuery, deleteMessages...) — у default.
+    Таймаути кожного клієнта — його власні; явні таймаути з виклику методу мають пріоритет.
+    """
+
+    def __init__(self, default: BaseRequest, upload: BaseRequest):
+        self.default = default
+        self.upload = upload
+        self.counters = {"default": 0, "upload": 0}
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return self.default.read_timeout
+
+    async def initialize(self) -> None:
+        await asyncio.gather(self.default.initialize(), self.upload.initialize())
+
+    async def shutdown(self) -> None:
+        await asyncio.gather(self.default.shutdown(), self.upload.shutdown())
+
+    def route(self, url: str, request_data: Optional[RequestData]) -> Tuple[str, BaseRequest]:
+        endpoint = url.rsplit("/", 1)[-1]
+        if endpoint in UPLOAD_ENDPOINTS or (request_data is not None and request_data.contains_files):
+            return "upload", self.upload
+        return "default", self.default
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        read_timeout=BaseRequest.DEFAULT_NONE,
+        write_timeout=BaseRequest.DEFAULT_NONE,
+        connect_timeout=BaseRequest.DEFAULT_NONE,
+        pool_timeout=BaseRequest.DEFAULT_NONE,
+    ) -> Tuple[int, bytes]:
+        name, request = self.route(url, request_data)
+        self.counters[name] += 1
+        return await request.do_request(
+            url, method, request_data,
+            read_timeout=read_timeout, write_timeout=write_timeout,
+            connect_timeout=connect_timeout, pool_timeout=pool_timeout,
+        )
+
+    def stats(self) -> dict:
+        return dict(self.counters)
+
+def create_request() -> RoutingRequest:
+    """HTTP-клієнт для звичайних викликів бота за налаштуваннями env."""
+    http_version = resolve_http_version(BOT_HTTP_VERSION)
+    return RoutingRequest(
+        default=create_http_client(
+            BOT_HTTP_POOL_SIZE, BOT_HTTP_READ_TIMEOUT, BOT_HTTP_WRITE_TIMEOUT, http_version=http_version,
+        ),
+        upload=create_http_client(
+            BOT_HTTP_UPLOAD_POOL_SIZE, BOT_HTTP_UPLOAD_READ_TIMEOUT, BOT_HTTP_UPLOAD_WRITE_TIMEOUT,
+            http_version=http_version,
+        ),
+    )
+
+def configure_http_client(builder: ApplicationBuilder, client: Optional[str] = None) -> ApplicationBuilder:
+    """Підключає HTTP-клієнт до ApplicationBuilder за BOT_HTTP_CLIENT (getUpdates лишається на клієнті PTB)."""
+    client = client or BOT_HTTP_CLIENT
+    if client == "default":
+        return builder
+    if client != "routed":
+        raise ValueError(f"Невідомий BOT_HTTP_CLIENT='{client}'. Доступні: routed, default")
+    request = create_request()
+    logger.info(
+        f"HTTP-клієнт Bot API: пул {BOT_HTTP_POOL_SIZE} + завантаження {BOT_HTTP_UPLOAD_POOL_SIZE}, "
+        f"HTTP/{request.default.http_version}"
+    )
+    return builder.request(request)
+
+
+# === Режим запуску: long polling або webhook ===
+
+def configure_api_endpoint(builder: ApplicationBuilder, base_url: Optional[str] = None) -> ApplicationBuilder:
+    """Направляє бота на інший Bot API сервер (локальний fake_bot_api.py для тестів і бенчмарків)."""
+    base_url = base_url or TELEGRAM_API_BASE_URL
+    if base_url:
+        base_url = base_url.rstrip("/")
+        builder = builder.base_url(base_url).base_file_url(base_url.replace("/bot", "/file/bot", 1))
+        logger.info(f"Bot API: {base_url}")
+    return builder
+
+def run_application(application: Application) -> None:
+    """
+    Запускає бота в режимі BOT_RUN_MODE (блокуючий виклик).
+    webhook: вбудований HTTP-сервер PTB приймає оновлення від Telegram і відкидає запити
+    без правильного X-Telegram-Bot-Api-Secret-Token; SIGINT/SIGTERM зупиняють його коректно
+    (доробляються поточні оновлення, викликається post_shutdown).
+    """
+    if BOT_RUN_MODE == "polling":
+        application.run_polling()
+    elif BOT_RUN_MODE == "webhook":
+        if not WEBHOOK_URL:
+            raise ValueError("Для BOT_RUN_MODE=webhook потрібна змінна WEBHOOK_URL")
+        logger.info(f"Webhook: {WEBHOOK_URL}/{WEBHOOK_PATH} → {WEBHOOK_LISTEN}:{WEBHOOK_PORT}, max_connections={WEBHOOK_MAX_CONNECTIONS}")
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET_TOKEN,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+        )
+    else:
+        raise ValueError(f"Невідомий BOT_RUN_MODE='{BOT_RUN_MODE}'. Доступні: polling, webhook")
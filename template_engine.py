@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Легкий шар над шаблонами з templates.py.
+
+Усі рядкові константи з templates.py розбираються ОДИН раз при імпорті:
+для кожного шаблону відомий набір плейсхолдерів ({project_name}, {c1_s1_status}, ...).
+Рендер — це один str.format_map() по готовому словнику значень, без **-розпакування.
+Бот тримає цей словник у user_data і оновлює в ньому лише поле щойно
+отриманої відповіді (екранування — один раз, при збереженні).
+
+validate_templates() при старті бота перевіряє, що кожен плейсхолдер
+кожного шаблону буде чим заповнити.
+"""
+
+import fnmatch
+import logging
+from collections import ChainMap
+from string import Formatter
+from typing import Iterable, Mapping, Optional
+
+import templates
+
+logger = logging.getLogger("template_engine")
+
+
+class CompiledTemplate:
+    """Шаблон з наперед відомими плейсхолдерами."""
+
+    __slots__ = ("name", "source", "fields", "_format_map")
+
+    def __init__(self, name: str, source: str):
+        self.name = name
+        self.source = source
+        fields = set()
+        for _, field_name, format_spec, conversion in Formatter().parse(source):
+            if field_name is None:
+                continue
+            if not field_name.isidentifier() or format_spec or conversion:
+                raise ValueError(f"Шаблон {name}: непідтримуваний плейсхолдер {{{field_name}}}")
+            fields.add(field_name)
+        self.fields = frozenset(fields)
+        self._format_map = source.format_map
+
+    def render(self, data: Optional[Mapping] = None, **extra) -> str:
+        """Заповнює шаблон значеннями з data (і додатковими полями extra)."""
+        if extra:
+            values = ChainMap(extra, data) if data is not None else extra
+        else:
+            values = data if data is not None else {}
+        try:
+            return self._format_map(values)
+        except KeyError as e:
+            raise KeyError(f"Шаблон {self.name}: немає значення для {{{e.args[0]}}}") from None
+
+
+def compile_templates(module) -> dict:
+    """Компілює всі рядкові константи модуля (UPPER_CASE) у CompiledTemplate."""
+    compiled = {}
+    for name in dir(module):
+        value = getattr(module, name)
+        if name.isupper() and isinstance(value, str):
+            compiled[name] = CompiledTemplate(name, value)
+    return compiled
+
+
+TEMPLATES = compile_templates(templates)
+
+def render(name: str, data: Optional[Mapping] = None, **extra) -> str:
+    """Рендерить шаблон templates.<name>."""
+    return TEMPLATES[name].render(data, **extra)
+
+def validate_templates(spec: Mapping[str, Iterable[str]]) -> None:
+    """
+    Перевіряє, що всі плейсхолдери будуть заповнені.
+    spec: шаблон імені (fnmatch, напр. "POLICY_Q_*") → поля, які бот надає таким шаблонам.
+    Піднімає ValueError зі списком усіх проблем.
+    """
+    problems = []
+    for name, template in sorted(TEMPLATES.items()):
+        if not template.fields:
+            continue
+        provided = None
+        for pattern, fields in spec.items():
+            if fnmatch.fnmatchcase(name, pattern):
+                provided = set(fields)
+                break
+        if provided is None:
+            problems.append(f"{name}: немає опису полів")
+            continue
+        missing = template.fields - provided
+        if missing:
+            problems.append(f"{name}: бракує {', '.join(sorted(missing))}")
+
+    if problems:
+        raise ValueError("Шаблони не пройшли перевірку:\n" + "\n".join(problems))
+    logger.info(f"Шаблони перевірено: {len(TEMPLATES)} шт.")
@@ -87,6 +87,26 @@ CHECKLIST_TEMPLATE_PDF = """
 """
 
 
+# Розділи та пункти Чек-ліста у PDF: (заголовок категорії, [(назва пункту, ключ), ...])
+CHECKLIST_PDF_SECTIONS = (
+    ("Категорія 1: Контроль Доступу", (
+        ("1.1. 2FA (Двофакторна Автентифікація)", "c1_s1"),
+        ("1.2. Принцип 'Найменших привілеїв'", "c1_s2"),
+        ("1.3. БЕЗ ПУБЛІЧНИХ ПОСИЛАНЬ", "c1_s3"),
+    )),
+    ("Категорія 2: Права Користувачів", (
+        ("2.1. Публічна Політика", "c2_s1"),
+        ("2.2. Механізм Видалення (Ст. 8)", "c2_s2"),
+        ("2.3. Контакт для скарг", "c2_s3"),
+    )),
+    ("Категорія 3: Технічна Гігієна", (
+        ("3.1. Безпека Токенів", "c3_s1"),
+        ("3.2. Планування Строків (Retention)", "c3_s2"),
+        ("3.3. Шифрування (Якщо є паролі)", "c3_s3"),
+    )),
+)
+
+
 # === 4. (НОВЕ v3.0) ШАБЛОНИ ДЛЯ "БЕЗШОВНОЇ" ПОЛІТИКИ ===
 
 POLICY_Q_PROJECT_NAME = """
@@ -282,20 +302,32 @@ DPIA_Q_MITIGATION = """
 """
 
 
-# === 6. ШАБЛОНИ ДЛЯ "БЕЗШОВНОГО" ЧЕК-ЛІСТА (v2.8 - Ідеальні) ===
+# === 6. ШАБЛОНИ ДЛЯ "БЕЗШОВНОГО" ЧЕК-ЛІСТА (v3.5 - Інкрементальні) ===
+
+# Кожне питання — це {summary} (підсумок уже пройдених пунктів, який бот дописує
+# по одному фрагменту) + текст лише поточного пункту. Повідомлення не повторює
+# весь попередній чек-ліст у кожному шаблоні, а завершені категорії згортаються в рядок.
+
+CHECKLIST_SUMMARY_CATEGORY = """**{category}**
+"""
+CHECKLIST_SUMMARY_ITEM = """
+**{title}**
+Ваш статус: {status}
+{note}
+"""
+CHECKLIST_SUMMARY_CATEGORY_DONE = """**{category}** — {statuses}
+"""
 
 # --- Категорія 1 ---
 CHECKLIST_C1_S1_STATUS = """
-**Категорія 1: Контроль Доступу**
----
+{summary}---
 **1.1. 2FA (Двофакторна Автентифікація)**
 *(На всіх акаунтах, які мають доступ до даних: Google, Heroku, Firebase...)*
 
 Ваш статус:
 """
 CHECKLIST_C1_S1_NOTE = """
-**Категорія 1: Контроль Доступу**
----
+{summary}---
 **1.1. 2FA (Двофакторна Автентифікація)**
 Ваш статус: {c1_s1_status}
 
@@ -304,26 +336,14 @@ CHECKLIST_C1_S1_NOTE = """
 """
 
 CHECKLIST_C1_S2_STATUS = """
-**Категорія 1: Контроль Доступу**
----
-**1.1. 2FA (Двофакторна Автентифікація)**
-Ваш статус: {c1_s1_status}
-{c1_s1_note}
-
----
+{summary}---
 **1.2. Принцип 'Найменших привілеїв'**
 *("Адмінку" має 1-2 людини, а не вся команда).*
 
 Ваш статус:
 """
 CHECKLIST_C1_S2_NOTE = """
-**Категорія 1: Контроль Доступу**
----
-**1.1. 2FA (Двофакторна Автентифікація)**
-Ваш статус: {c1_s1_status}
-{c1_s1_note}
-
----
+{summary}---
 **1.2. Принцип 'Найменших привілеїв'**
 Ваш статус: {c1_s2_status}
 
@@ -332,34 +352,14 @@ CHECKLIST_C1_S2_NOTE = """
 """
 
 CHECKLIST_C1_S3_STATUS = """
-**Категорія 1: Контроль Доступу**
----
-**1.1. 2FA (Двофакторна Автентифікація)**
-Ваш статус: {c1_s1_status}
-{c1_s1_note}
-
-**1.2. Принцип 'Найменших привілеїв'**
-Ваш статус: {c1_s2_status}
-{c1_s2_note}
-
----
+{summary}---
 **1.3. БЕЗ ПУБЛІЧНИХ ПОСИЛАНЬ**
 *(Якщо ви використовуєте Google Sheets, доступ має бути "Обмежений").*
 
 Ваш статус:
 """
 CHECKLIST_C1_S3_NOTE = """
-**Категорія 1: Контроль Доступу**
----
-**1.1. 2FA (Двофакторна Автентифікація)**
-Ваш статус: {c1_s1_status}
-{c1_s1_note}
-
-**1.2. Принцип 'Найменших привілеїв'**
-Ваш статус: {c1_s2_status}
-{c1_s2_note}
-
----
+{summary}---
 **1.3. БЕЗ ПУБЛІЧНИХ ПОСИЛАНЬ**
 Ваш статус: {c1_s3_status}
 
@@ -369,46 +369,14 @@ CHECKLIST_C1_S3_NOTE = """
 
 # --- Категорія 2 ---
 CHECKLIST_C2_S1_STATUS = """
-**Категорія 1: Контроль Доступу**
----
-**1.1. 2FA (Двофакторна Автентифікація)**
-Ваш статус: {c1_s1_status}
-{c1_s1_note}
-
-**1.2. Принцип 'Найменших привілеїв'**
-Ваш статус: {c1_s2_status}
-{c1_s2_note}
-
-**1.3. БЕЗ ПУБЛІЧНИХ ПОСИЛАНЬ**
-Ваш статус: {c1_s3_status}
-{c1_s3_note}
-
----
-**Категорія 2: Права Користувачів**
----
+{summary}---
 **2.1. Публічна Політика**
 *(Політика опублікована і легко доступна, напр., команда /privacy).*
 
 Ваш статус:
 """
 CHECKLIST_C2_S1_NOTE = """
-**Категорія 1: Контроль Доступу**
----
-**1.1. 2FA (Двофакторна Автентифікація)**
-Ваш статус: {c1_s1_status}
-{c1_s1_note}
-
-**1.2. Принцип 'Найменших привілеїв'**
-Ваш статус: {c1_s2_status}
-{c1_s2_note}
-
-**1.3. БЕЗ ПУБЛІЧНИХ ПОСИЛАНЬ**
-Ваш статус: {c1_s3_status}
-{c1_s3_note}
-
----
-**Категорія 2: Права Користувачів**
----
+{summary}---
 **2.1. Публічна Політика**
 Ваш статус: {c2_s1_status}
 
@@ -417,54 +385,14 @@ CHECKLIST_C2_S1_NOTE = """
 """
 
 CHECKLIST_C2_S2_STATUS = """
-**Категорія 1: Контроль Доступу**
----
-**1.1. 2FA (Двофакторна Автентифікація)**
-Ваш статус: {c1_s1_status}
-{c1_s1_note}
-
-**1.2. Принцип 'Найменших привілеїв'**
-Ваш статус: {c1_s2_status}
-{c1_s2_note}
-
-**1.3. БЕЗ ПУБЛІЧНИХ ПОСИЛАНЬ**
-Ваш статус: {c1_s3_status}
-{c1_s3_note}
-
-**Категорія 2: Права Користувачів**
----
-**2.1. Публічна Політика**
-Ваш статус: {c2_s1_status}
-{c2_s1_note}
-
----
+{summary}---
 **2.2. Механізм Видалення (Ст. 8)**
 *(Користувач має *реальний*, простий спосіб видалити свої дані, напр., /deleteme).*
 
 Ваш статус:
 """
 CHECKLIST_C2_S2_NOTE = """
-**Категорія 1: Контроль Доступу**
----
-**1.1. 2FA (Двофакторна Автентифікація)**
-Ваш статус: {c1_s1_status}
-{c1_s1_note}
-
-**1.2. Принцип 'Найменших привілеїв'**
-Ваш статус: {c1_s2_status}
-{c1_s2_note}
-
-**1.3. БЕЗ ПУБЛІЧНИХ ПОСИЛАНЬ**
-Ваш статус: {c1_s3_status}
-{c1_s3_note}
-
-**Категорія 2: Права Користувачів**
----
-**2.1. Публічна Політика**
-Ваш статус: {c2_s1_status}
-{c2_s1_note}
-
----
+{summary}---
 **2.2. Механізм Видалення (Ст. 8)**
 Ваш статус: {c2_s2_status}
 
@@ -473,62 +401,14 @@ CHECKLIST_C2_S2_NOTE = """
 """
 
 CHECKLIST_C2_S3_STATUS = """
-**Категорія 1: Контроль Доступу**
----
-**1.1. 2FA (Двофакторна Автентифікація)**
-Ваш статус: {c1_s1_status}
-{c1_s1_note}
-
-**1.2. Принцип 'Найменших привілеїв'**
-Ваш статус: {c1_s2_status}
-{c1_s2_note}
-
-**1.3. БЕЗ ПУБЛІЧНИХ ПОСИЛАНЬ**
-Ваш статус: {c1_s3_status}
-{c1_s3_note}
-
-**Категорія 2: Права Користувачів**
----
-**2.1. Публічна Політика**
-Ваш статус: {c2_s1_status}
-{c2_s1_note}
-
-**2.2. Механізм Видалення (Ст. 8)**
-Ваш статус: {c2_s2_status}
-{c2_s2_note}
-
----
+{summary}---
 **2.3. Контакт для скарг**
 *(У боті є чітка команда /help або /support, що веде на адміна).*
 
 Ваш статус:
 """
 CHECKLIST_C2_S3_NOTE = """
-**Категорія 1: Контроль Доступу**
----
-**1.1. 2FA (Двофакторна Автентифікація)**
-Ваш статус: {c1_s1_status}
-{c1_s1_note}
-
-**1.2. Принцип 'Найменших привілеїв'**
-Ваш статус: {c1_s2_status}
-{c1_s2_note}
-
-**1.3. БЕЗ ПУБЛІЧНИХ ПОСИЛАНЬ**
-Ваш статус: {c1_s3_status}
-{c1_s3_note}
-
-**Категорія 2: Права Користувачів**
----
-**2.1. Публічна Політика**
-Ваш статус: {c2_s1_status}
-{c2_s1_note}
-
-**2.2. Механізм Видалення (Ст. 8)**
-Ваш статус: {c2_s2_status}
-{c2_s2_note}
-
----
+{summary}---
 **2.3. Контакт для скарг**
 Ваш статус: {c2_s3_status}
 
@@ -538,74 +418,14 @@ CHECKLIST_C2_S3_NOTE = """
 
 # --- Категорія 3 ---
 CHECKLIST_C3_S1_STATUS = """
-**Категорія 1: Контроль Доступу**
----
-**1.1. 2FA (Двофакторна Автентифікація)**
-Ваш статус: {c1_s1_status}
-{c1_s1_note}
-
-**1.2. Принцип 'Найменших привілеїв'**
-Ваш статус: {c1_s2_status}
-{c1_s2_note}
-
-**1.3. БЕЗ ПУБЛІЧНИХ ПОСИЛАНЬ**
-Ваш статус: {c1_s3_status}
-{c1_s3_note}
-
-**Категорія 2: Права Користувачів**
----
-**2.1. Публічна Політика**
-Ваш статус: {c2_s1_status}
-{c2_s1_note}
-
-**2.2. Механізм Видалення (Ст. 8)**
-Ваш статус: {c2_s2_status}
-{c2_s2_note}
-
-**2.3. Контакт для скарг**
-Ваш статус: {c2_s3_status}
-{c2_s3_note}
-
----
-**Категорія 3: Технічна Гігієна**
----
+{summary}---
 **3.1. Безпека Токенів**
 *(Токен вашого бота (та ключі API) лежить у .env, а не "зашитий" у коді на GitHub).*
 
 Ваш статус:
 """
 CHECKLIST_C3_S1_NOTE = """
-**Категорія 1: Контроль Доступу**
----
-**1.1. 2FA (Двофакторна Автентифікація)**
-Ваш статус: {c1_s1_status}
-{c1_s1_note}
-
-**1.2. Принцип 'Найменших привілеїв'**
-Ваш статус: {c1_s2_status}
-{c1_s2_note}
-
-**1.3. БЕЗ ПУБЛІЧНИХ ПОСИЛАНЬ**
-Ваш статус: {c1_s3_status}
-{c1_s3_note}
-
-**Категорія 2: Права Користувачів**
----
-**2.1. Публічна Політика**
-Ваш статус: {c2_s1_status}
-{c2_s1_note}
-
-**2.2. Механізм Видалення (Ст. 8)**
-Ваш статус: {c2_s2_status}
-{c2_s2_note}
-
-**2.3. Контакт для скарг**
-Ваш статус: {c2_s3_status}
-{c2_s3_note}
-
----
-**Категорія 3: Технічна Гігієна**
----
+{summary}---
 **3.1. Безпека Токенів**
 Ваш статус: {c3_s1_status}
 
@@ -614,82 +434,14 @@ CHECKLIST_C3_S1_NOTE = """
 """
 
 CHECKLIST_C3_S2_STATUS = """
-**Категорія 1: Контроль Доступу**
----
-**1.1. 2FA (Двофакторна Автентифікація)**
-Ваш статус: {c1_s1_status}
-{c1_s1_note}
-
-**1.2. Принцип 'Найменших привілеїв'**
-Ваш статус: {c1_s2_status}
-{c1_s2_note}
-
-**1.3. БЕЗ ПУБЛІЧНИХ ПОСИЛАНЬ**
-Ваш статус: {c1_s3_status}
-{c1_s3_note}
-
-**Категорія 2: Права Користувачів**
----
-**2.1. Публічна Політика**
-Ваш статус: {c2_s1_status}
-{c2_s1_note}
-
-**2.2. Механізм Видалення (Ст. 8)**
-Ваш статус: {c2_s2_status}
-{c2_s2_note}
-
-**2.3. Контакт для скарг**
-Ваш статус: {c2_s3_status}
-{c2_s3_note}
-
-**Категорія 3: Технічна Гігієна**
----
-**3.1. Безпека Токенів**
-Ваш статус: {c3_s1_status}
-{c3_s1_note}
-
----
+{summary}---
 **3.2. Планування Строків (Retention)**
 *(У вас є план/скрипт автоматичного очищення старих даних (напр., неактивні > 6 міс.)).*
 
 Ваш статус:
 """
 CHECKLIST_C3_S2_NOTE = """
-**Категорія 1: Контроль Доступу**
----
-**1.1. 2FA (Двофакторна Автентифікація)**
-Ваш статус: {c1_s1_status}
-{c1_s1_note}
-
-**1.2. Принцип 'Найменших привілеїв'**
-Ваш статус: {c1_s2_status}
-{c1_s2_note}
-
-**1.3. БЕЗ ПУБЛІЧНИХ ПОСИЛАНЬ**
-Ваш статус: {c1_s3_status}
-{c1_s3_note}
-
-**Категорія 2: Права Користувачів**
----
-**2.1. Публічна Політика**
-Ваш статус: {c2_s1_status}
-{c2_s1_note}
-
-**2.2. Механізм Видалення (Ст. 8)**
-Ваш статус: {c2_s2_status}
-{c2_s2_note}
-
-**2.3. Контакт для скарг**
-Ваш статус: {c2_s3_status}
-{c2_s3_note}
-
-**Категорія 3: Технічна Гігієна**
----
-**3.1. Безпека Токенів**
-Ваш статус: {c3_s1_status}
-{c3_s1_note}
-
----
+{summary}---
 **3.2. Планування Строків (Retention)**
 Ваш статус: {c3_s2_status}
 
@@ -698,90 +450,14 @@ CHECKLIST_C3_S2_NOTE = """
 """
 
 CHECKLIST_C3_S3_STATUS = """
-**Категорія 1: Контроль Доступу**
----
-**1.1. 2FA (Двофакторна Автентифікація)**
-Ваш статус: {c1_s1_status}
-{c1_s1_note}
-
-**1.2. Принцип 'Найменших привілеїв'**
-Ваш статус: {c1_s2_status}
-{c1_s2_note}
-
-**1.3. БЕЗ ПУБЛІЧНИХ ПОСИЛАНЬ**
-Ваш статус: {c1_s3_status}
-{c1_s3_note}
-
-**Категорія 2: Права Користувачів**
----
-**2.1. Публічна Політика**
-Ваш статус: {c2_s1_status}
-{c2_s1_note}
-
-**2.2. Механізм Видалення (Ст. 8)**
-Ваш статус: {c2_s2_status}
-{c2_s2_note}
-
-**2.3. Контакт для скарг**
-Ваш статус: {c2_s3_status}
-{c2_s3_note}
-
-**Категорія 3: Технічна Гігієна**
----
-**3.1. Безпека Токенів**
-Ваш статус: {c3_s1_status}
-{c3_s1_note}
-
-**3.2. Планування Строків (Retention)**
-Ваш статус: {c3_s2_status}
-{c3_s2_note}
-
----
+{summary}---
 **3.3. Шифрування (Якщо є паролі)**
 *(Якщо ваш сервіс має окрему реєстрацію, паролі зберігаються у хешованому вигляді (bcrypt)).*
 
 Ваш статус:
 """
 CHECKLIST_C3_S3_NOTE = """
-**Категорія 1: Контроль Доступу**
----
-**1.1. 2FA (Двофакторна Автентифікація)**
-Ваш статус: {c1_s1_status}
-{c1_s1_note}
-
-**1.2. Принцип 'Найменших привілеїв'**
-Ваш статус: {c1_s2_status}
-{c1_s2_note}
-
-**1.3. БЕЗ ПУБЛІЧНИХ ПОСИЛАНЬ**
-Ваш статус: {c1_s3_status}
-{c1_s3_note}
-
-**Категорія 2: Права Користувачів**
----
-**2.1. Публічна Політика**
-Ваш статус: {c2_s1_status}
-{c2_s1_note}
-
-**2.2. Механізм Видалення (Ст. 8)**
-Ваш статус: {c2_s2_status}
-{c2_s2_note}
-
-**2.3. Контакт для скарг**
-Ваш статус: {c2_s3_status}
-{c2_s3_note}
-
-**Категорія 3: Технічна Гігієна**
----
-**3.1. Безпека Токенів**
-Ваш статус: {c3_s1_status}
-{c3_s1_note}
-
-**3.2. Планування Строків (Retention)**
-Ваш статус: {c3_s2_status}
-{c3_s2_note}
-
----
+{summary}---
 **3.3. Шифрування (Якщо є паролі)**
 Ваш статус: {c3_s3_status}
 
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Еталонні (golden) тести документів в обох режимах DOCUMENT_RENDER_MODE: HTML-шлях
+(build_*_html) і Markdown-конвеєр (build_*_markdown + markdown2).
+
+На звичайному тексті обидва режими дають байт у байт той самий HTML —
+tests/golden/<документ>_<набір відповідей>.html. На відповідях з Markdown-розміткою
+(*v2*, `код`, | і перенос рядка в нотатці) режими розходяться: markdown2 перетворює
+розмітку, а HTML-шлях лише екранує її. Для цього набору в кожного режиму свій еталон —
+tests/golden/<документ>_markup_<режим>.html, тож розбіжність зафіксована тестами.
+
+Після навмисної зміни шаблону еталони перезаписуються так:
+    UPDATE_GOLDEN=1 python -m pytest tests/test_documents.py
+"""
+
+import os
+
+import pytest
+
+import documents
+from pdf_utils import _md_to_html, _wrap_html
+
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), "golden")
+UPDATE_GOLDEN = os.getenv("UPDATE_GOLDEN") == "1"
+
+DOCUMENTS = ('policy', 'dpia', 'checklist')
+
+MARKUP_TEXT = "Бот *v2* для `/delete` & <b>адмінів</b>"
+MARKUP_NOTE = "Ключі | токени\nу *Vault*"
+
+# "golden" — заповнені відповіді; "empty" — користувач нічого не ввів (підставляються заглушки);
+# "markup" — відповіді з метасимволами Markdown і HTML, на яких режими розходяться
+ANSWER_SETS = {
+    'golden': documents.GOLDEN_ANSWERS,
+    'empty': {'policy': {}, 'dpia': {'minimization_data': []}, 'checklist': {}},
+    'markup': {
+        'policy': dict(documents.GOLDEN_ANSWERS['policy'], project_name=MARKUP_TEXT, data_collected=MARKUP_NOTE),
+        'dpia': dict(
+            documents.GOLDEN_ANSWERS['dpia'],
+            project_name=MARKUP_TEXT,
+            minimization_data=[{'item': "ID | *нік*", 'needed': True, 'reason': MARKUP_NOTE}],
+            risk=MARKUP_NOTE,
+        ),
+        'checklist': dict(
+            documents.GOLDEN_ANSWERS['checklist'], c1_s1_note=MARKUP_NOTE, c1_s2_note=MARKUP_TEXT,
+        ),
+    },
+}
+# Набори, на яких HTML- і Markdown-режим дають різний документ
+DIVERGENT = {'markup'}
+
+MODES = ('html', 'markdown')
+CASES = [
+    (document, answer_set, mode)
+    for document in DOCUMENTS for answer_set in ANSWER_SETS for mode in MODES
+]
+
+
+@pytest.fixture(autouse=True)
+def fixed_date(monkeypatch):
+    monkeypatch.setattr(documents, "_today", lambda: "01.09.2025")
+
+
+def _render(document: str, answer_set: str, mode: str, monkeypatch) -> str:
+    """Документ так, як його збирає бот у режимі mode (documents.build_*), — повний HTML для рушія PDF."""
+    monkeypatch.setattr(documents, "DOCUMENT_RENDER_MODE", mode)
+    content, is_html = getattr(documents, f"build_{document}")(ANSWER_SETS[answer_set][document])
+    return _wrap_html(content) if is_html else _md_to_html(content)
+
+
+def _golden_path(document: str, answer_set: str, mode: str) -> str:
+    suffix = f"_{mode}" if answer_set in DIVERGENT else ""
+    return os.path.join(GOLDEN_DIR, f"{document}_{answer_set}{suffix}.html")
+
+
+@pytest.mark.parametrize("document, answer_set, mode", CASES)
+def test_document_matches_golden(document, answer_set, mode, monkeypatch):
+    rendered = _render(document, answer_set, mode, monkeypatch)
+    path = _golden_path(document, answer_set, mode)
+    # Спільний еталон пише HTML-режим — Markdown-режим має з ним збігтися, а не перезаписати
+    if UPDATE_GOLDEN and (mode == "html" or answer_set in DIVERGENT):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(rendered)
+    with open(path, encoding="utf-8") as f:
+        assert rendered == f.read()
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_modes_diverge_on_markup(document, monkeypatch):
+    html = _render(document, 'markup', 'html', monkeypatch)
+    markdown = _render(document, 'markup', 'markdown', monkeypatch)
+    assert html != markdown
+    # HTML-шлях показує відповідь як є: розмітка користувача не стає тегами
+    assert "*v2*" in html and "&lt;b&gt;" in html
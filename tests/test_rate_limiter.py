@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""PriorityRateLimiter: що рахує bucket чату і як низький пріоритет поступається високому."""
+
+import asyncio
+
+from telegram_utils import PRIORITY_LOW, PriorityRateLimiter
+
+
+async def _call(limiter: PriorityRateLimiter, endpoint: str, log: list, chat_id: int = 1, priority=None) -> None:
+    async def callback():
+        log.append(endpoint)
+
+    rate_limit_args = {"priority": priority} if priority else None
+    await limiter.process_request(callback, (), {}, endpoint, {"chat_id": chat_id}, rate_limit_args)
+
+
+def test_edits_and_deletes_skip_chat_bucket():
+    async def run():
+        limiter = PriorityRateLimiter(1000, 1000, chat_rate=1, chat_burst=1)
+        log = []
+        for _ in range(20):
+            await _call(limiter, "editMessageText", log)
+            await _call(limiter, "deleteMessage", log)
+        await _call(limiter, "sendMessage", log)
+        return limiter.stats()
+
+    stats = asyncio.run(run())
+    assert stats["throttled_high"] == 0 and stats["throttled_low"] == 0
+    assert stats["wait_seconds"] == 0
+
+
+def test_sends_use_chat_bucket():
+    async def run():
+        limiter = PriorityRateLimiter(1000, 1000, chat_rate=50, chat_burst=1)
+        log = []
+        await _call(limiter, "sendMessage", log)
+        await _call(limiter, "sendDocument", log)
+        return limiter.stats()
+
+    assert asyncio.run(run())["throttled_high"] == 1
+
+
+def test_high_waiting_on_own_chat_does_not_hold_low_back():
+    async def run():
+        limiter = PriorityRateLimiter(1000, 1000, chat_rate=2, chat_burst=1)
+        log = []
+        await _call(limiter, "sendMessage", log, chat_id=1)
+        # Цей send чекає ~0.5 с на bucket свого чату, а видалення в іншому чаті — ні
+        send = asyncio.ensure_future(_call(limiter, "sendMessage", log, chat_id=1))
+        await asyncio.sleep(0.01)
+        await asyncio.wait_for(_call(limiter, "deleteMessage", log, chat_id=2), 0.2)
+        assert not send.done()
+        await send
+        return limiter.stats()
+
+    stats = asyncio.run(run())
+    assert stats["throttled_low"] == 0
+
+
+def test_low_yields_to_high_on_global_bucket():
+    async def run():
+        limiter = PriorityRateLimiter(20, 1, chat_rate=1000, chat_burst=1000, low_reserve=0)
+        log = []
+        await _call(limiter, "sendMessage", log, chat_id=1)
+        high = asyncio.ensure_future(_call(limiter, "editMessageText", log, chat_id=2))
+        await asyncio.sleep(0)
+        low = asyncio.ensure_future(_call(limiter, "deleteMessage", log, chat_id=3, priority=PRIORITY_LOW))
+        await asyncio.gather(high, low)
+        return log
+
+    assert asyncio.run(run()) == ["sendMessage", "editMessageText", "deleteMessage"]
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Декларативні майстри (Політика, DPIA, Чек-ліст).
+
+Майстер — це таблиця кроків. Кожен крок показує питання (шаблон з templates.py +
+клавіатура) і приймає відповідь (текст або кнопку). Один загальний хендлер Wizard.handle
+обслуговує всі кроки: номер поточного кроку лежить у user_data['<розділ>_step'],
+а ConversationHandler має лише один стан STEP.
+
+Кожна відповідь зберігається одразу разом із готовим полем для шаблонів
+(user_data['<розділ>_fields'][ключ]): на кроці перераховується лише те, що змінилось.
+Поля — похідний кеш: session.py прибирає його в неактивних сесій, і fields() збирає
+його заново з відповідей (user_data['<розділ>']).
+
+Додати пункт Чек-ліста — це один рядок у таблиці кроків (+ його шаблони питань).
+"""
+
+import logging
+from typing import Any, Awaitable, Callable, Mapping, Optional, Sequence, Tuple
+
+from telegram import InlineKeyboardMarkup, Update
+from telegram.ext import CallbackQueryHandler, ContextTypes, ConversationHandler, MessageHandler, TypeHandler, filters
+
+from template_engine import TEMPLATES, render as render_template
+
+logger = logging.getLogger("wizard")
+
+# Єдиний стан ConversationHandler будь-якого майстра
+STEP = 0
+
+Prompt = Tuple[str, Optional[InlineKeyboardMarkup]]
+
+
+def _check_template(template: str) -> str:
+    # Помилка в таблиці кроків має падати при імпорті, а не посеред розмови
+    if template not in TEMPLATES:
+        raise ValueError(f"Крок майстра: немає шаблону {template} у templates.py")
+    return template
+
+
+class TextStep:
+    """Питання з текстовою відповіддю; skip — кнопки, що підставляють готове значення замість тексту."""
+
+    __slots__ = ("key", "template", "reply_markup", "skip")
+
+    def __init__(self, key: str, template: str, reply_markup: Optional[InlineKeyboardMarkup] = None, skip: Optional[Mapping[str, str]] = None):
+        self.key = key
+        self.template = _check_template(template)
+        self.reply_markup = reply_markup
+        self.skip = dict(skip or {})
+
+    @property
+    def callbacks(self) -> tuple:
+        return tuple(self.skip)
+
+    def accepts(self, context: ContextTypes.DEFAULT_TYPE, update: Update) -> bool:
+        if update.callback_query:
+            return update.callback_query.data in self.skip
+        return True
+
+    def prompt(self, wizard: "Wizard", context: ContextTypes.DEFAULT_TYPE) -> Prompt:
+        return render_template(self.template, wizard.fields(context)), self.reply_markup
+
+    async def handle(self, wizard: "Wizard", update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+        """Приймає відповідь. True — крок завершено, майстер переходить до наступного."""
+        query = update.callback_query
+        wizard.save(context, self.key, self.skip[query.data] if query else update.message.text)
+        return True
+
+
+class ChoiceStep:
+    """Питання з кнопками: choices — callback_data → значення, що зберігається."""
+
+    __slots__ = ("key", "template", "reply_markup", "choices")
+
+    def __init__(self, key: str, template: str, reply_markup: InlineKeyboardMarkup, choices: Mapping[str, str]):
+        self.key = key
+        self.template = _check_template(template)
+        self.reply_markup = reply_markup
+        self.choices = dict(choices)
+
+    @property
+    def callbacks(self) -> tuple:
+        return tuple(self.choices)
+
+    def accepts(self, context: ContextTypes.DEFAULT_TYPE, update: Update) -> bool:
+        return bool(update.callback_query) and update.callback_query.data in self.choices
+
+    def prompt(self, wizard: "Wizard", context: ContextTypes.DEFAULT_TYPE) -> Prompt:
+        return render_template(self.template, wizard.fields(context)), self.reply_markup
+
+    async def handle(self, wizard: "Wizard", update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+        wizard.save(context, self.key, self.choices[update.callback_query.data])
+        return True
+
+
+class Wizard:
+    """
+    Майстер з таблиці кроків.
+    new_data/new_fields — початкові відповіді та поля шаблонів, formatter(key, value) — поле однієї відповіді,
+    finish(update, context) — що робити після останнього кроку (генерація PDF), повертає стан розмови.
+    show/discard_reply/reset — «Головне» повідомлення, прибирання відповіді користувача, очищення user_data.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        section: str,
+        title: str,
+        steps: Sequence,
+        new_data: Callable[[], dict],
+        new_fields: Callable[[dict], dict],
+        formatter: Callable[[str, str], str],
+        finish: Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[int]],
+        show: Callable[..., Awaitable[None]],
+        discard_reply: Callable[[Update], Awaitable[None]],
+        reset: Callable[[ContextTypes.DEFAULT_TYPE], None],
+    ):
+        self.name = name
+        self.section = section
+        self.title = title
+        self.steps = tuple(steps)
+        self.new_data = new_data
+        self.new_fields = new_fields
+        self.formatter = formatter
+        self.finish = finish
+        self._show = show
+        self.discard_reply = discard_reply
+        self.reset = reset
+        self.fields_key = f"{section}_fields"
+        self.step_key = f"{section}_step"
+        self.callbacks = tuple(dict.fromkeys(data for step in self.steps for data in step.callbacks))
+
+    # --- Стан користувача ---
+
+    def fields(self, context: ContextTypes.DEFAULT_TYPE) -> dict:
+        """Готові поля для шаблонів; після стискання сесії — заново з відповідей."""
+        fields = context.user_data.get(self.fields_key)
+        if fields is None:
+            fields = context.user_data[self.fields_key] = self.new_fields(context.user_data[self.section])
+        return fields
+
+    def save(self, context: ContextTypes.DEFAULT_TYPE, key: str, value: str) -> None:
+        """Зберігає відповідь і одразу оновлює її (і лише її) поле для шаблонів."""
+        # Поля беруться до запису відповіді: відновлені з відповідей, вони ще не містять цієї
+        fields = self.fields(context)
+        context.user_data[self.section][key] = value
+        fields[key] = self.formatter(key, value)
+
+    # --- Показ питань ---
+
+    async def show(self, context: ContextTypes.DEFAULT_TYPE, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None, new_message: bool = False) -> None:
+        await self._show(context, text, reply_markup, new_message=new_message)
+
+    async def show_step(self, context: ContextTypes.DEFAULT_TYPE, index: int, new_message: bool = False) -> None:
+        text, reply_markup = self.steps[index].prompt(self, context)
+        await self.show(context, text, reply_markup, new_message=new_message)
+
+    # --- Хендлери ---
+
+    async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        """Entry point (кнопка в меню): чистий стан і перше питання новим повідомленням."""
+        query = update.callback_query
+        await query.answer()
+
+        self.reset(context)
+        logger.info(f"User {query.from_user.id} почав '{self.title}'.")
+        data = self.new_data()
+        context.user_data[self.section] = data
+        context.user_data[self.fields_key] = self.new_fields(data)
+        context.user_data[self.step_key] = 0
+
+        await self.show_step(context, 0, new_message=True)
+        return STEP
+
+    async def handle(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        """Загальний хендлер усіх кроків: приймає відповідь поточного кроку і показує наступне питання."""
+        index = context.user_data.get(self.step_key)
+        query = update.callback_query
+        if query:
+            await query.answer()
+        if index is None or index >= len(self.steps):
+            # Стан розмови пережив відповіді (напр., user_data вже очищено) — починати спочатку з меню
+            logger.warning(f"User {update.effective_user.id}: немає кроку майстра '{self.name}', розмову завершено.")
+            return ConversationHandler.END
+
+        step = self.steps[index]
+        if not step.accepts(context, update):
+            # Відповідь не того типу (текст замість кнопки чи навпаки) — чекаємо далі
+            return STEP
+        if not query:
+            await self.discard_reply(update)
+        if not await step.handle(self, update, context):
+            return STEP
+
+        index += 1
+        if index == len(self.steps):
+            context.user_data.pop(self.step_key, None)
+            return await self.finish(update, context)
+        context.user_data[self.step_key] = index
+        await self.show_step(context, index)
+        return STEP
+
+    def conversation_handler(
+        self,
+        entry_pattern: str,
+        fallbacks: list,
+        persistent: bool,
+        timeout: Optional[float] = None,
+        on_timeout: Optional[Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[Any]]] = None,
+    ) -> ConversationHandler:
+        """
+        timeout — через скільки секунд неактивності PTB завершує розмову (conversation_timeout,
+        потрібен JobQueue); on_timeout(update, context) — що ще зробити в цей момент.
+        """
+        handlers = [MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle)]
+        if self.callbacks:
+            # Точний збіг callback_data — перевірка множиною, без регулярного виразу
+            callbacks = frozenset(self.callbacks)
+            handlers.insert(0, CallbackQueryHandler(self.handle, pattern=callbacks.__contains__))
+        states = {STEP: handlers}
+        if timeout and on_timeout is not None:
+            states[ConversationHandler.TIMEOUT] = [TypeHandler(Update, on_timeout)]
+        return ConversationHandler(
+            name=self.name,
+            persistent=persistent,
+            entry_points=[CallbackQueryHandler(self.start, pattern=entry_pattern)],
+            states=states,
+            fallbacks=fallbacks,
+            conversation_timeout=timeout or None,
+            # Кнопка в меню завжди починає майстер заново (і «лікує» розмови, збережені іншою версією бота)
+            allow_reentry=True,
+        )